@@ -0,0 +1,130 @@
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Database
+
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS computers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        ip TEXT NOT NULL,
+        cpu TEXT,
+        gpu TEXT,
+        motherboard TEXT,
+        network_adapters TEXT,
+        last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+REGISTER_SQL = '''
+    INSERT OR REPLACE INTO computers
+    (name, ip, cpu, gpu, motherboard, network_adapters, last_seen)
+    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+'''
+
+
+def computer_params(i):
+    return (
+        f"PC-{i:05d}", f"10.0.{i // 250}.{i % 250}", "Intel Core i5-8400",
+        "NVIDIA GeForce GTX 1060 6GB", "ASUS PRIME B360M-A", "Realtek PCIe GbE Family Controller"
+    )
+
+
+# Старый путь: новое соединение на каждый запрос прямо в корутине, журнал по умолчанию
+async def legacy_register(db_path, i):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(REGISTER_SQL, computer_params(i))
+    conn.commit()
+    conn.close()
+
+
+async def legacy_list(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("SELECT name, ip, cpu, gpu, last_seen FROM computers ORDER BY last_seen DESC LIMIT 50").fetchall()
+    conn.close()
+
+
+async def run_load(register, read, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await register(i)
+                if i % 5 == 0:
+                    await read()
+            except sqlite3.OperationalError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "elapsed": elapsed,
+        "rate": total / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "errors": errors,
+    }
+
+
+def create_schema(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute(SCHEMA)
+    conn.commit()
+    conn.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест регистрации компьютеров")
+    parser.add_argument("--total", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.db")
+        create_schema(legacy_path)
+        before = await run_load(
+            lambda i: legacy_register(legacy_path, i),
+            lambda: legacy_list(legacy_path),
+            args.total, args.concurrency
+        )
+
+        pooled_path = os.path.join(tmp, "pooled.db")
+        create_schema(pooled_path)
+        db = Database(pooled_path)
+        after = await run_load(
+            lambda i: db.execute(REGISTER_SQL, computer_params(i)),
+            lambda: db.fetchall("SELECT name, ip, cpu, gpu, last_seen FROM computers ORDER BY last_seen DESC LIMIT 50"),
+            args.total, args.concurrency
+        )
+        db.close()
+
+    print(f"Регистраций: {args.total}, параллельно: {args.concurrency}")
+    for title, result in (("до (sqlite3.connect на запрос)", before), ("после (пул + WAL)", after)):
+        print(
+            f"{title:32} {result['rate']:8.0f} рег/с  "
+            f"p50 {result['p50_ms']:7.2f} мс  p99 {result['p99_ms']:7.2f} мс  "
+            f"ошибок {result['errors']}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
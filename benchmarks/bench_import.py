@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Database
+from catalog import DriverCatalog
+from migrations import migrate
+from importer import import_entries, insert_entries, prepare_entry
+
+
+def make_pack(directory, files, size):
+    os.makedirs(directory, exist_ok=True)
+    for i in range(files):
+        with open(os.path.join(directory, f"driver_{i:04d}.cab"), "wb") as file:
+            file.write(os.urandom(size))
+    return [
+        {"path": os.path.join(directory, f"driver_{i:04d}.cab"), "model": f"Vendor Device {i}", "driver_version": "1.0"}
+        for i in range(files)
+    ]
+
+
+def open_db(path):
+    db = Database(path)
+    with db.transaction() as conn:
+        migrate(conn)
+    return db
+
+
+# Старый путь: один запрос /drivers/register на файл - хеш, отдельная транзакция
+# и перезагрузка каталога после каждого драйвера
+async def one_by_one(db, entries, drivers_dir):
+    catalog = DriverCatalog()
+    for entry in entries:
+        prepared = prepare_entry(entry, drivers_dir, dry_run=False)
+        await db.run(insert_entries, [prepared], drivers_dir, write=True)
+        await catalog.reload(db)
+
+
+async def bulk(db, entries, drivers_dir, workers):
+    report = await import_entries(db, entries, drivers_dir, workers=workers)
+    await DriverCatalog().reload(db)
+    return report
+
+
+def measure(label, files, size, run):
+    started = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:8.2f} с  {files / elapsed:8.1f} файлов/с  "
+          f"{files * size / 1024 / 1024 / elapsed:8.1f} МБ/с")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость массового импорта драйверов")
+    parser.add_argument("--files", type=int, default=300)
+    parser.add_argument("--size-kb", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    args = parser.parse_args()
+    size = args.size_kb * 1024
+
+    with tempfile.TemporaryDirectory() as tmp:
+        entries = make_pack(os.path.join(tmp, "pack"), args.files, size)
+        print(f"Файлов: {args.files} по {args.size_kb} КБ, потоков: {args.workers}")
+
+        runs = (
+            ("по одному (/drivers/register)", lambda db, d: one_by_one(db, entries, d)),
+            ("пакет, 1 поток", lambda db, d: bulk(db, entries, d, 1)),
+            (f"пакет, {args.workers} потоков", lambda db, d: bulk(db, entries, d, args.workers)),
+        )
+
+        results = []
+        for index, (label, coroutine) in enumerate(runs):
+            db = open_db(os.path.join(tmp, f"run{index}.db"))
+            drivers_dir = os.path.join(tmp, f"drivers{index}")
+            results.append(measure(label, args.files, size, lambda: asyncio.run(coroutine(db, drivers_dir))))
+            db.close()
+
+        print(f"Ускорение пакетного импорта: x{results[0] / results[-1]:.1f}")
+
+        # Повторный импорт того же пакета ничего не добавляет
+        db = open_db(os.path.join(tmp, "run2.db"))
+        report = asyncio.run(import_entries(db, entries, os.path.join(tmp, "drivers2"), workers=args.workers))
+        db.close()
+        print(f"Повторный импорт: {report['summary']}")
+
+
+if __name__ == "__main__":
+    main()
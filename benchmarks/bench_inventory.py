@@ -0,0 +1,60 @@
+import argparse
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "client"))
+
+from hardware_detector import HardwareDetector, WmicBackend, CimBackend, LinuxBackend
+
+
+class SequentialWmicBackend(WmicBackend):
+    # Прежнее поведение: пробы wmic одна за другой
+    name = "wmic (последовательно)"
+
+    def collect(self):
+        return {
+            "cpu": self.get_cpu_info(),
+            "gpu": self.get_gpu_info(),
+            "motherboard": self.get_motherboard_info(),
+            "network_adapters": self.get_network_adapters(),
+            "installed_drivers": self.get_installed_drivers(),
+        }
+
+
+def measure(backend, runs):
+    detector = HardwareDetector(backend)
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        detector.get_all_hardware()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время полного сканирования оборудования")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    if platform.system() == "Windows":
+        backends = [SequentialWmicBackend(), WmicBackend(), CimBackend()]
+    elif platform.system() == "Linux":
+        backends = [LinuxBackend()]
+    else:
+        print("Нет бэкенда определения оборудования для этой ОС")
+        return
+
+    print(f"Запусков на бэкенд: {args.runs}")
+    for backend in backends:
+        timings = measure(backend, args.runs)
+        print(
+            f"{backend.name:24} медиана {statistics.median(timings):9.1f} мс  "
+            f"мин {min(timings):9.1f} мс  макс {max(timings):9.1f} мс"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Тот же таймаут, что у агента (client.py)
+AGENT_TIMEOUT = 10
+
+#Нагрузочный тест: поднимает сервер (uvicorn в отдельном процессе) на временной
+#базе и имитирует парк агентов, которые проходят тот же цикл, что DriverClient:
+#регистрация (или отметка о присутствии) -> проверка обновлений -> скачивание -> отчет.
+#Итог по каждому эндпоинту пишется в JSON, два файла можно сравнить через --compare
+
+GPUS = (
+    ("NVIDIA GeForce GTX 1060 6GB", "NVIDIA GeForce GTX 1060", "NVIDIA"),
+    ("NVIDIA GeForce RTX 3060", "NVIDIA GeForce RTX 3060", "NVIDIA"),
+    ("AMD Radeon RX 580", "AMD Radeon RX 580", "AMD"),
+    ("Intel UHD Graphics 630", "Intel UHD Graphics 630", "Intel"),
+)
+ADAPTERS = (
+    ("Realtek PCIe GbE Family Controller", "Realtek PCIe GbE Family Controller", "Realtek"),
+    ("Intel Ethernet Connection I219-V", "Intel Ethernet Connection I219-V", "Intel"),
+    ("Intel Wi-Fi 6 AX200 160MHz", "Intel Wi-Fi 6 AX200", "Intel"),
+)
+CPUS = ("Intel Core i5-8400", "Intel Core i7-9700", "AMD Ryzen 5 3600")
+MOTHERBOARDS = ("ASUS PRIME B360M-A", "MSI B450 TOMAHAWK", "Gigabyte H410M S2H")
+
+NEW_VERSION = "2.0"
+OLD_VERSION = "1.0"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+        self.bytes_downloaded = 0
+
+    def record(self, endpoint, started, status):
+        # status - код ответа или "timeout"/"connection"; ошибкой считается всё, кроме 1xx-3xx
+        self.latencies.setdefault(endpoint, []).append(time.perf_counter() - started)
+        statuses = self.statuses.setdefault(endpoint, {})
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        if not isinstance(status, int) or status >= 400:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    async def call(self, endpoint, request):
+        started = time.perf_counter()
+        try:
+            response = await request()
+        except httpx.TimeoutException:
+            self.record(endpoint, started, "timeout")
+            return None
+        except httpx.HTTPError:
+            self.record(endpoint, started, "connection")
+            return None
+        self.record(endpoint, started, response.status_code)
+        return response
+
+    async def download(self, endpoint, client, url):
+        # Скачивание замеряется целиком, до последнего байта тела
+        started = time.perf_counter()
+        try:
+            async with client.stream("GET", url) as response:
+                async for chunk in response.aiter_bytes(256 * 1024):
+                    self.bytes_downloaded += len(chunk)
+        except httpx.TimeoutException:
+            self.record(endpoint, started, "timeout")
+            return False
+        except httpx.HTTPError:
+            self.record(endpoint, started, "connection")
+            return False
+        self.record(endpoint, started, response.status_code)
+        return response.status_code == 200
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values.sort()
+            endpoints[endpoint] = {
+                "requests": len(values),
+                "errors": self.errors.get(endpoint, 0),
+                "error_rate": round(self.errors.get(endpoint, 0) / len(values), 4),
+                "rps": round(len(values) / elapsed, 1),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+                "statuses": self.statuses.get(endpoint, {}),
+            }
+        return endpoints
+
+
+class Agent:
+    def __init__(self, index, args, rng):
+        gpu, _, _ = rng.choice(GPUS)
+        adapters = rng.sample(ADAPTERS, k=min(args.adapters, len(ADAPTERS)))
+        outdated = rng.random() < args.outdated_ratio
+        version = OLD_VERSION if outdated else NEW_VERSION
+
+        self.name = f"LOAD-{index:06d}"
+        self.registered = False
+        self.payload = {
+            "name": self.name,
+            "ip": f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}",
+            "cpu": rng.choice(CPUS),
+            "gpu": gpu,
+            "motherboard": rng.choice(MOTHERBOARDS),
+            "network_adapters": [adapter for adapter, _, _ in adapters],
+            "installed_drivers": [{"hardware_class": "gpu", "device": gpu, "version": version}] + [
+                {"hardware_class": "network", "device": adapter, "version": version} for adapter, _, _ in adapters
+            ] + [
+                # Дополнительные записи увеличивают тело регистрации до размеров реального ПК
+                {"hardware_class": "other", "device": f"System device {i}", "version": "10.0.19041.1"}
+                for i in range(args.extra_drivers)
+            ],
+            "fingerprint": f"{index:016x}",
+        }
+
+    async def run_cycle(self, client, recorder, args):
+        if self.registered:
+            response = await recorder.call("POST /computers/heartbeat", lambda: client.post(
+                "/computers/heartbeat",
+                json={"name": self.name, "ip": self.payload["ip"], "fingerprint": self.payload["fingerprint"]}
+            ))
+            if response is None or response.status_code != 200:
+                self.registered = False
+        if not self.registered:
+            response = await recorder.call("POST /computers/register", lambda: client.post(
+                "/computers/register", json=self.payload
+            ))
+            if response is None or response.status_code != 200:
+                return
+            self.registered = True
+
+        response = await recorder.call("GET /computers/{name}/check-updates", lambda: client.get(
+            f"/computers/{self.name}/check-updates"
+        ))
+        if response is None or response.status_code != 200:
+            return
+
+        for update in response.json().get("available_updates", [])[:args.max_downloads]:
+            hardware_id = update["hardware_id"]
+            info = await recorder.call("GET /drivers/{hardware_id}", lambda: client.get(f"/drivers/{hardware_id}"))
+            if info is None or info.status_code != 200:
+                continue
+
+            downloaded = await recorder.download(
+                "GET /drivers/{hardware_id}/download", client, f"/drivers/{hardware_id}/download"
+            )
+            status = "success" if downloaded else "failed"
+            if downloaded:
+                # Как настоящий агент: после установки инвентаризация меняется и
+                # в следующем цикле отправляется полная регистрация
+                for driver in self.payload["installed_drivers"]:
+                    if driver["device"] == update["current_model"]:
+                        driver["version"] = NEW_VERSION
+                self.registered = False
+
+            await recorder.call("POST /installation/report", lambda: client.post("/installation/report", json={
+                "computer_name": self.name, "hardware_id": hardware_id, "status": status,
+                "message": "Нагрузочный тест"
+            }))
+
+
+def start_server(args, workdir):
+    port = free_port()
+    env = dict(os.environ,
+               DB_PATH=os.path.join(workdir, "drivers.db"),
+               DRIVERS_DIR=os.path.join(workdir, "drivers"),
+               PYTHONUNBUFFERED="1")
+    # Тот же запуск, что в рабочем режиме: миграции до старта воркеров
+    command = [sys.executable, "run.py", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(args.workers), "--backlog", "4096"]
+
+    log = open(os.path.join(workdir, "server.log"), "w")
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Сервер не запустился, см. {log.name}")
+        try:
+            if httpx.get(f"{url}/status", timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Сервер не ответил за 60 с")
+
+
+def seed_drivers(url, size):
+    # Драйверы для всех моделей из профилей агентов, чтобы устаревшим было что скачать
+    models = {(model, vendor) for _, model, vendor in GPUS + ADAPTERS}
+    with httpx.Client(base_url=url, timeout=60) as client:
+        for model, vendor in sorted(models):
+            response = client.post("/drivers/register", data={
+                "model": model, "driver_version": NEW_VERSION, "supported_hardware": vendor,
+            }, files={"file": (f"{model.replace(' ', '_')}.exe", os.urandom(size))})
+            if response.status_code not in (200, 400):
+                raise RuntimeError(f"Не удалось добавить драйвер {model}: {response.text}")
+    return len(models)
+
+
+async def run_fleet(url, args):
+    rng = random.Random(args.seed)
+    agents = [Agent(i, args, rng) for i in range(args.agents)]
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=url, timeout=AGENT_TIMEOUT, limits=limits) as client:
+        async def one(agent, delay):
+            await asyncio.sleep(delay)
+            async with semaphore:
+                await agent.run_cycle(client, recorder, args)
+
+        started = time.perf_counter()
+        for cycle in range(args.cycles):
+            # Агенты приходят не одновременно, а в течение ramp секунд (как splay у демона)
+            await asyncio.gather(*(one(agent, rng.uniform(0, args.ramp)) for agent in agents))
+            print(f"🔄 Цикл {cycle + 1}/{args.cycles} завершен за {time.perf_counter() - started:.1f} с")
+        elapsed = time.perf_counter() - started
+
+        status = (await client.get("/status")).json()
+
+    return recorder, elapsed, status
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(results):
+    print(f"\n{'эндпоинт':<40} {'запросов':>9} {'ошибок':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for endpoint, stats in results["endpoints"].items():
+        print(f"{endpoint:<40} {stats['requests']:>9} {stats['errors']:>7} {stats['rps']:>8} "
+              f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}")
+    totals = results["totals"]
+    print(f"\nЦиклов агентов: {totals['agent_cycles']} за {totals['elapsed_seconds']} с "
+          f"({totals['cycles_per_second']}/с), ошибок {totals['error_rate']:.2%}, "
+          f"скачано {totals['downloaded_mb']} МБ ({totals['download_mb_per_second']} МБ/с)")
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as file:
+        baseline = json.load(file)
+    print(f"\nСравнение с {baseline_path} ({baseline.get('commit') or '?'}):")
+    for endpoint, stats in results["endpoints"].items():
+        old = baseline.get("endpoints", {}).get(endpoint)
+        if not old:
+            continue
+        changes = []
+        for key in ("rps", "p50_ms", "p95_ms", "p99_ms", "error_rate"):
+            if old[key]:
+                changes.append(f"{key} {(stats[key] - old[key]) / old[key]:+.0%}")
+            else:
+                changes.append(f"{key} {old[key]}->{stats[key]}")
+        print(f"  {endpoint:<40} {', '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест: парк агентов против сервера")
+    parser.add_argument("--agents", type=int, default=1000)
+    parser.add_argument("--cycles", type=int, default=2, help="циклов на агента; со второго - отметка о присутствии")
+    parser.add_argument("--concurrency", type=int, default=200, help="одновременных соединений")
+    parser.add_argument("--ramp", type=float, default=5.0, help="за сколько секунд приходят все агенты цикла")
+    parser.add_argument("--driver-size-kb", type=int, default=1024)
+    parser.add_argument("--outdated-ratio", type=float, default=0.2, help="доля агентов, которым нужны обновления")
+    parser.add_argument("--max-downloads", type=int, default=2, help="скачиваний на агента за цикл")
+    parser.add_argument("--adapters", type=int, default=2, help="сетевых адаптеров у агента")
+    parser.add_argument("--extra-drivers", type=int, default=20, help="лишних записей installed_drivers")
+    parser.add_argument("--workers", type=int, default=1, help="процессов uvicorn")
+    parser.add_argument("--url", help="тестировать уже запущенный сервер (без запуска и наполнения)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="файл результатов (по умолчанию benchmarks/results/fleet-<время>.json)")
+    parser.add_argument("--compare", help="файл результатов предыдущего запуска")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        process = None
+        try:
+            if args.url:
+                url = args.url.rstrip("/")
+            else:
+                process, url = start_server(args, workdir)
+                drivers = seed_drivers(url, args.driver_size_kb * 1024)
+                print(f"✅ Сервер {url}, воркеров {args.workers}, драйверов {drivers}")
+
+            print(f"🔄 Агентов {args.agents}, циклов {args.cycles}, соединений {args.concurrency}")
+            recorder, elapsed, status = asyncio.run(run_fleet(url, args))
+        finally:
+            if process:
+                process.terminate()
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    endpoints = recorder.summary(elapsed)
+    requests_total = sum(stats["requests"] for stats in endpoints.values())
+    errors_total = sum(stats["errors"] for stats in endpoints.values())
+    results = {
+        "commit": git_commit(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "totals": {
+            "agent_cycles": args.agents * args.cycles,
+            "elapsed_seconds": round(elapsed, 2),
+            "cycles_per_second": round(args.agents * args.cycles / elapsed, 1),
+            "requests": requests_total,
+            "error_rate": round(errors_total / requests_total, 4) if requests_total else 0,
+            "downloaded_mb": round(recorder.bytes_downloaded / 1024 / 1024, 1),
+            "download_mb_per_second": round(recorder.bytes_downloaded / 1024 / 1024 / elapsed, 1),
+        },
+        "endpoints": endpoints,
+        "server_ingest": status.get("ingest"),
+    }
+
+    print_report(results)
+    if args.compare:
+        print_comparison(results, args.compare)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"fleet-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(results, file, ensure_ascii=False, indent=2, sort_keys=True)
+    print(f"\n📦 Результаты сохранены: {output}")
+
+
+if __name__ == "__main__":
+    main()
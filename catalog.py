@@ -0,0 +1,165 @@
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+from typing import NamedTuple, Optional
+
+
+class CatalogDriver(NamedTuple):
+    id: int
+    hardware_id: str
+    model: str
+    driver_version: str
+    file_path: str
+    file_size: Optional[int]
+    sha256: Optional[str]
+    original_filename: Optional[str]
+    os_version: Optional[str]
+    supported_hardware: Optional[str]
+    vendor: Optional[str]
+    hardware_class: Optional[str]
+    match_weight: Optional[int]
+    upload_date: Optional[str]
+
+
+CATALOG_COLUMNS = ", ".join(CatalogDriver._fields)
+
+
+def driver_summary(driver: CatalogDriver) -> dict:
+    return {
+        "hardware_id": driver.hardware_id,
+        "model": driver.model,
+        "version": driver.driver_version,
+        "os": driver.os_version,
+        "file_size": driver.file_size,
+        "original_filename": driver.original_filename,
+        "upload_date": driver.upload_date,
+        "vendor": driver.vendor,
+        "hardware_class": driver.hardware_class,
+        "sha256": driver.sha256
+    }
+
+
+CATALOG_POLL_INTERVAL = float(os.environ.get("CATALOG_POLL_INTERVAL", "2"))
+DRIVER_ID_SQL = "SELECT id FROM drivers WHERE hardware_id = ?"
+
+def catalog_version(conn):
+    row = conn.execute("SELECT value FROM stats WHERE key = 'catalog_version'").fetchone()
+    return row[0] if row else None
+
+
+# Порядки сортировки списка драйверов; последний элемент ключа делает его уникальным
+CATALOG_SORTS = {
+    "model": lambda d: (d.model, d.driver_version, d.hardware_id),
+    "upload_date": lambda d: (d.upload_date or "", d.hardware_id),
+}
+
+
+#Каталог драйверов в памяти процесса: читается тысячи раз в час, меняется
+#несколько раз в день, поэтому после каждой регистрации/удаления перестраивается целиком.
+#Остальные воркеры замечают изменение по catalog_version не позже CATALOG_POLL_INTERVAL
+
+class DriverCatalog:
+    def __init__(self):
+        self.generation = 0
+        self.version = None
+        self.etag = None
+        self._by_hardware_id = {}
+        self._sorted = {sort: ((), []) for sort in CATALOG_SORTS}
+        self._tokens = {}
+        self._lock = asyncio.Lock()
+
+    def _build(self, conn):
+        # Версию читаем до данных: если каталог изменится между запросами, следующая
+        # проверка увидит новую версию и перечитает его еще раз, а не пропустит изменение
+        version = catalog_version(conn)
+        drivers = [
+            CatalogDriver(*row)
+            for row in conn.execute(f"SELECT {CATALOG_COLUMNS} FROM drivers")
+        ]
+        by_id = {driver.id: driver for driver in drivers}
+
+        tokens = {}
+        for token, driver_id in conn.execute("SELECT token, driver_id FROM driver_tokens"):
+            driver = by_id.get(driver_id)
+            if driver:
+                tokens.setdefault(token, []).append(driver)
+
+        return version, drivers, tokens
+
+    async def reload(self, db):
+        async with self._lock:
+            version, drivers, tokens = await db.run(self._build)
+
+            sorted_views = {}
+            for sort, key in CATALOG_SORTS.items():
+                ordered = tuple(sorted(drivers, key=key))
+                sorted_views[sort] = (ordered, [key(driver) for driver in ordered])
+
+            body = json.dumps([driver_summary(d) for d in sorted_views["model"][0]], ensure_ascii=False)
+
+            self._by_hardware_id = {driver.hardware_id: driver for driver in drivers}
+            self._sorted = sorted_views
+            self._tokens = {token: tuple(items) for token, items in tokens.items()}
+            # ETag по содержимому, а не по номеру поколения: совпадает после перезапуска
+            self.etag = f'"{hashlib.sha1(body.encode("utf-8")).hexdigest()}"'
+            self.generation += 1
+            self.version = version
+
+    async def lookup(self, db, hardware_id: str) -> Optional[CatalogDriver]:
+        # Драйвер мог только что добавить другой воркер: при промахе сверяем версию
+        driver = self.get(hardware_id)
+        if driver is None and await self.refresh(db):
+            driver = self.get(hardware_id)
+        return driver
+
+    async def refresh(self, db) -> bool:
+        if await db.run(catalog_version) == self.version:
+            return False
+        await self.reload(db)
+        return True
+
+    async def watch(self, db, interval: float = CATALOG_POLL_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh(db)
+            except Exception as e:
+                print(f"⚠️ Ошибка проверки версии каталога: {e}")
+
+    def __len__(self) -> int:
+        return len(self._by_hardware_id)
+
+    def get(self, hardware_id: str) -> Optional[CatalogDriver]:
+        return self._by_hardware_id.get(hardware_id)
+
+    def page(self, sort: str, descending: bool, after, limit: int, predicate=None):
+        # Продолжение с курсора - бинарный поиск по отсортированным ключам,
+        # дальше просматриваем ровно столько драйверов, сколько нужно для страницы
+        ordered, keys = self._sorted[sort]
+        if descending:
+            start = bisect.bisect_left(keys, after) - 1 if after is not None else len(ordered) - 1
+            positions = range(start, -1, -1)
+        else:
+            start = bisect.bisect_right(keys, after) if after is not None else 0
+            positions = range(start, len(ordered))
+
+        items = []
+        last_key = None
+        for position in positions:
+            driver = ordered[position]
+            if predicate and not predicate(driver):
+                continue
+            if len(items) == limit:
+                return items, last_key
+            items.append(driver)
+            last_key = keys[position]
+        return items, None
+
+    def candidates(self, keys, vendor):
+        for token in keys:
+            for driver in self._tokens.get(token, ()):
+                if driver.vendor == vendor:
+                    yield (driver.id, driver.hardware_id, driver.model, driver.driver_version,
+                           driver.hardware_class, driver.match_weight, driver.upload_date, token)
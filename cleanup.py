@@ -0,0 +1,138 @@
+import asyncio
+import json
+import os
+import time
+
+from stats import refresh_outdated
+from workers import save_state
+from events import publish_event
+
+
+CLEANUP_DAYS = int(os.environ.get("CLEANUP_DAYS_OFFLINE", "30"))
+CLEANUP_BATCH_SIZE = int(os.environ.get("CLEANUP_BATCH_SIZE", "500"))
+CLEANUP_INTERVAL = int(os.environ.get("CLEANUP_INTERVAL", "0"))
+DRY_RUN_SAMPLE = 20
+
+DELETE_BATCH_SQL = '''
+    DELETE FROM computers WHERE id IN (
+        SELECT id FROM computers WHERE last_seen < ? ORDER BY last_seen LIMIT ?
+    )
+    RETURNING name
+'''
+DELETE_JOBS_SQL = "DELETE FROM installation_jobs WHERE computer_name IN (SELECT value FROM json_each(?))"
+DELETE_PEERS_SQL = "DELETE FROM peer_cache WHERE computer_name IN (SELECT value FROM json_each(?))"
+
+#Удаление давно не выходивших на связь компьютеров пачками: каждая пачка - отдельная
+#короткая транзакция, между ними очередь отметок о присутствии успевает записать свое.
+#Сравнение last_seen < дата (а не date(last_seen) < дата) использует индекс по last_seen
+
+
+def cutoff_date(conn, days_offline: int) -> str:
+    return conn.execute("SELECT date('now', ?)", (f"-{days_offline} days",)).fetchone()[0]
+
+
+def delete_batch(conn, cutoff: str, batch_size: int):
+    removed = conn.execute(DELETE_BATCH_SQL, (cutoff, batch_size)).fetchall()
+    if not removed:
+        return 0, 0, 0
+
+    publish_event(conn, "computers_removed", {"names": [name for (name,) in removed]})
+    names = json.dumps([name for (name,) in removed])
+    jobs = conn.execute(DELETE_JOBS_SQL, (names,)).rowcount
+    peers = conn.execute(DELETE_PEERS_SQL, (names,)).rowcount
+    return len(removed), jobs, peers
+
+
+def preview(conn, cutoff: str):
+    count = conn.execute("SELECT COUNT(*) FROM computers WHERE last_seen < ?", (cutoff,)).fetchone()[0]
+    jobs = conn.execute('''
+        SELECT COUNT(*) FROM installation_jobs
+        WHERE computer_name IN (SELECT name FROM computers WHERE last_seen < ?)
+    ''', (cutoff,)).fetchone()[0]
+    sample = conn.execute('''
+        SELECT name, last_seen FROM computers WHERE last_seen < ? ORDER BY last_seen LIMIT ?
+    ''', (cutoff, DRY_RUN_SAMPLE)).fetchall()
+    return count, jobs, [{"name": name, "last_seen": last_seen} for name, last_seen in sample]
+
+
+class ComputerCleanup:
+    def __init__(self, db, batch_size: int = CLEANUP_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.last_report = None
+        self._leader = None
+        self._task = None
+        self._lock = asyncio.Lock()
+
+    async def run(self, days_offline: int = CLEANUP_DAYS, dry_run: bool = False, batch_size: int = None):
+        batch_size = batch_size or self.batch_size
+        async with self._lock:
+            started = time.perf_counter()
+            cutoff = await self.db.run(cutoff_date, days_offline)
+            report = {
+                "dry_run": dry_run,
+                "days_offline": days_offline,
+                "cutoff": cutoff,
+                "batch_size": batch_size,
+            }
+
+            if dry_run:
+                count, jobs, sample = await self.db.run(preview, cutoff)
+                report.update(deleted_count=count, jobs_deleted=jobs, sample=sample, batches=0)
+            else:
+                deleted = jobs = peers = batches = 0
+                max_batch_ms = 0.0
+                while True:
+                    batch_started = time.perf_counter()
+                    removed, removed_jobs, removed_peers = await self.db.run(
+                        delete_batch, cutoff, batch_size, write=True
+                    )
+                    if not removed:
+                        break
+                    max_batch_ms = max(max_batch_ms, (time.perf_counter() - batch_started) * 1000)
+                    deleted += removed
+                    jobs += removed_jobs
+                    peers += removed_peers
+                    batches += 1
+                    print(f"🗑️ Автоудаление: пачка {batches}, компьютеров {removed}")
+                    if removed < batch_size:
+                        break
+                    # Отдаем блокировку записи другим писателям перед следующей пачкой
+                    await asyncio.sleep(0)
+
+                if deleted:
+                    await self.db.run(refresh_outdated, write=True)
+                report.update(deleted_count=deleted, jobs_deleted=jobs, peers_deleted=peers,
+                              batches=batches, max_batch_ms=round(max_batch_ms, 2))
+
+            report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            report["finished_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            if not dry_run:
+                # Отчет показывается в /status любого воркера, поэтому хранится в БД
+                self.last_report = report
+                await self.db.run(save_state, "last_cleanup", report, write=True)
+            return report
+
+    def start(self, interval: int = CLEANUP_INTERVAL, days_offline: int = CLEANUP_DAYS, leader=None):
+        # Плановая очистка включается переменной CLEANUP_INTERVAL (секунды)
+        self._leader = leader
+        if interval > 0:
+            self._task = asyncio.create_task(self._run_periodically(interval, days_offline))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run_periodically(self, interval: int, days_offline: int):
+        while True:
+            await asyncio.sleep(interval)
+            if self._leader and not self._leader.is_leader:
+                continue
+            try:
+                report = await self.run(days_offline)
+                if report["deleted_count"]:
+                    print(f"🗑️ Плановая очистка: удалено {report['deleted_count']} компьютеров "
+                          f"за {report['elapsed_ms']} мс")
+            except Exception as e:
+                print(f"⚠️ Ошибка плановой очистки: {e}")
@@ -8,6 +8,8 @@ PyInstaller.__main__.run([
     '--name=DriverClient',
     '--add-data=hardware_detector.py;.',
     '--add-data=driver_installer.py;.',
+    '--add-data=peer_cache.py;.',
+    '--add-data=push_channel.py;.',
     '--hidden-import=requests',
     '--hidden-import=psutil',
     '--hidden-import=cpuinfo',
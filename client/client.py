@@ -1,17 +1,46 @@
 import requests
 import time
+import random
+import argparse
 import logging
 from hardware_detector import HardwareDetector
-from driver_installer import DriverInstaller
+from driver_installer import DriverInstaller, make_session
+from peer_cache import PeerCache, PeerCacheServer
+from push_channel import PushChannel
 import json
 import sys
+import threading
+
+
+DEFAULT_SERVER_URL = "http://DESKTOP-6CA6O4K:8000"
+POLL_INTERVAL = 3600
+POLL_JITTER = 0.2
+MIN_POLL_INTERVAL = 60
+MAX_ERROR_BACKOFF = 6 * 3600
+MAX_CLAIMED_JOBS = 4
+# Пока открыт канал уведомлений, сервер сам сообщает об обновлениях - редкая проверка на всякий случай
+PUSH_POLL_INTERVAL = 6 * 3600
+# Уведомление приходит всем подходящим агентам сразу - разносим их запросы
+PUSH_SPLAY = 10
 
 
 class DriverClient:
-    def __init__(self, server_url="http://localhost:8000"):
+    def __init__(self, server_url="http://localhost:8000", poll_interval=POLL_INTERVAL, peer_port=None, push=True):
         self.server_url = server_url
+        self.peer_port = peer_port
+        self.push = push
+        self.push_channel = None
+        self.wake = threading.Event()
+        self.peer_cache = None
+        self.peer_server = None
         self.computer_name = None
         self.hardware_info = None
+        self.detector = HardwareDetector()
+        self.poll_interval = poll_interval
+        self.retry_after = None
+        self.failures = 0
+        # Одна сессия на все запросы: соединение с сервером переиспользуется (keep-alive)
+        self.session = make_session()
 
         logging.basicConfig(
             level=logging.INFO,
@@ -25,9 +54,11 @@ class DriverClient:
 
     def detect_hardware(self):
         self.logger.info("[SCAN] Определяем оборудование...")
-        detector = HardwareDetector()
-        self.hardware_info = detector.get_all_hardware()
-        self.computer_name = detector.get_computer_name()
+        self.hardware_info = self.detector.get_all_hardware(use_cache=True)
+        self.computer_name = self.detector.get_computer_name()
+
+        if self.detector.from_cache:
+            self.logger.info("[SCAN] Оборудование не менялось, используем сохраненные данные")
 
         self.logger.info(f"[PC] Компьютер: {self.computer_name}")
         self.logger.info(f"[CPU] Процессор: {self.hardware_info['cpu']}")
@@ -36,7 +67,52 @@ class DriverClient:
 
         return self.hardware_info
 
+    def remember_retry_after(self, response):
+        # Сервер подсказывает, когда приходить в следующий раз (в теле ответа или Retry-After)
+        value = response.headers.get("Retry-After")
+        if response.status_code == 200:
+            try:
+                value = response.json().get("retry_after", value)
+            except ValueError:
+                pass
+        try:
+            if value is not None:
+                self.retry_after = max(MIN_POLL_INTERVAL, int(value))
+        except (TypeError, ValueError):
+            pass
+
+    def send_heartbeat(self):
+        # Оборудование не менялось - отправляем только отпечаток вместо полной инвентаризации
+        try:
+            response = self.session.post(
+                f"{self.server_url}/computers/heartbeat",
+                json={
+                    "name": self.computer_name,
+                    "ip": self.hardware_info["ip_address"],
+                    "fingerprint": self.hardware_info["fingerprint"]
+                },
+                timeout=10
+            )
+            self.remember_retry_after(response)
+
+            if response.status_code == 200:
+                self.logger.info("[OK] Отметка о присутствии отправлена")
+                return True
+            if response.status_code == 409:
+                self.logger.info("[REG] Сервер запросил полную инвентаризацию")
+            else:
+                self.logger.error(f"[ERROR] Ошибка отметки о присутствии: {response.text}")
+            return False
+
+        except Exception as e:
+            self.logger.error(f"[ERROR] Ошибка подключения к серверу: {e}")
+            return False
+
     def register_computer(self):
+        fingerprint = self.hardware_info["fingerprint"]
+        if self.detector.acknowledged_fingerprint() == fingerprint and self.send_heartbeat():
+            return True
+
         self.logger.info("[REG] Регистрируем компьютер на сервере...")
 
         registration_data = {
@@ -45,18 +121,22 @@ class DriverClient:
             "cpu": self.hardware_info["cpu"],
             "gpu": self.hardware_info["gpu"],
             "motherboard": self.hardware_info["motherboard"],
-            "network_adapters": self.hardware_info["network_adapters"]
+            "network_adapters": self.hardware_info["network_adapters"],
+            "installed_drivers": self.hardware_info.get("installed_drivers", []),
+            "fingerprint": self.hardware_info["fingerprint"]
         }
 
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.server_url}/computers/register",
                 json=registration_data,
                 timeout=10
             )
+            self.remember_retry_after(response)
 
             if response.status_code == 200:
                 self.logger.info("[OK] Компьютер успешно зарегистрирован")
+                self.detector.acknowledge(self.hardware_info["fingerprint"])
                 return True
             else:
                 self.logger.error(f"[ERROR] Ошибка регистрации: {response.text}")
@@ -70,10 +150,11 @@ class DriverClient:
         self.logger.info("[UPDATE] Проверяем доступные обновления...")
 
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.server_url}/computers/{self.computer_name}/check-updates",
                 timeout=10
             )
+            self.remember_retry_after(response)
 
             if response.status_code == 200:
                 updates = response.json()
@@ -82,7 +163,10 @@ class DriverClient:
                 if available_updates:
                     self.logger.info(f"[DRIVER] Найдено {len(available_updates)} обновлений")
                     for update in available_updates:
-                        self.logger.info(f"  - {update['hardware']}: {update['available_driver']} v{update['version']}")
+                        current = update.get("current_version") or "?"
+                        self.logger.info(
+                            f"  - {update['hardware']}: {update['available_driver']} v{update['version']} (установлена v{current})"
+                        )
                 else:
                     self.logger.info("[OK] Все драйверы актуальны")
 
@@ -95,41 +179,158 @@ class DriverClient:
             self.logger.error(f"[ERROR] Ошибка подключения: {e}")
             return []
 
+    def claim_jobs(self, limit=MAX_CLAIMED_JOBS):
+        # Задания поэтапных развертываний: сервер сам решает, когда очередь этого компьютера
+        jobs = []
+        while len(jobs) < limit:
+            try:
+                response = self.session.post(
+                    f"{self.server_url}/jobs/claim",
+                    json={"computer_name": self.computer_name},
+                    timeout=10
+                )
+                self.remember_retry_after(response)
+                if response.status_code != 200:
+                    self.logger.error(f"[ERROR] Ошибка получения задания: {response.text}")
+                    break
+
+                job = response.json().get("job")
+                if not job:
+                    break
+                self.logger.info(f"[JOB] Задание {job['job_id']}: {job['available_driver']} v{job['version']}")
+                jobs.append(job)
+
+            except Exception as e:
+                self.logger.error(f"[ERROR] Ошибка подключения: {e}")
+                break
+
+        return jobs
+
     def install_driver(self, hardware_id, driver_info):
         self.logger.info(f"[DOWNLOAD] Устанавливаем драйвер: {driver_info['available_driver']}")
 
-        installer = DriverInstaller(self.server_url)
+        installer = self.make_installer()
         success = installer.install_driver(hardware_id, driver_info, self.computer_name)
 
         return success
 
+    def make_installer(self):
+        return DriverInstaller(
+            self.server_url, session=self.session,
+            peer_cache=self.peer_cache, peer_port=self.peer_port if self.peer_server else None
+        )
+
+    def start_peer_cache(self):
+        # Раздаем установленные драйверы соседям по сети, чтобы не нагружать сервер
+        self.peer_cache = PeerCache()
+        try:
+            self.peer_server = PeerCacheServer(self.peer_cache, self.peer_port).start()
+            self.logger.info(f"[PEER] Кеш драйверов для соседей доступен на порту {self.peer_port}")
+        except OSError as e:
+            self.logger.error(f"[ERROR] Не удалось запустить кеш драйверов для соседей: {e}")
+
+    def start_push_channel(self):
+        self.push_channel = PushChannel(self.server_url, self.computer_name, lambda message: self.wake.set()).start()
+
+    def wait(self, delay):
+        # Спим до следующей проверки или до уведомления сервера
+        if not self.wake.wait(delay):
+            return
+        time.sleep(random.uniform(0, PUSH_SPLAY))
+        self.wake.clear()
+
     def run_auto_update(self):
         self.logger.info("[START] Запуск клиента управления драйверами")
+        return self.run_cycle()
+
+    def run_cycle(self):
+        self.retry_after = None
 
         if not self.detect_hardware():
             self.logger.error("[ERROR] Не удалось определить оборудование")
-            return
+            return False
 
         if not self.register_computer():
             self.logger.error("[ERROR] Не удалось зарегистрировать компьютер")
-            return
+            return False
 
         updates = self.check_updates()
+        updates += self.claim_jobs()
+        if updates:
+            self.logger.info(f"[DOWNLOAD] Скачиваем драйверы: {len(updates)}")
+            installer = self.make_installer()
+            installer.install_updates(updates, self.computer_name, on_result=self.on_installed)
 
-        for update in updates:
-            success = self.install_driver(
-                update["hardware_id"],
-                update
-            )
+        return True
 
-            if success:
-                self.logger.info(f"[OK] Драйвер {update['available_driver']} успешно установлен")
-            else:
-                self.logger.error(f"[ERROR] Ошибка установки {update['available_driver']}")
+    def on_installed(self, update, success):
+        if success:
+            self.logger.info(f"[OK] Драйвер {update['available_driver']} успешно установлен")
+            self.detector.invalidate_cache()
+        else:
+            self.logger.error(f"[ERROR] Ошибка установки {update['available_driver']}")
+
+    def next_delay(self, success):
+        # Подсказка сервера может только замедлить агента (сервер нагружен), но не
+        # отменяет свой интервал (--interval). После ошибок интервал растет
+        # экспоненциально. Случайный разброс не дает агентам приходить одновременно
+        if success:
+            self.failures = 0
+            delay = max(self.poll_interval, self.retry_after or 0)
+        else:
+            self.failures += 1
+            backoff = min(MAX_ERROR_BACKOFF, MIN_POLL_INTERVAL * 2 ** self.failures)
+            delay = max(self.retry_after or 0, backoff)
+        return max(MIN_POLL_INTERVAL, delay * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER))
+
+    def run_forever(self):
+        self.logger.info("[START] Клиент управления драйверами запущен в фоновом режиме")
+        if self.peer_port:
+            self.start_peer_cache()
+
+        # Агенты, запущенные одновременно (по расписанию или после включения), разносим во времени
+        splay = random.uniform(0, self.poll_interval * POLL_JITTER)
+        self.logger.info(f"[WAIT] Первая проверка через {splay:.0f} с")
+        time.sleep(splay)
+
+        while True:
+            try:
+                success = self.run_cycle()
+            except Exception as e:
+                self.logger.error(f"[ERROR] Непредвиденная ошибка: {e}")
+                success = False
+
+            if self.push and not self.push_channel and self.computer_name:
+                self.start_push_channel()
+
+            delay = self.next_delay(success)
+            if success and self.push_channel and self.push_channel.connected:
+                delay = max(delay, PUSH_POLL_INTERVAL)
+            self.logger.info(f"[WAIT] Следующая проверка через {delay:.0f} с")
+            self.wait(delay)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Клиент управления драйверами")
+    parser.add_argument("server_url", nargs="?", default=DEFAULT_SERVER_URL)
+    parser.add_argument("--daemon", action="store_true", help="работать постоянно и периодически проверять обновления")
+    parser.add_argument("--interval", type=int, default=POLL_INTERVAL, help="интервал проверки в секундах")
+    parser.add_argument("--peer-port", type=int, default=None,
+                        help="раздавать скачанные драйверы соседям по сети на этом порту (только с --daemon)")
+    parser.add_argument("--no-push", action="store_true",
+                        help="не держать канал уведомлений, только периодическая проверка")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    server_url = "http://DESKTOP-6CA6O4K:8000"
+    args = parse_args()
 
-    client = DriverClient(server_url)
-    client.run_auto_update()
\ No newline at end of file
+    client = DriverClient(args.server_url, poll_interval=args.interval, peer_port=args.peer_port,
+                          push=not args.no_push)
+    if args.daemon:
+        try:
+            client.run_forever()
+        except KeyboardInterrupt:
+            client.logger.info("[STOP] Клиент остановлен")
+    else:
+        client.run_auto_update()
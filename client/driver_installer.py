@@ -1,44 +1,221 @@
 import requests
 import os
+import time
+import hashlib
+import platform
 import tempfile
 import subprocess
 import logging
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+
+
+MAX_PARALLEL_DOWNLOADS = 4
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+CHUNK_TARGET_SECONDS = 0.25
+DOWNLOAD_TIMEOUT = (10, 60)
+PEER_TIMEOUT = (2, 15)
+MAX_DOWNLOAD_ATTEMPTS = 3
+
+
+def make_session(pool_size=MAX_PARALLEL_DOWNLOADS):
+    # Пул соединений не меньше числа параллельных загрузок, иначе лишние соединения закрываются
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def next_chunk_size(chunk_size, elapsed):
+    # Быстрое чтение - увеличиваем блок, медленное - уменьшаем
+    if elapsed < CHUNK_TARGET_SECONDS / 2:
+        return min(MAX_CHUNK_SIZE, chunk_size * 2)
+    if elapsed > CHUNK_TARGET_SECONDS * 2:
+        return max(MIN_CHUNK_SIZE, chunk_size // 2)
+    return chunk_size
+
+
+def hash_into(hasher, file_path):
+    size = 0
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(MAX_CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            size += len(chunk)
+    return size
+
+
+def peer_url(ip, port, sha256):
+    # IPv6-адрес в URL записывается в квадратных скобках
+    try:
+        if ipaddress.ip_address(ip).version == 6:
+            ip = f"[{ip}]"
+    except ValueError:
+        pass
+    return f"http://{ip}:{port}/blobs/{sha256}"
+
+
+def file_digest(file_path):
+    hasher = hashlib.sha256()
+    size = hash_into(hasher, file_path)
+    return size, hasher.hexdigest()
 
 
 class DriverInstaller:
-    def __init__(self, server_url):
+    def __init__(self, server_url, session=None, max_parallel=MAX_PARALLEL_DOWNLOADS,
+                 peer_cache=None, peer_port=None):
         self.server_url = server_url
+        self.peer_cache = peer_cache
+        self.peer_port = peer_port
+        self.downloaded = {}
+        self.session = session or make_session(max_parallel)
+        self.max_parallel = max_parallel
         self.temp_dir = tempfile.gettempdir()
+        self.download_dir = os.path.join(self.temp_dir, "driver_downloads")
+        os.makedirs(self.download_dir, exist_ok=True)
         self.logger = logging.getLogger(__name__)
 
-    def download_driver(self, hardware_id):
+    def download_driver(self, hardware_id, peers=()):
         try:
-            response = requests.get(f"{self.server_url}/drivers/{hardware_id}")
+            response = self.session.get(f"{self.server_url}/drivers/{hardware_id}", timeout=DOWNLOAD_TIMEOUT)
             if response.status_code != 200:
                 self.logger.error(f"❌ Драйвер {hardware_id} не найден")
                 return None
 
-            driver_info = response.json()
-            file_url = f"{self.server_url}/static/{hardware_id}.exe"
+            file_info = response.json()["file_info"]
+            original_name = file_info.get("original_name") or ""
+            extension = os.path.splitext(original_name)[1] or ".exe"
+            file_path = os.path.join(self.download_dir, f"{hardware_id}{extension}")
+            expected_size = file_info.get("size_bytes")
+            expected_sha256 = file_info.get("sha256")
 
-            file_response = requests.get(file_url, stream=True)
-            if file_response.status_code == 200:
-                file_path = os.path.join(self.temp_dir, f"{hardware_id}.exe")
-                with open(file_path, 'wb') as f:
-                    for chunk in file_response.iter_content(chunk_size=8192):
-                        f.write(chunk)
+            # Файл, уже скачанный ранее (например, при неудачной установке), используем повторно
+            if expected_sha256 and os.path.exists(file_path):
+                if file_digest(file_path) == (expected_size, expected_sha256):
+                    self.logger.info(f"♻️ Используем ранее скачанный драйвер: {file_path}")
+                    self.downloaded[file_path] = expected_sha256
+                    return file_path
+                self.remove_file(file_path)
 
-                self.logger.info(f"✅ Драйвер скачан: {file_path}")
+            if self.peer_cache and self.peer_cache.has(expected_sha256):
+                self.peer_cache.copy_to(expected_sha256, file_path)
+                self.logger.info(f"♻️ Драйвер взят из локального кеша: {file_path}")
+                self.downloaded[file_path] = expected_sha256
                 return file_path
-            else:
-                self.logger.error(f"❌ Не удалось скачать файл драйвера")
-                return None
+
+            # Сначала соседи по сети, затем сервер. Без опубликованного хеша
+            # файл от соседа проверить нельзя, поэтому тогда только сервер
+            sources = []
+            if expected_sha256:
+                sources = [
+                    (peer_url(peer["ip"], peer["port"], expected_sha256), PEER_TIMEOUT, 1)
+                    for peer in peers or ()
+                ]
+            sources.append((f"{self.server_url}/drivers/{hardware_id}/download", DOWNLOAD_TIMEOUT, MAX_DOWNLOAD_ATTEMPTS))
+
+            for url, timeout, attempts in sources:
+                for attempt in range(1, attempts + 1):
+                    try:
+                        result = self.fetch_file(url, hardware_id, file_path, expected_size, expected_sha256, timeout)
+                    except (requests.RequestException, OSError) as e:
+                        # Частично скачанный файл остается, следующая попытка или
+                        # следующий источник продолжат с того же места
+                        self.logger.warning(f"⚠️ Загрузка {hardware_id} прервана (попытка {attempt}): {e}")
+                        continue
+                    if result:
+                        self.logger.info(f"✅ Драйвер скачан: {file_path}")
+                        self.downloaded[file_path] = expected_sha256
+                        return file_path
+
+            self.logger.error(f"❌ Не удалось скачать файл драйвера")
+            return None
 
         except Exception as e:
             self.logger.error(f"❌ Ошибка скачивания: {e}")
             return None
 
-    def install_driver(self, file_path):
+    def fetch_file(self, url, hardware_id, file_path, expected_size=None, expected_sha256=None,
+                   timeout=DOWNLOAD_TIMEOUT):
+        part_path = file_path + ".part"
+        hasher = hashlib.sha256()
+        offset = 0
+
+        if os.path.exists(part_path):
+            offset = hash_into(hasher, part_path)
+            if expected_size is not None and offset > expected_size:
+                self.remove_file(part_path)
+                hasher, offset = hashlib.sha256(), 0
+
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if expected_sha256:
+                # Если файл на сервере изменился, сервер вернет его целиком
+                headers["If-Range"] = f'"{expected_sha256}"'
+
+        with self.session.get(url, stream=True, headers=headers, timeout=timeout) as file_response:
+            if file_response.status_code == 416:
+                self.remove_file(part_path)
+                return False
+            if file_response.status_code == 200:
+                hasher, offset = hashlib.sha256(), 0
+            elif file_response.status_code != 206:
+                self.logger.error(f"❌ {url} вернул {file_response.status_code} для {hardware_id}")
+                return False
+            else:
+                self.logger.info(f"🔄 Продолжаем загрузку {hardware_id} с {offset} байт")
+
+            if not expected_sha256:
+                # ETag содержит SHA-256 файла, если сервер его знает
+                etag = file_response.headers.get("ETag", "").strip('"')
+                expected_sha256 = etag if len(etag) == 64 else None
+
+            size = self.save_stream(file_response, part_path, hasher, offset)
+
+        if expected_size is not None and size != expected_size:
+            if size > expected_size:
+                self.remove_file(part_path)
+            self.logger.error(f"❌ Файл драйвера {hardware_id} скачан не полностью")
+            return False
+        if expected_sha256 and hasher.hexdigest() != expected_sha256:
+            self.logger.error(f"❌ Контрольная сумма драйвера {hardware_id} не совпадает")
+            self.remove_file(part_path)
+            return False
+
+        os.replace(part_path, file_path)
+        return True
+
+    def save_stream(self, response, file_path, hasher, offset=0):
+        # Хеш считается по ходу загрузки, повторно файл не читается
+        chunk_size = MIN_CHUNK_SIZE
+        size = offset
+
+        with open(file_path, 'ab' if offset else 'wb') as f:
+            while True:
+                started = time.monotonic()
+                chunk = response.raw.read(chunk_size, decode_content=True)
+                if not chunk:
+                    break
+                f.write(chunk)
+                hasher.update(chunk)
+                size += len(chunk)
+                chunk_size = next_chunk_size(chunk_size, time.monotonic() - started)
+
+        return size
+
+    def remove_file(self, file_path):
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except OSError:
+            pass
+
+    def install_driver_file(self, file_path):
         try:
             self.logger.info(f"🔄 Устанавливаем драйвер: {file_path}")
 
@@ -69,18 +246,20 @@ class DriverInstaller:
             self.logger.error(f"❌ Ошибка установки: {e}")
             return False
 
-    def send_installation_report(self, computer_name, hardware_id, status, message=""):
+    def send_installation_report(self, computer_name, hardware_id, status, message="", peer_port=None):
         try:
             report_data = {
                 "computer_name": computer_name,
                 "hardware_id": hardware_id,
                 "status": status,
-                "message": message
+                "message": message,
+                "peer_port": peer_port
             }
 
-            response = requests.post(
+            response = self.session.post(
                 f"{self.server_url}/installation/report",
-                json=report_data
+                json=report_data,
+                timeout=DOWNLOAD_TIMEOUT
             )
 
             if response.status_code == 200:
@@ -95,8 +274,47 @@ class DriverInstaller:
             return False
 
     def install_driver(self, hardware_id, driver_info, computer_name):
+        results = self.install_updates([dict(driver_info, hardware_id=hardware_id)], computer_name)
+        return results[0][1]
+
+    def install_updates(self, updates, computer_name, on_result=None):
+        # Все драйверы скачиваются параллельно, а устанавливаются по одному
+        # в порядке готовности: установщики нельзя запускать одновременно
+        results = []
+        if not updates:
+            return results
+
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(updates))) as executor:
+            downloads = {
+                executor.submit(self.download_driver, update["hardware_id"], update.get("peers")): update
+                for update in updates
+            }
+            for future in as_completed(downloads):
+                update = downloads[future]
+                success = self.install_downloaded(update, future.result(), computer_name)
+                results.append((update, success))
+                if on_result:
+                    on_result(update, success)
+
+        return results
+
+    def keep_for_peers(self, driver_path):
+        # С включенным кешем установленный драйвер остается для раздачи соседям
+        sha256 = self.downloaded.pop(driver_path, None)
+        if not self.peer_cache or not sha256:
+            self.remove_file(driver_path)
+            return None
+        try:
+            self.peer_cache.add(driver_path, sha256)
+            return self.peer_port
+        except OSError as e:
+            self.logger.warning(f"⚠️ Не удалось сохранить драйвер в кеш: {e}")
+            self.remove_file(driver_path)
+            return None
+
+    def install_downloaded(self, driver_info, driver_path, computer_name):
+        hardware_id = driver_info["hardware_id"]
         try:
-            driver_path = self.download_driver(hardware_id)
             if not driver_path:
                 self.send_installation_report(
                     computer_name, hardware_id,
@@ -107,22 +325,19 @@ class DriverInstaller:
             success = self.install_driver_file(driver_path)
 
             if success:
+                peer_port = self.keep_for_peers(driver_path)
                 self.send_installation_report(
                     computer_name, hardware_id,
-                    "success", f"Драйвер {driver_info['available_driver']} установлен"
+                    "success", f"Драйвер {driver_info['available_driver']} установлен",
+                    peer_port=peer_port
                 )
             else:
+                # Проверенный файл оставляем: повторная попытка не будет скачивать его заново
                 self.send_installation_report(
                     computer_name, hardware_id,
                     "failed", "Ошибка установки драйвера"
                 )
 
-            try:
-                if os.path.exists(driver_path):
-                    os.remove(driver_path)
-            except:
-                pass
-
             return success
 
         except Exception as e:
@@ -131,4 +346,4 @@ class DriverInstaller:
                 computer_name, hardware_id,
                 "failed", f"Критическая ошибка: {str(e)}"
             )
-            return False
\ No newline at end of file
+            return False
@@ -1,76 +1,336 @@
 import platform
 import socket
 import subprocess
-import re
+import json
+import os
+import glob
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+try:
+    import psutil
+except ImportError:
+    psutil = None
 
-class HardwareDetector:
-    def __init__(self):
-        self.system_info = {}
 
-    def get_computer_name(self):
-        return socket.gethostname()
+PROBE_TIMEOUT = 15
+
+UNKNOWN_CPU = "Неизвестный процессор"
+UNKNOWN_GPU = "Неизвестная видеокарта"
+UNKNOWN_MOTHERBOARD = "Неизвестная материнская плата"
+DEFAULT_ADAPTERS = ["Сетевой адаптер"]
+
+DRIVER_DEVICE_CLASSES = {"DISPLAY": "gpu", "NET": "network", "PROCESSOR": "cpu"}
+
+INVENTORY_CACHE_FILE = "inventory_cache.json"
+INVENTORY_MAX_AGE = 24 * 60 * 60
+FINGERPRINT_FIELDS = ("cpu", "gpu", "motherboard", "network_adapters", "installed_drivers", "os")
+
+
+def parse_installed_drivers(rows):
+    drivers = []
+    seen = set()
+    for device_class, device_name, version in rows:
+        hardware_class = DRIVER_DEVICE_CLASSES.get((device_class or "").upper())
+        if not hardware_class or not device_name or not version or (device_name, version) in seen:
+            continue
+        seen.add((device_name, version))
+        drivers.append({
+            "hardware_class": hardware_class,
+            "device": device_name,
+            "version": version
+        })
+    return drivers
+
+
+class WmicBackend:
+    # Каждый класс оборудования - отдельный процесс wmic, но все запускаются параллельно
+    name = "wmic"
+
+    def _query(self, args):
+        return subprocess.check_output(
+            ["wmic"] + args,
+            text=True,
+            timeout=PROBE_TIMEOUT,
+            stderr=subprocess.DEVNULL
+        )
 
     def get_cpu_info(self):
         try:
-            if platform.system() == "Windows":
-                result = subprocess.check_output(
-                    "wmic cpu get name",
-                    shell=True,
-                    text=True
-                )
-                cpu_name = result.strip().split('\n')[1]
-                return cpu_name
-            else:
-                return platform.processor()
+            result = self._query(["cpu", "get", "name"])
+            return result.strip().split('\n')[1].strip()
         except:
-            return "Неизвестный процессор"
+            return UNKNOWN_CPU
 
     def get_gpu_info(self):
         try:
-            if platform.system() == "Windows":
-                result = subprocess.check_output(
-                    "wmic path win32_videocontroller get name",
-                    shell=True,
-                    text=True
-                )
-                gpu_lines = result.strip().split('\n')[1:]
-                gpus = [line.strip() for line in gpu_lines if line.strip()]
-                return gpus[0] if gpus else "Неизвестная видеокарта"
-            else:
-                return "Видеокарта (требуется ручная настройка для Linux)"
+            result = self._query(["path", "win32_videocontroller", "get", "name"])
+            gpu_lines = result.strip().split('\n')[1:]
+            gpus = [line.strip() for line in gpu_lines if line.strip()]
+            return gpus[0] if gpus else UNKNOWN_GPU
         except:
-            return "Неизвестная видеокарта"
+            return UNKNOWN_GPU
 
     def get_motherboard_info(self):
         try:
-            if platform.system() == "Windows":
-                result = subprocess.check_output(
-                    "wmic baseboard get product, manufacturer",
-                    shell=True,
-                    text=True
-                )
-                lines = result.strip().split('\n')[1:]
-                if lines:
-                    mb_info = lines[0].strip()
-                    return mb_info
-            return "Неизвестная материнская плата"
+            result = self._query(["baseboard", "get", "product,manufacturer"])
+            lines = result.strip().split('\n')[1:]
+            if lines:
+                return lines[0].strip()
+            return UNKNOWN_MOTHERBOARD
         except:
-            return "Неизвестная материнская плата"
+            return UNKNOWN_MOTHERBOARD
 
     def get_network_adapters(self):
         try:
-            if platform.system() == "Windows":
-                result = subprocess.check_output(
-                    "wmic nic where netenabled=true get name",
-                    shell=True,
-                    text=True
-                )
-                adapters = result.strip().split('\n')[1:]
-                return [adapter.strip() for adapter in adapters if adapter.strip()]
-            return ["Сетевой адаптер"]
+            result = self._query(["nic", "where", "netenabled=true", "get", "name"])
+            adapters = result.strip().split('\n')[1:]
+            return [adapter.strip() for adapter in adapters if adapter.strip()]
+        except:
+            return DEFAULT_ADAPTERS
+
+    def get_installed_drivers(self):
+        try:
+            result = self._query([
+                "path", "win32_pnpsigneddriver", "where",
+                "DeviceClass='DISPLAY' or DeviceClass='NET' or DeviceClass='PROCESSOR'",
+                "get", "DeviceClass,DeviceName,DriverVersion", "/format:csv"
+            ])
+            rows = []
+            for line in result.strip().split('\n')[1:]:
+                parts = [part.strip() for part in line.split(',')]
+                if len(parts) >= 4:
+                    rows.append(parts[1:4])
+            return parse_installed_drivers(rows)
         except:
-            return ["Сетевой адаптер"]
+            return []
+
+    def collect(self):
+        probes = {
+            "cpu": self.get_cpu_info,
+            "gpu": self.get_gpu_info,
+            "motherboard": self.get_motherboard_info,
+            "network_adapters": self.get_network_adapters,
+            "installed_drivers": self.get_installed_drivers,
+        }
+        with ThreadPoolExecutor(max_workers=len(probes)) as executor:
+            futures = {key: executor.submit(probe) for key, probe in probes.items()}
+            return {key: future.result() for key, future in futures.items()}
+
+
+CIM_SCRIPT = """
+$ErrorActionPreference = 'SilentlyContinue'
+$board = Get-CimInstance Win32_BaseBoard | Select-Object -First 1
+@{
+    cpu = @(Get-CimInstance Win32_Processor | ForEach-Object { $_.Name })
+    gpu = @(Get-CimInstance Win32_VideoController | ForEach-Object { $_.Name })
+    motherboard = "$($board.Manufacturer) $($board.Product)".Trim()
+    network_adapters = @(Get-CimInstance Win32_NetworkAdapter -Filter 'NetEnabled=true' | ForEach-Object { $_.Name })
+    installed_drivers = @(Get-CimInstance Win32_PnPSignedDriver -Filter "DeviceClass='DISPLAY' or DeviceClass='NET' or DeviceClass='PROCESSOR'" |
+        ForEach-Object { ,@($_.DeviceClass, $_.DeviceName, $_.DriverVersion) })
+} | ConvertTo-Json -Compress -Depth 4
+"""
+
+
+class CimBackend:
+    # Все классы оборудования одним запуском PowerShell в одной CIM-сессии
+    name = "cim"
+
+    def collect(self):
+        result = subprocess.check_output(
+            ["powershell", "-NoProfile", "-NonInteractive", "-Command", CIM_SCRIPT],
+            text=True,
+            timeout=PROBE_TIMEOUT * 2,
+            stderr=subprocess.DEVNULL
+        )
+        data = json.loads(result)
+
+        cpus = [name.strip() for name in data.get("cpu") or [] if name]
+        gpus = [name.strip() for name in data.get("gpu") or [] if name]
+        adapters = [name.strip() for name in data.get("network_adapters") or [] if name]
+
+        return {
+            "cpu": cpus[0] if cpus else UNKNOWN_CPU,
+            "gpu": gpus[0] if gpus else UNKNOWN_GPU,
+            "motherboard": data.get("motherboard") or UNKNOWN_MOTHERBOARD,
+            "network_adapters": adapters or DEFAULT_ADAPTERS,
+            "installed_drivers": parse_installed_drivers(
+                row for row in data.get("installed_drivers") or [] if isinstance(row, list) and len(row) == 3
+            ),
+        }
+
+
+PCI_IDS_PATHS = ("/usr/share/hwdata/pci.ids", "/usr/share/misc/pci.ids", "/usr/share/pci.ids")
+PCI_VENDORS = {"10de": "NVIDIA", "1002": "AMD", "8086": "Intel", "10ec": "Realtek", "14e4": "Broadcom",
+               "168c": "Qualcomm Atheros", "1969": "Qualcomm Atheros", "14c3": "MediaTek"}
+
+
+class LinuxBackend:
+    # Читаем /proc и /sys напрямую, без запуска внешних процессов
+    name = "linux"
+
+    def __init__(self, root="/"):
+        self.root = root
+        self._pci_names = None
+
+    def _read(self, path, default=""):
+        try:
+            with open(os.path.join(self.root, path.lstrip("/")), encoding="utf-8", errors="replace") as file:
+                return file.read().strip()
+        except OSError:
+            return default
+
+    def _pci_name(self, vendor_id, device_id):
+        vendor_id = vendor_id.lower().replace("0x", "")
+        device_id = device_id.lower().replace("0x", "")
+        if self._pci_names is None:
+            self._pci_names = self._load_pci_names()
+
+        vendor_name, devices = self._pci_names.get(vendor_id, (PCI_VENDORS.get(vendor_id, vendor_id), {}))
+        device_name = devices.get(device_id)
+        return f"{vendor_name} {device_name}" if device_name else f"{vendor_name} [{vendor_id}:{device_id}]"
+
+    def _load_pci_names(self):
+        names = {}
+        for path in PCI_IDS_PATHS:
+            try:
+                file = open(os.path.join(self.root, path.lstrip("/")), encoding="utf-8", errors="replace")
+            except OSError:
+                continue
+            with file:
+                vendor = None
+                for line in file:
+                    if line.startswith("#") or not line.strip():
+                        continue
+                    if line.startswith("C "):
+                        break
+                    if not line.startswith("\t"):
+                        vendor_id, _, vendor_name = line.strip().partition("  ")
+                        vendor = (vendor_name, {})
+                        names[vendor_id] = vendor
+                    elif not line.startswith("\t\t") and vendor:
+                        device_id, _, device_name = line.strip().partition("  ")
+                        vendor[1][device_id] = device_name
+            break
+        return names
+
+    def get_cpu_info(self):
+        for line in self._read("/proc/cpuinfo").split("\n"):
+            key, _, value = line.partition(":")
+            if key.strip() in ("model name", "Model", "Hardware") and value.strip():
+                return value.strip()
+        return platform.processor() or UNKNOWN_CPU
+
+    def _pci_devices(self, pattern):
+        devices = []
+        for path in sorted(glob.glob(os.path.join(self.root, pattern.lstrip("/")))):
+            device_dir = os.path.join(path, "device")
+            vendor_id = self._read(os.path.join(device_dir, "vendor"))
+            device_id = self._read(os.path.join(device_dir, "device"))
+            if vendor_id and device_id:
+                driver = os.path.basename(os.path.realpath(os.path.join(device_dir, "driver")))
+                devices.append((self._pci_name(vendor_id, device_id), driver))
+        return devices
+
+    def collect(self):
+        gpus = self._pci_devices("/sys/class/drm/card[0-9]")
+        adapters = self._pci_devices("/sys/class/net/*")
+
+        board = " ".join(filter(None, (
+            self._read("/sys/devices/virtual/dmi/id/board_vendor"),
+            self._read("/sys/devices/virtual/dmi/id/board_name"),
+        )))
+
+        installed = []
+        for hardware_class, devices in (("gpu", gpus), ("network", adapters)):
+            for device_name, driver in devices:
+                version = self._read(f"/sys/module/{driver}/version") if driver else ""
+                if version:
+                    installed.append({"hardware_class": hardware_class, "device": device_name, "version": version})
+
+        return {
+            "cpu": self.get_cpu_info(),
+            "gpu": gpus[0][0] if gpus else UNKNOWN_GPU,
+            "motherboard": board or UNKNOWN_MOTHERBOARD,
+            "network_adapters": list(dict.fromkeys(name for name, _ in adapters)) or DEFAULT_ADAPTERS,
+            "installed_drivers": installed,
+        }
+
+
+def default_backend():
+    if platform.system() == "Windows":
+        return CimBackend()
+    if platform.system() == "Linux":
+        return LinuxBackend()
+    return None
+
+
+def inventory_fingerprint(hardware):
+    payload = {field: hardware.get(field) for field in FINGERPRINT_FIELDS}
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+def cheap_signals():
+    # Дешевые признаки того, что оборудование могло измениться: перезагрузка,
+    # число процессоров, набор сетевых интерфейсов и видеоустройств
+    try:
+        return {
+            "boot_time": boot_time(),
+            "cpu_count": os.cpu_count(),
+            "net_interfaces": sorted(psutil.net_if_addrs() if psutil else
+                                     (name for _, name in socket.if_nameindex())),
+            "drm_cards": sorted(os.path.basename(path) for path in glob.glob("/sys/class/drm/card[0-9]")),
+        }
+    except Exception:
+        return None
+
+
+def boot_time():
+    if psutil is not None:
+        return int(psutil.boot_time())
+    with open("/proc/stat") as file:
+        for line in file:
+            if line.startswith("btime"):
+                return int(line.split()[1])
+    return None
+
+
+class InventoryCache:
+    def __init__(self, path=INVENTORY_CACHE_FILE, max_age=INVENTORY_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, data):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def invalidate(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class HardwareDetector:
+    def __init__(self, backend=None, cache=None):
+        self.system_info = {}
+        self.backend = backend or default_backend()
+        self.cache = cache or InventoryCache()
+        self.from_cache = False
+
+    def get_computer_name(self):
+        return socket.gethostname()
 
     def get_ip_address(self):
         try:
@@ -80,12 +340,68 @@ class HardwareDetector:
         except:
             return "127.0.0.1"
 
-    def get_all_hardware(self):
-        return {
-            "cpu": self.get_cpu_info(),
-            "gpu": self.get_gpu_info(),
-            "motherboard": self.get_motherboard_info(),
-            "network_adapters": self.get_network_adapters(),
-            "ip_address": self.get_ip_address(),
-            "os": f"{platform.system()} {platform.release()}"
-        }
\ No newline at end of file
+    def _collect(self):
+        if self.backend is None:
+            return {
+                "cpu": platform.processor() or UNKNOWN_CPU,
+                "gpu": UNKNOWN_GPU,
+                "motherboard": UNKNOWN_MOTHERBOARD,
+                "network_adapters": DEFAULT_ADAPTERS,
+                "installed_drivers": [],
+            }
+        try:
+            return self.backend.collect()
+        except Exception:
+            if isinstance(self.backend, CimBackend):
+                # PowerShell недоступен или запрещен политикой - параллельные запросы wmic
+                self.backend = WmicBackend()
+                return self.backend.collect()
+            raise
+
+    def _cached_inventory(self, signals):
+        cached = self.cache.load()
+        if not cached or signals is None or cached.get("signals") != signals:
+            return None
+        if time.time() - cached.get("detected_at", 0) > self.cache.max_age:
+            return None
+        return cached
+
+    def get_all_hardware(self, use_cache=False):
+        signals = cheap_signals() if use_cache else None
+        cached = self._cached_inventory(signals) if use_cache else None
+        self.from_cache = cached is not None
+
+        if cached:
+            hardware = dict(cached["hardware"])
+        else:
+            hardware = self._collect()
+            hardware["os"] = f"{platform.system()} {platform.release()}"
+
+        hardware["ip_address"] = self.get_ip_address()
+        hardware["fingerprint"] = inventory_fingerprint(hardware)
+
+        if use_cache and not cached:
+            previous = self.cache.load() or {}
+            self.cache.save({
+                "hardware": {field: hardware.get(field) for field in FINGERPRINT_FIELDS},
+                "fingerprint": hardware["fingerprint"],
+                "signals": signals,
+                "detected_at": time.time(),
+                "acknowledged_fingerprint": previous.get("acknowledged_fingerprint"),
+            })
+        return hardware
+
+    def acknowledged_fingerprint(self):
+        cached = self.cache.load()
+        return cached.get("acknowledged_fingerprint") if cached else None
+
+    def acknowledge(self, fingerprint):
+        # Сервер подтвердил, что хранит инвентаризацию с этим отпечатком
+        cached = self.cache.load()
+        if cached and cached.get("fingerprint") == fingerprint:
+            cached["acknowledged_fingerprint"] = fingerprint
+            self.cache.save(cached)
+
+    def invalidate_cache(self):
+        # После установки драйвера версии изменились - при следующем запуске опрашиваем заново
+        self.cache.invalidate()
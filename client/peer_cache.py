@@ -0,0 +1,148 @@
+import os
+import re
+import shutil
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+PEER_PORT = 8765
+PEER_CACHE_DIR = "peer_cache"
+PEER_CACHE_MAX_BYTES = 10 * 1024 * 1024 * 1024
+PEER_CHUNK_SIZE = 1024 * 1024
+
+_BLOB_RE = re.compile(r"^/blobs/([0-9a-f]{64})$")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class PeerCache:
+    # Установленные драйверы хранятся по SHA-256 и раздаются соседям по сети
+    def __init__(self, store_dir=PEER_CACHE_DIR, max_bytes=PEER_CACHE_MAX_BYTES):
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        os.makedirs(store_dir, exist_ok=True)
+
+    def path_for(self, sha256):
+        return os.path.join(self.store_dir, sha256)
+
+    def has(self, sha256):
+        return bool(sha256) and os.path.exists(self.path_for(sha256))
+
+    def add(self, file_path, sha256):
+        with self._lock:
+            target = self.path_for(sha256)
+            if os.path.exists(target):
+                os.remove(file_path)
+            else:
+                shutil.move(file_path, target)
+            os.utime(target)
+            self.evict()
+
+    def copy_to(self, sha256, file_path):
+        try:
+            os.link(self.path_for(sha256), file_path)
+        except OSError:
+            shutil.copyfile(self.path_for(sha256), file_path)
+        os.utime(self.path_for(sha256))
+
+    def evict(self):
+        # Удаляем давно не использовавшиеся файлы, пока кеш больше лимита
+        entries = []
+        for name in os.listdir(self.store_dir):
+            path = os.path.join(self.store_dir, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            self.logger.info(f"🗑️ Удален из кеша: {os.path.basename(path)}")
+
+
+class PeerRequestHandler(BaseHTTPRequestHandler):
+    cache = None
+
+    def do_HEAD(self):
+        self.serve(send_body=False)
+
+    def do_GET(self):
+        self.serve(send_body=True)
+
+    def serve(self, send_body):
+        match = _BLOB_RE.match(self.path)
+        if not match or not self.cache.has(match.group(1)):
+            self.send_error(404)
+            return
+
+        sha256 = match.group(1)
+        path = self.cache.path_for(sha256)
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and (not if_range or if_range.strip('"') == sha256):
+            parsed = _RANGE_RE.match(range_header.strip())
+            if not parsed or not any(parsed.groups()):
+                self.send_error(416)
+                return
+            first, last = parsed.groups()
+            if first:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+            else:
+                start = max(0, size - int(last))
+            if start >= size or start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", f'"{sha256}"')
+        self.end_headers()
+        if not send_body:
+            return
+
+        remaining = end - start + 1
+        with open(path, "rb") as file:
+            file.seek(start)
+            while remaining > 0:
+                chunk = file.read(min(PEER_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PeerCacheServer:
+    def __init__(self, cache, port=PEER_PORT, host="0.0.0.0"):
+        handler = type("Handler", (PeerRequestHandler,), {"cache": cache})
+        self.cache = cache
+        self.port = port
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
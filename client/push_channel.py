@@ -0,0 +1,118 @@
+import json
+import random
+import logging
+import threading
+
+import requests
+
+
+PUSH_CONNECT_TIMEOUT = 10
+# Сервер присылает пинг каждые 25 с; дольше тишины - соединение потеряно
+PUSH_READ_TIMEOUT = 75
+PUSH_MIN_RECONNECT = 5
+PUSH_MAX_RECONNECT = 600
+
+
+class PushChannel:
+    # Постоянное соединение с сервером (Server-Sent Events): сервер сообщает, когда
+    # для этого компьютера появились драйверы или задания, и агент не опрашивает его
+    def __init__(self, server_url, computer_name, on_notify):
+        self.url = f"{server_url}/computers/{computer_name}/events"
+        self.on_notify = on_notify
+        self.last_event_id = None
+        self.connected = False
+        self.logger = logging.getLogger(__name__)
+        self._stop = threading.Event()
+        self._thread = None
+        self._failures = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="push-channel", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        # Отдельная сессия: основная используется потоком проверки обновлений
+        session = requests.Session()
+        while not self._stop.is_set():
+            delay = self._listen(session)
+            if delay is None:
+                return
+            self._stop.wait(delay)
+
+    def _listen(self, session):
+        headers = {"Accept": "text/event-stream"}
+        if self.last_event_id is not None:
+            headers["Last-Event-ID"] = str(self.last_event_id)
+
+        try:
+            with session.get(self.url, headers=headers, stream=True,
+                             timeout=(PUSH_CONNECT_TIMEOUT, PUSH_READ_TIMEOUT)) as response:
+                if response.status_code == 404:
+                    self.logger.info("[PUSH] Сервер не поддерживает уведомления, используем периодическую проверку")
+                    return None
+                if response.status_code != 200:
+                    self.logger.error(f"[ERROR] Канал уведомлений: ответ {response.status_code}")
+                    return self._reconnect_delay(response.headers.get("Retry-After"))
+
+                self._read(response)
+        except requests.RequestException as e:
+            if self.connected:
+                self.logger.error(f"[ERROR] Канал уведомлений закрыт: {e}")
+        finally:
+            self.connected = False
+
+        return self._reconnect_delay()
+
+    def _read(self, response):
+        event, data = None, []
+        for line in response.iter_lines(decode_unicode=True):
+            if self._stop.is_set():
+                return
+            if line is None:
+                continue
+            if not line:
+                if event and data:
+                    self._dispatch(event, "\n".join(data))
+                event, data = None, []
+            elif line.startswith(":"):
+                continue
+            else:
+                field, _, value = line.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if field == "id" and value.isdigit():
+                    self.last_event_id = int(value)
+                elif field == "event":
+                    event = value
+                elif field == "data":
+                    data.append(value)
+
+    def _dispatch(self, event, data):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+
+        if event == "hello":
+            if not self.connected:
+                self.logger.info("[PUSH] Подключен канал уведомлений")
+            self.connected = True
+            self._failures = 0
+        elif event == "updates":
+            if message.get("resync"):
+                self.logger.info("[PUSH] Пропущены уведомления, проверяем обновления")
+            else:
+                self.logger.info(f"[PUSH] Сервер сообщил о новых драйверах: {', '.join(message.get('hardware_ids', []))}")
+            self.on_notify(message)
+
+    def _reconnect_delay(self, retry_after=None):
+        self._failures += 1
+        delay = min(PUSH_MAX_RECONNECT, PUSH_MIN_RECONNECT * 2 ** self._failures)
+        try:
+            delay = max(delay, int(retry_after)) if retry_after else delay
+        except ValueError:
+            pass
+        return random.uniform(delay / 2, delay)
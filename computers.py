@@ -0,0 +1,58 @@
+from typing import Optional
+
+from paging import prefix_upper_bound
+
+
+COMPUTER_FIELDS = ("name", "ip", "cpu", "gpu", "gpu_vendor", "motherboard", "last_seen", "created_at")
+COMPUTER_DEFAULT_FIELDS = ("name", "ip", "cpu", "gpu", "last_seen")
+COMPUTER_SORTS = ("last_seen", "created_at", "name")
+COMPUTER_DEVICES_SQL = (
+    "SELECT cpu, gpu, motherboard, network_adapters, installed_drivers, ip FROM computers WHERE name = ?"
+)
+
+#Запрос страницы GET /computers. Каждое сочетание фильтров и сортировки должно
+#читаться по индексу уже в нужном порядке - тогда страница стоит O(limit), а не
+#сортировку всех подходящих строк. Поиск по началу имени идет по индексу имени,
+#поэтому с name_prefix доступна только сортировка по имени
+
+
+def normalize_timestamp(value: Optional[str]) -> Optional[str]:
+    # В базе время хранится как 'YYYY-MM-DD HH:MM:SS' (CURRENT_TIMESTAMP)
+    return value.replace("T", " ").rstrip("Z") if value else value
+
+
+def sort_columns(sort: str):
+    return ("name",) if sort == "name" else (sort, "name")
+
+
+def computers_page_query(selected, sort: str, descending: bool, limit: int, after=None,
+                         name_prefix: Optional[str] = None, gpu_vendor: Optional[str] = None,
+                         seen_after: Optional[str] = None, seen_before: Optional[str] = None):
+    order_by = sort_columns(sort)
+
+    conditions, params = [], []
+    if name_prefix:
+        conditions.append("name >= ? AND name < ?")
+        params += [name_prefix, prefix_upper_bound(name_prefix)]
+    if gpu_vendor:
+        conditions.append("gpu_vendor = ?")
+        params.append(gpu_vendor.lower())
+    if seen_after:
+        conditions.append("last_seen >= ?")
+        params.append(normalize_timestamp(seen_after))
+    if seen_before:
+        conditions.append("last_seen < ?")
+        params.append(normalize_timestamp(seen_before))
+    if after:
+        # Keyset-пагинация: продолжаем строго после последней строки предыдущей страницы
+        comparison = "<" if descending else ">"
+        conditions.append(f"({', '.join(order_by)}) {comparison} ({', '.join('?' * len(order_by))})")
+        params += after
+
+    columns = tuple(dict.fromkeys(tuple(selected) + order_by))
+    direction = "DESC" if descending else "ASC"
+    sql = f"SELECT {', '.join(columns)} FROM computers"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += f" ORDER BY {', '.join(f'{column} {direction}' for column in order_by)} LIMIT ?"
+    return sql, (*params, limit + 1), columns
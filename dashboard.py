@@ -0,0 +1,204 @@
+import asyncio
+import json
+import os
+
+from fastapi import HTTPException
+
+from catalog import driver_summary
+from events import EventHubFull, events_after, events_since, last_event_seq, format_event, EVENTS_BATCH
+from paging import encode_cursor, decode_cursor
+from stats import read_stats, status_summary
+
+
+DASHBOARD_POLL_INTERVAL = float(os.environ.get("DASHBOARD_POLL_INTERVAL", "2"))
+MAX_DASHBOARDS = int(os.environ.get("DASHBOARD_MAX_SUBSCRIBERS", "200"))
+SEEN_BATCH = 500
+DASHBOARD_QUEUE_SIZE = 64
+DASHBOARD_COMPUTER_FIELDS = ("name", "ip", "cpu", "gpu", "last_seen")
+
+#Живые изменения для веб-интерфейса вместо перезагрузки списков после каждого
+#действия. Воркер раз в DASHBOARD_POLL_INTERVAL читает новые события и компьютеры,
+#вышедшие на связь (по индексу seen_seq), один раз превращает их в изменения и
+#раздает всем открытым панелям - число администраторов не умножает запросы к БД.
+#Позиция потока (seq события и seen_seq компьютера) передается в id сообщений:
+#после переподключения панель получает пропущенное или команду перечитать списки
+
+def seen_position(conn) -> int:
+    row = conn.execute("SELECT value FROM stats WHERE key = 'seen_seq'").fetchone()
+    return row[0] if row else 0
+
+
+def stream_position(conn):
+    return last_event_seq(conn), seen_position(conn)
+
+
+def computers_seen_query(after: int, limit: int = SEEN_BATCH, until: int = None):
+    sql = f"SELECT {', '.join(DASHBOARD_COMPUTER_FIELDS)}, seen_seq FROM computers WHERE seen_seq > ?"
+    params = [after]
+    if until is not None:
+        sql += " AND seen_seq <= ?"
+        params.append(until)
+    sql += " ORDER BY seen_seq LIMIT ?"
+    return sql, (*params, limit)
+
+
+def computers_seen(conn, after: int, limit: int = SEEN_BATCH, until: int = None):
+    return conn.execute(*computers_seen_query(after, limit, until)).fetchall()
+
+
+def dashboard_changes(catalog, events, seen_rows):
+    changes = []
+    for _, kind, payload in events:
+        data = json.loads(payload)
+        if kind == "drivers":
+            # Драйвер мог быть удален следом - тогда его уже нет в каталоге
+            drivers = [catalog.get(hardware_id) for hardware_id in data["hardware_ids"]]
+            items = [driver_summary(driver) for driver in drivers if driver]
+            if items:
+                changes.append({"type": "drivers_added", "items": items})
+        elif kind == "drivers_removed":
+            changes.append({"type": "drivers_removed", "hardware_ids": data["hardware_ids"]})
+        elif kind == "computers_removed":
+            changes.append({"type": "computers_removed", "names": data["names"]})
+        elif kind == "jobs":
+            changes.append({"type": "jobs", "status": "pending", "jobs": [
+                {"computer_name": name, "hardware_id": data["hardware_id"]} for name in data["computers"]
+            ]})
+        elif kind == "job_status":
+            changes.append({"type": "jobs", **data})
+
+    if seen_rows:
+        # В порядке отметок: панель поднимает каждый компьютер наверх списка
+        changes.append({"type": "computers_seen",
+                        "items": [dict(zip(DASHBOARD_COMPUTER_FIELDS, row)) for row in seen_rows]})
+    return changes
+
+
+class DashboardFeed:
+    def __init__(self, db, catalog, poll_interval: float = DASHBOARD_POLL_INTERVAL,
+                 max_subscribers: int = MAX_DASHBOARDS):
+        self.db = db
+        self.catalog = catalog
+        self.poll_interval = poll_interval
+        self.max_subscribers = max_subscribers
+        self.seq = 0
+        self.seen = 0
+        self.status = None
+        self.resyncs = 0
+        self._subscribers = set()
+        self._task = None
+
+    @property
+    def position(self) -> str:
+        return encode_cursor((self.seq, self.seen))
+
+    @property
+    def connections(self) -> int:
+        return len(self._subscribers)
+
+    def stats(self) -> dict:
+        return {"connections": len(self._subscribers), "seq": self.seq, "resyncs": self.resyncs}
+
+    async def start(self):
+        (self.seq, self.seen), counters = await self.db.run(self._skip)
+        self.status = status_summary(counters)
+        self._task = asyncio.create_task(self._poll_periodically())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def subscribe(self) -> asyncio.Queue:
+        if len(self._subscribers) >= self.max_subscribers:
+            raise EventHubFull(f"Открыто панелей: {len(self._subscribers)}")
+        queue = asyncio.Queue(maxsize=DASHBOARD_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def hello(self) -> str:
+        return format_event("hello", {"status": self.status}, self.position)
+
+    def resync(self) -> str:
+        self.resyncs += 1
+        return format_event("resync", {"status": self.status}, self.position)
+
+    def broadcast(self, message: str):
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Панель не успевает за изменениями - пусть перечитает списки целиком
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.resync())
+
+    def _read(self, conn):
+        return events_after(conn, self.seq), computers_seen(conn, self.seen), read_stats(conn)
+
+    def _skip(self, conn):
+        return stream_position(conn), read_stats(conn)
+
+    async def poll(self):
+        if not self._subscribers:
+            # Смотреть некому - только сдвигаем позицию, чтобы новая панель не получила старое
+            (self.seq, self.seen), counters = await self.db.run(self._skip)
+            self.status = status_summary(counters)
+            return
+
+        while True:
+            events, seen_rows, counters = await self.db.run(self._read)
+            if any(kind == "drivers" for _, kind, _ in events):
+                await self.catalog.refresh(self.db)
+
+            changes = dashboard_changes(self.catalog, events, seen_rows)
+            status = status_summary(counters)
+            # Позиция и рассылка меняются без await между ними: пинг не обгонит изменения
+            if events:
+                self.seq = events[-1][0]
+            if seen_rows:
+                self.seen = seen_rows[-1][-1]
+            message = {"changes": changes}
+            if status != self.status:
+                self.status = message["status"] = status
+            if changes or "status" in message:
+                self.broadcast(format_event("changes", message, self.position))
+
+            if len(events) < EVENTS_BATCH and len(seen_rows) < SEEN_BATCH:
+                return
+
+    async def catch_up(self, position: str) -> str:
+        # Панель переподключилась с id последнего полученного сообщения
+        try:
+            seq, seen = decode_cursor(position, (int, int))
+        except (HTTPException, TypeError, ValueError):
+            return self.resync()
+
+        until = self.seen
+
+        def read(conn):
+            first, events = events_since(conn, seq)
+            return first, events, computers_seen(conn, seen, SEEN_BATCH + 1, until)
+
+        first, events, seen_rows = await self.db.run(read)
+        if (events and first > seq + 1) or len(seen_rows) > SEEN_BATCH:
+            # Пропущенные события уже удалены или пропущено слишком много - проще перечитать
+            return self.resync()
+
+        # Более новые изменения придут в очередь после очередного poll
+        events = [event for event in events if event[0] <= self.seq]
+        if any(kind == "drivers" for _, kind, _ in events):
+            await self.catalog.refresh(self.db)
+        changes = dashboard_changes(self.catalog, events, seen_rows)
+        return format_event("changes", {"changes": changes, "status": self.status}, self.position)
+
+    async def _poll_periodically(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"⚠️ Ошибка рассылки изменений веб-интерфейсу: {e}")
@@ -0,0 +1,166 @@
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from metrics import observe_query
+
+
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+STATEMENT_CACHE_SIZE = 256
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class Database:
+    def __init__(self, db_path: str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: транзакции открываем явно через BEGIN IMMEDIATE,
+        # чтобы писатели не получали SQLITE_BUSY при повышении блокировки
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout(f"Нет свободных соединений с БД за {self.timeout} с")
+
+    def _release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put_nowait(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            with self._begin(conn):
+                yield conn
+
+    @contextmanager
+    def _begin(self, conn: sqlite3.Connection):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    @property
+    def in_use(self) -> int:
+        return self._created - self._idle.qsize()
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    # Асинхронный интерфейс: все обращения к SQLite выполняются в отдельном
+    # пуле потоков того же размера, что и пул соединений, и не блокируют event loop
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.size,
+                        thread_name_prefix="db"
+                    )
+        return self._executor
+
+    def _call(self, func, args, write, submitted, label=None):
+        # Ожидание потока и соединения замеряется отдельно от работы с БД (metrics.py);
+        # ожидание блокировки записи и COMMIT входят во время операции
+        with self.connection() as conn:
+            started = time.perf_counter()
+            try:
+                if write:
+                    with self._begin(conn):
+                        result = func(conn, *args)
+                else:
+                    result = func(conn, *args)
+            except BaseException:
+                observe_query(label or func, write, started - submitted, time.perf_counter() - started, failed=True)
+                raise
+            observe_query(label or func, write, started - submitted, time.perf_counter() - started)
+        return result
+
+    async def run(self, func, *args, write: bool = False, label: str = None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), self._call, func, args, write, time.perf_counter(), label
+        )
+
+    # Одиночные запросы в метриках подписываются текстом SQL, а не именем функции
+
+    async def fetchone(self, sql: str, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone(), label=sql)
+
+    async def fetchall(self, sql: str, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall(), label=sql)
+
+    async def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        return await self.run(lambda conn: conn.execute(sql, params), write=True, label=sql)
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import os
+
+from matching import computer_devices, pending_updates
+
+
+EVENTS_POLL_INTERVAL = float(os.environ.get("EVENTS_POLL_INTERVAL", "1"))
+EVENTS_PING_INTERVAL = float(os.environ.get("EVENTS_PING_INTERVAL", "25"))
+EVENTS_PRESENCE_INTERVAL = float(os.environ.get("EVENTS_PRESENCE_INTERVAL", "600"))
+EVENTS_KEEP = int(os.environ.get("EVENTS_KEEP", "10000"))
+MAX_SUBSCRIBERS = int(os.environ.get("EVENTS_MAX_SUBSCRIBERS", "10000"))
+EVENTS_BATCH = 500
+SUBSCRIBER_QUEUE_SIZE = 16
+
+NEW_EVENTS_SQL = "SELECT seq, kind, payload FROM events WHERE seq > ? ORDER BY seq LIMIT ?"
+SUBSCRIBED_COMPUTERS_SQL = '''
+    SELECT name, cpu, gpu, motherboard, network_adapters, installed_drivers
+    FROM computers WHERE name IN (SELECT value FROM json_each(?))
+'''
+
+#Уведомления агентам вместо частого опроса. Изменения, важные агентам (новые
+#драйверы, задания развертываний), записываются в events в той же транзакции.
+#Каждый воркер читает новые события раз в EVENTS_POLL_INTERVAL и сам решает, кого
+#из подключенных к нему агентов они касаются - так работает и при нескольких воркерах
+
+
+class EventHubFull(Exception):
+    pass
+
+
+def publish_event(conn, kind: str, payload: dict) -> int:
+    seq = conn.execute(
+        "INSERT INTO events (kind, payload) VALUES (?, ?)", (kind, json.dumps(payload, ensure_ascii=False))
+    ).lastrowid
+    # Храним только последние EVENTS_KEEP событий - для догоняния после переподключения
+    conn.execute("DELETE FROM events WHERE seq <= ?", (seq - EVENTS_KEEP,))
+    return seq
+
+
+def publish_job_status(conn, status: str, jobs):
+    # jobs - пары (computer_name, hardware_id) заданий, перешедших в status
+    if jobs:
+        publish_event(conn, "job_status", {
+            "status": status,
+            "jobs": [{"computer_name": name, "hardware_id": hardware_id} for name, hardware_id in jobs]
+        })
+
+
+def last_event_seq(conn) -> int:
+    return conn.execute("SELECT IFNULL(MAX(seq), 0) FROM events").fetchone()[0]
+
+
+def events_after(conn, seq: int, limit: int = EVENTS_BATCH):
+    return conn.execute(NEW_EVENTS_SQL, (seq, limit)).fetchall()
+
+
+def events_since(conn, seq: int):
+    # seq не переиспользуются (AUTOINCREMENT), пропуски появляются только от удаления старых
+    first = conn.execute("SELECT MIN(seq) FROM events").fetchone()[0]
+    return first, events_after(conn, seq, EVENTS_KEEP)
+
+
+def affected_computers(conn, catalog, events, names, managed=frozenset()):
+    # Какие из компьютеров names должны проверить обновления: адресаты заданий
+    # и те, кому новый драйвер подходит (как в check-updates, без драйверов развертываний)
+    targets = {}
+    added = set()
+    for _, kind, payload in events:
+        data = json.loads(payload)
+        if kind == "jobs":
+            for name in data["computers"]:
+                if name in names:
+                    targets.setdefault(name, set()).add(data["hardware_id"])
+        elif kind == "drivers":
+            added.update(data["hardware_ids"])
+
+    added -= managed
+    if added:
+        rows = conn.execute(SUBSCRIBED_COMPUTERS_SQL, (json.dumps(sorted(names)),))
+        for name, cpu, gpu, motherboard, adapters, installed in rows:
+            installed_drivers = json.loads(installed) if installed else []
+            updates = pending_updates(catalog, computer_devices(cpu, gpu, motherboard, adapters), installed_drivers)
+            matched = added.intersection(update["hardware_id"] for update in updates)
+            if matched:
+                targets.setdefault(name, set()).update(matched)
+    return targets
+
+
+def format_event(event: str, data: dict, event_id: int = None) -> str:
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class EventHub:
+    # managed - функция (conn) -> hardware_id драйверов, которые выдаются только заданиями
+    def __init__(self, db, catalog, managed=None, poll_interval: float = EVENTS_POLL_INTERVAL,
+                 max_subscribers: int = MAX_SUBSCRIBERS):
+        self.db = db
+        self.catalog = catalog
+        self.managed = managed
+        self.poll_interval = poll_interval
+        self.max_subscribers = max_subscribers
+        self.last_seq = 0
+        self.notified = 0
+        self._subscribers = {}
+        self._count = 0
+        self._task = None
+
+    @property
+    def connections(self) -> int:
+        return self._count
+
+    def stats(self) -> dict:
+        return {
+            "connections": self._count,
+            "computers": len(self._subscribers),
+            "last_seq": self.last_seq,
+            "notified": self.notified,
+        }
+
+    async def start(self):
+        # Старые события уже учтены агентами при обычной проверке обновлений
+        self.last_seq = await self.db.run(last_event_seq)
+        self._task = asyncio.create_task(self._poll_periodically())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def subscribe(self, computer_name: str) -> asyncio.Queue:
+        if self._count >= self.max_subscribers:
+            raise EventHubFull(f"Подключено агентов: {self._count}")
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(computer_name, set()).add(queue)
+        self._count += 1
+        return queue
+
+    def unsubscribe(self, computer_name: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(computer_name)
+        if queues and queue in queues:
+            queues.discard(queue)
+            self._count -= 1
+            if not queues:
+                del self._subscribers[computer_name]
+
+    def notify(self, computer_name: str, message: dict):
+        for queue in self._subscribers.get(computer_name, ()):
+            try:
+                queue.put_nowait(message)
+                self.notified += 1
+            except asyncio.QueueFull:
+                # Агент еще не забрал прошлые уведомления - проверка обновлений все равно впереди
+                pass
+
+    def _targets(self, conn, events, names):
+        managed = self.managed(conn) if self.managed else frozenset()
+        return affected_computers(conn, self.catalog, events, names, managed)
+
+    async def catch_up(self, computer_name: str, last_id: int):
+        # Агент переподключился: были ли для него события, пока соединения не было
+        first, events = await self.db.run(events_since, last_id)
+        # Более новые события агент получит из очереди после очередного poll
+        events = [event for event in events if event[0] <= self.last_seq]
+        if not events:
+            return None
+        if first > last_id + 1:
+            # Часть пропущенных событий уже удалена - пусть агент просто проверит обновления
+            return {"seq": events[-1][0], "resync": True}
+
+        if any(kind == "drivers" for _, kind, _ in events):
+            await self.catalog.refresh(self.db)
+        targets = await self.db.run(self._targets, events, {computer_name})
+        if computer_name not in targets:
+            return None
+        return {"seq": events[-1][0], "hardware_ids": sorted(targets[computer_name])}
+
+    async def poll(self):
+        while True:
+            events = await self.db.run(events_after, self.last_seq)
+            if not events:
+                return
+            self.last_seq = events[-1][0]
+
+            names = set(self._subscribers)
+            if names:
+                if any(kind == "drivers" for _, kind, _ in events):
+                    # Драйвер мог добавить другой воркер - каталог должен его уже знать
+                    await self.catalog.refresh(self.db)
+                targets = await self.db.run(self._targets, events, names)
+                for name, hardware_ids in targets.items():
+                    self.notify(name, {"seq": self.last_seq, "hardware_ids": sorted(hardware_ids)})
+
+            if len(events) < EVENTS_BATCH:
+                return
+
+    async def _poll_periodically(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"⚠️ Ошибка рассылки уведомлений агентам: {e}")
@@ -1,4 +1,29 @@
 const API_BASE = 'http://localhost:8000'; 
+const PAGE_SIZE = 100;
+const RECENT_JOBS = 20;
+const LIVE_RETRY_MS = 5000;
+
+// Состояние постраничной загрузки списков
+let computersState = { items: [], nextCursor: null, loaded: false };
+let driversState = { items: [], nextCursor: null, loaded: false };
+let statusState = null;
+let recentJobs = [];
+
+// Поток изменений с сервера: списки обновляются на месте, без повторной загрузки
+let liveSource = null;
+let liveConnected = false;
+let lastEventId = null;
+let loadingLists = 0;
+let pendingChanges = [];
+
+function loadMoreButton(nextCursor, handler) {
+    if (!nextCursor) return '';
+    return `
+        <div class="text-center mb-3">
+            <button class="btn btn-outline-secondary" onclick="${handler}">Показать ещё</button>
+        </div>
+    `;
+}
 // Показать уведомление
 function showAlert(message, type = 'info') {
     const alertContainer = document.getElementById('alert-container');
@@ -20,154 +45,356 @@ function showAlert(message, type = 'info') {
     }, 3000);
 }
 
-// Загрузка компьютеров
-async function loadComputers() {
+// Пока список загружается, изменения из потока откладываются и применяются после
+async function withListLoading(load) {
+    loadingLists++;
     try {
-        const response = await fetch(`${API_BASE}/computers`);
-        const computers = await response.json();
-        
-        const container = document.getElementById('computers-list');
-        
-        if (computers.length === 0) {
-            container.innerHTML = `
-                <div class="alert alert-info">
-                    Нет зарегистрированных компьютеров
-                </div>
-            `;
-            return;
+        await load();
+    } finally {
+        loadingLists--;
+        if (loadingLists === 0 && pendingChanges.length) {
+            const changes = pendingChanges;
+            pendingChanges = [];
+            changes.forEach(applyChanges);
         }
-        
-        let html = `
-            <div class="table-responsive">
-                <table class="table table-striped">
-                    <thead>
-                        <tr>
-                            <th>Имя</th>
-                            <th>IP адрес</th>
-                            <th>Процессор</th>
-                            <th>Видеокарта</th>
-                            <th>Последний онлайн</th>
-                        </tr>
-                    </thead>
-                    <tbody>
+    }
+}
+
+// Загрузка компьютеров
+async function loadComputers(append = false) {
+    await withListLoading(async () => {
+        try {
+            const params = new URLSearchParams({ limit: PAGE_SIZE });
+            if (append && computersState.nextCursor) params.set('cursor', computersState.nextCursor);
+
+            const response = await fetch(`${API_BASE}/computers?${params}`);
+            const page = await response.json();
+
+            computersState = {
+                items: append ? computersState.items.concat(page.items) : page.items,
+                nextCursor: page.next_cursor,
+                loaded: true
+            };
+            renderComputers();
+
+        } catch (error) {
+            console.error('Ошибка:', error);
+            showAlert('Ошибка загрузки компьютеров', 'danger');
+        }
+    });
+}
+
+function renderComputers() {
+    const computers = computersState.items;
+    const container = document.getElementById('computers-list');
+
+    if (computers.length === 0) {
+        container.innerHTML = `
+            <div class="alert alert-info">
+                Нет зарегистрированных компьютеров
+            </div>
         `;
-        
-        computers.forEach(computer => {
-            html += `
-                <tr>
-                    <td><strong>${computer.name}</strong></td>
-                    <td><span class="badge bg-secondary">${computer.ip}</span></td>
-                    <td>${computer.cpu || 'Не указан'}</td>
-                    <td>${computer.gpu || 'Не указана'}</td>
-                    <td><small>${new Date(computer.last_seen).toLocaleString()}</small></td>
-                </tr>
-            `;
-        });
-        
-        html += `</tbody></table></div>`;
-        container.innerHTML = html;
-        
-    } catch (error) {
-        console.error('Ошибка:', error);
-        showAlert('Ошибка загрузки компьютеров', 'danger');
+        return;
     }
+
+    let html = `
+        <div class="table-responsive">
+            <table class="table table-striped">
+                <thead>
+                    <tr>
+                        <th>Имя</th>
+                        <th>IP адрес</th>
+                        <th>Процессор</th>
+                        <th>Видеокарта</th>
+                        <th>Последний онлайн</th>
+                    </tr>
+                </thead>
+                <tbody>
+    `;
+
+    computers.forEach(computer => {
+        html += `
+            <tr>
+                <td><strong>${computer.name}</strong></td>
+                <td><span class="badge bg-secondary">${computer.ip}</span></td>
+                <td>${computer.cpu || 'Не указан'}</td>
+                <td>${computer.gpu || 'Не указана'}</td>
+                <td><small>${new Date(computer.last_seen).toLocaleString()}</small></td>
+            </tr>
+        `;
+    });
+
+    html += `</tbody></table></div>`;
+    html += loadMoreButton(computersState.nextCursor, 'loadComputers(true)');
+    container.innerHTML = html;
 }
 
 // Загрузка драйверов
-async function loadDrivers() {
-    try {
-        const response = await fetch(`${API_BASE}/drivers`)
-        const drivers = await response.json();
-        
-        const container = document.getElementById('drivers-list');
-        
-        if (drivers.length === 0) {
-            container.innerHTML = `
-                <div class="alert alert-info">
-                    Нет загруженных драйверов
-                </div>
-            `;
-            return;
+async function loadDrivers(append = false) {
+    await withListLoading(async () => {
+        try {
+            const params = new URLSearchParams({ limit: PAGE_SIZE });
+            if (append && driversState.nextCursor) params.set('cursor', driversState.nextCursor);
+
+            const response = await fetch(`${API_BASE}/drivers?${params}`)
+            const page = await response.json();
+
+            driversState = {
+                items: append ? driversState.items.concat(page.items) : page.items,
+                nextCursor: page.next_cursor,
+                loaded: true
+            };
+            renderDrivers();
+
+        } catch (error) {
+            console.error('Ошибка:', error);
+            showAlert('Ошибка загрузки драйверов', 'danger');
         }
-        
-        let html = '';
-        drivers.forEach(driver => {
-            const sizeMB = driver.file_size ? (driver.file_size / (1024 * 1024)).toFixed(2) : 'Неизвестно';
-            
-            html += `
-                <div class="card driver-card mb-3">
-                    <div class="card-body">
-                        <div class="d-flex justify-content-between align-items-start">
-                            <div>
-                                <h5 class="card-title">${driver.model}</h5>
-                                <p class="card-text mb-1">
-                                    <strong>Версия:</strong> ${driver.version} | 
-                                    <strong>ОС:</strong> ${driver.os} |
-                                    <strong>Размер:</strong> ${sizeMB} MB
-                                </p>
-                                <p class="card-text">
-                                    <small class="text-muted">
-                                        ID: ${driver.hardware_id} | 
-                                        Загружен: ${new Date(driver.upload_date).toLocaleDateString()}
-                                    </small>
-                                </p>
-                            </div>
-                            <button class="btn btn-outline-danger btn-sm" onclick="deleteDriver('${driver.hardware_id}')">
-                                Удалить
-                            </button>
+    });
+}
+
+function renderDrivers() {
+    const drivers = driversState.items;
+    const container = document.getElementById('drivers-list');
+
+    if (drivers.length === 0) {
+        container.innerHTML = `
+            <div class="alert alert-info">
+                Нет загруженных драйверов
+            </div>
+        `;
+        return;
+    }
+
+    let html = '';
+    drivers.forEach(driver => {
+        const sizeMB = driver.file_size ? (driver.file_size / (1024 * 1024)).toFixed(2) : 'Неизвестно';
+
+        html += `
+            <div class="card driver-card mb-3">
+                <div class="card-body">
+                    <div class="d-flex justify-content-between align-items-start">
+                        <div>
+                            <h5 class="card-title">${driver.model}</h5>
+                            <p class="card-text mb-1">
+                                <strong>Версия:</strong> ${driver.version} |
+                                <strong>ОС:</strong> ${driver.os} |
+                                <strong>Размер:</strong> ${sizeMB} MB
+                            </p>
+                            <p class="card-text">
+                                <small class="text-muted">
+                                    ID: ${driver.hardware_id} |
+                                    Загружен: ${new Date(driver.upload_date).toLocaleDateString()}
+                                </small>
+                            </p>
                         </div>
+                        <button class="btn btn-outline-danger btn-sm" onclick="deleteDriver('${driver.hardware_id}')">
+                            Удалить
+                        </button>
                     </div>
                 </div>
-            `;
-        });
-        
-        container.innerHTML = html;
-        
-    } catch (error) {
-        console.error('Ошибка:', error);
-        showAlert('Ошибка загрузки драйверов', 'danger');
-    }
+            </div>
+        `;
+    });
+
+    html += loadMoreButton(driversState.nextCursor, 'loadDrivers(true)');
+    container.innerHTML = html;
 }
 
 // Загрузка статуса
 async function loadStatus() {
     try {
         const response = await fetch(`${API_BASE}/status`)
-        const status = await response.json();
-        
-        const container = document.getElementById('status-info');
-        
-        container.innerHTML = `
-            <div class="row">
-                <div class="col-md-6">
-                    <div class="card bg-light mb-3">
-                        <div class="card-body">
-                            <h5 class="card-title">📊 Статистика</h5>
-                            <p><strong>Компьютеров:</strong> ${status.computers_registered}</p>
-                            <p><strong>Драйверов:</strong> ${status.drivers_available}</p>
-                            <p><strong>Общий размер:</strong> ${status.total_drivers_size_mb} MB</p>
-                        </div>
+        statusState = await response.json();
+        renderStatus();
+
+    } catch (error) {
+        console.error('Ошибка:', error);
+        showAlert('Ошибка загрузки статуса', 'danger');
+    }
+}
+
+const JOB_BADGES = {
+    pending: 'secondary',
+    in_progress: 'primary',
+    success: 'success',
+    failed: 'danger',
+    cancelled: 'warning'
+};
+
+function renderStatus() {
+    const status = statusState;
+    if (!status) return;
+    const container = document.getElementById('status-info');
+
+    let jobsHtml = '<p class="text-muted mb-0">Пока нет изменений</p>';
+    if (recentJobs.length) {
+        jobsHtml = recentJobs.map(job => `
+            <div>
+                <span class="badge bg-${JOB_BADGES[job.status] || 'secondary'}">${job.status}</span>
+                ${job.computer_name} — ${job.hardware_id}
+            </div>
+        `).join('');
+    }
+
+    container.innerHTML = `
+        <div class="row">
+            <div class="col-md-6">
+                <div class="card bg-light mb-3">
+                    <div class="card-body">
+                        <h5 class="card-title">📊 Статистика</h5>
+                        <p><strong>Компьютеров:</strong> ${status.computers_registered}</p>
+                        <p><strong>Драйверов:</strong> ${status.drivers_available}</p>
+                        <p><strong>Общий размер:</strong> ${status.total_drivers_size_mb} MB</p>
+                        <p><strong>Занято на диске:</strong> ${status.stored_drivers_size_mb} MB</p>
                     </div>
                 </div>
-                <div class="col-md-6">
-                    <div class="card bg-light mb-3">
-                        <div class="card-body">
-                            <h5 class="card-title">⚡ Активность</h5>
-                            <p><strong>Ожидают установки:</strong> ${status.pending_installations}</p>
-                            <p><strong>Устаревших компьютеров:</strong> ${status.outdated_computers}</p>
-                            <p><strong>Статус сервера:</strong> 
-                                <span class="badge bg-success">${status.status}</span>
-                            </p>
-                        </div>
+            </div>
+            <div class="col-md-6">
+                <div class="card bg-light mb-3">
+                    <div class="card-body">
+                        <h5 class="card-title">⚡ Активность</h5>
+                        <p><strong>Ожидают установки:</strong> ${status.pending_installations}</p>
+                        <p><strong>Устаревших компьютеров:</strong> ${status.outdated_computers}</p>
+                        <p><strong>Статус сервера:</strong>
+                            <span class="badge bg-success">${status.status}</span>
+                            <span class="badge bg-${liveConnected ? 'info' : 'light text-dark'}">
+                                ${liveConnected ? 'обновляется в реальном времени' : 'без обновлений'}
+                            </span>
+                        </p>
                     </div>
                 </div>
             </div>
-        `;
-        
-    } catch (error) {
-        console.error('Ошибка:', error);
-        showAlert('Ошибка загрузки статуса', 'danger');
+        </div>
+        <div class="card bg-light mb-3">
+            <div class="card-body">
+                <h5 class="card-title">🔧 Последние установки</h5>
+                ${jobsHtml}
+            </div>
+        </div>
+    `;
+}
+
+// Применение изменений из потока к загруженным спискам
+function applyComputersSeen(items) {
+    // Компьютеры приходят по возрастанию last_seen: каждый поднимается наверх
+    items.forEach(item => {
+        const index = computersState.items.findIndex(computer => computer.name === item.name);
+        if (index >= 0) computersState.items.splice(index, 1);
+        computersState.items.unshift(item);
+    });
+}
+
+function compareDrivers(a, b) {
+    // Тот же порядок, что у /drivers по умолчанию: модель, версия, hardware_id
+    const keyA = [a.model, a.version, a.hardware_id];
+    const keyB = [b.model, b.version, b.hardware_id];
+    for (let i = 0; i < keyA.length; i++) {
+        if (keyA[i] < keyB[i]) return -1;
+        if (keyA[i] > keyB[i]) return 1;
+    }
+    return 0;
+}
+
+function applyDriversAdded(items) {
+    items.forEach(item => {
+        const drivers = driversState.items.filter(driver => driver.hardware_id !== item.hardware_id);
+        const index = drivers.findIndex(driver => compareDrivers(item, driver) < 0);
+        if (index >= 0) {
+            drivers.splice(index, 0, item);
+        } else if (!driversState.nextCursor) {
+            // В конец - только если загружен весь список, иначе драйвер появится на следующей странице
+            drivers.push(item);
+        }
+        driversState.items = drivers;
+    });
+}
+
+function applyChanges(message) {
+    if (loadingLists > 0) {
+        pendingChanges.push(message);
+        return;
     }
+
+    let computersChanged = false;
+    let driversChanged = false;
+    let statusChanged = false;
+
+    (message.changes || []).forEach(change => {
+        switch (change.type) {
+            case 'computers_seen':
+                applyComputersSeen(change.items);
+                computersChanged = true;
+                break;
+            case 'computers_removed':
+                computersState.items = computersState.items.filter(computer => !change.names.includes(computer.name));
+                computersChanged = true;
+                break;
+            case 'drivers_added':
+                applyDriversAdded(change.items);
+                driversChanged = true;
+                break;
+            case 'drivers_removed':
+                driversState.items = driversState.items.filter(driver => !change.hardware_ids.includes(driver.hardware_id));
+                driversChanged = true;
+                break;
+            case 'jobs':
+                change.jobs.forEach(job => recentJobs.unshift({ ...job, status: change.status }));
+                recentJobs = recentJobs.slice(0, RECENT_JOBS);
+                statusChanged = true;
+                break;
+        }
+    });
+
+    if (message.status && statusState) {
+        statusState = { ...statusState, ...message.status };
+        statusChanged = true;
+    }
+
+    if (computersChanged && computersState.loaded) renderComputers();
+    if (driversChanged && driversState.loaded) renderDrivers();
+    if (statusChanged) renderStatus();
+}
+
+// Пропущено слишком много изменений - перечитываем то, что уже было загружено
+function reloadLists() {
+    pendingChanges = [];
+    if (computersState.loaded) loadComputers();
+    if (driversState.loaded) loadDrivers();
+    loadStatus();
+}
+
+function connectLive() {
+    // После переподключения браузер сам передает Last-Event-ID; новому соединению
+    // (после ошибки) позицию передаем параметром
+    const params = lastEventId ? `?${new URLSearchParams({ last_event_id: lastEventId })}` : '';
+    liveSource = new EventSource(`${API_BASE}/events${params}`);
+
+    const remember = handler => event => {
+        if (event.lastEventId) lastEventId = event.lastEventId;
+        handler(JSON.parse(event.data));
+    };
+
+    liveSource.addEventListener('hello', remember(() => {
+        liveConnected = true;
+        renderStatus();
+    }));
+    liveSource.addEventListener('changes', remember(message => {
+        liveConnected = true;
+        applyChanges(message);
+    }));
+    liveSource.addEventListener('resync', remember(() => {
+        liveConnected = true;
+        reloadLists();
+    }));
+    liveSource.onerror = () => {
+        liveConnected = false;
+        renderStatus();
+        if (liveSource.readyState === EventSource.CLOSED) {
+            // Сервер отказал (например, 503) - браузер сам больше не переподключится
+            setTimeout(connectLive, LIVE_RETRY_MS);
+        }
+    };
 }
 
 // Загрузка драйвера
@@ -195,7 +422,7 @@ async function uploadDriver(event) {
             const result = await response.json();
             showAlert(`Драйвер ${model} успешно загружен!`, 'success');
             form.reset();
-            loadDrivers(); // Обновляем список драйверов
+            if (!liveConnected) loadDrivers(); // Без потока изменений обновляем список сами
         } else {
             throw new Error('Ошибка загрузки');
         }
@@ -224,7 +451,7 @@ async function deleteDriver(hardwareId) {
         
         if (response.ok) {
             showAlert('Драйвер успешно удален', 'success');
-            loadDrivers(); // Обновляем список
+            if (!liveConnected) loadDrivers(); // Без потока изменений обновляем список сами
         } else {
             throw new Error('Ошибка удаления');
         }
@@ -237,6 +464,7 @@ async function deleteDriver(hardwareId) {
 
 // Загружаем данные при открытии страницы
 document.addEventListener('DOMContentLoaded', function() {
+    connectLive();
     loadComputers();
     loadStatus();
 });
\ No newline at end of file
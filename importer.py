@@ -0,0 +1,352 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from storage import (StoredUpload, UPLOAD_CHUNK_SIZE, MAX_UPLOAD_SIZE, incoming_dir, blob_path, store_blob,
+                     release_blob, discard)
+from matching import index_driver
+from events import publish_event
+
+
+DRIVER_EXTENSIONS = {'.exe', '.msi', '.zip', '.inf', '.cab'}
+MANIFEST_NAME = "manifest.json"
+IMPORT_WORKERS = int(os.environ.get("IMPORT_WORKERS", str(min(8, os.cpu_count() or 1))))
+IMPORT_ROOT = os.environ.get("IMPORT_ROOT", "")
+MAX_ARCHIVE_FILES = 10000
+MAX_ARCHIVE_SIZE = int(os.environ.get("MAX_ARCHIVE_SIZE", str(4 * MAX_UPLOAD_SIZE)))
+# Установщики драйверов сжимаются в разы, а не в сотни раз: больше - признак zip-бомбы.
+# Мелкие файлы (INF, тексты) не проверяем - они и распакованные места не займут
+MAX_COMPRESSION_RATIO = 100
+COMPRESSION_CHECK_SIZE = 1024 * 1024
+
+#Массовый импорт пакета драйверов: файлы копируются в хранилище и хешируются
+#параллельно в потоках (hashlib отпускает GIL), затем все строки каталога
+#добавляются одной транзакцией. По каждому файлу возвращается свой результат
+
+
+class DriverImportError(Exception):
+    pass
+
+
+def generate_hardware_id(model: str, version: str) -> str:
+    base_string = f"{model}_{version}"
+    clean_string = "".join(c if c.isalnum() else "_" for c in base_string)
+    hash_object = hashlib.md5(base_string.encode())
+    hash_hex = hash_object.hexdigest()[:8]
+    return f"{clean_string.lower()}_{hash_hex}"
+
+
+_INF_SECTION_RE = re.compile(r"^\s*\[([^\]]+)\]\s*$")
+_INF_VALUE_RE = re.compile(r"^\s*([^=;]+?)\s*=\s*(.*?)\s*$")
+
+
+def read_inf(path: str):
+    # Из INF берем версию (DriverVer = дата,версия) и описание устройства из [Strings]
+    for encoding in ("utf-16", "utf-8-sig", "cp1251"):
+        try:
+            with open(path, encoding=encoding) as file:
+                lines = file.read().splitlines()
+            break
+        except (UnicodeError, ValueError):
+            continue
+    else:
+        return {}
+
+    section, version, strings = None, None, {}
+    for line in lines:
+        header = _INF_SECTION_RE.match(line)
+        if header:
+            section = header.group(1).strip().lower()
+            continue
+        value = _INF_VALUE_RE.match(line)
+        if not value:
+            continue
+        key, data = value.group(1).strip().lower(), value.group(2).split(";")[0].strip().strip('"')
+        if section == "version" and key == "driverver" and "," in data:
+            version = data.split(",", 1)[1].strip()
+        elif section == "strings":
+            strings[key] = data
+
+    model = next((text for key, text in strings.items() if key.endswith("desc") and text), None)
+    return {"driver_version": version, "model": model, "supported_hardware": strings.get("provider")}
+
+
+def load_manifest(path: str):
+    with open(path, encoding="utf-8") as file:
+        data = json.load(file)
+    entries = data.get("drivers", []) if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        raise DriverImportError("Манифест должен содержать список drivers")
+    return entries
+
+
+def confined_path(directory: str, path: str) -> str:
+    # Абсолютный путь, ../ или символическая ссылка не должны выводить за пределы каталога
+    directory = os.path.realpath(directory)
+    resolved = os.path.realpath(os.path.join(directory, path))
+    if os.path.commonpath([directory, resolved]) != directory:
+        raise DriverImportError(f"Путь вне каталога импорта: {path}")
+    return resolved
+
+
+def scan_directory(directory: str, manifest: str = None):
+    # С манифестом импортируем только перечисленные в нем файлы, без него -
+    # все файлы драйверов в каталоге, описание берем из INF
+    manifest = manifest or os.path.join(directory, MANIFEST_NAME)
+    if os.path.exists(manifest):
+        return [dict(entry, path=confined_path(directory, entry.get("path") or ""))
+                for entry in load_manifest(manifest)]
+
+    entries = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name.lower())[1] not in DRIVER_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            try:
+                confined_path(directory, path)
+            except DriverImportError:
+                # Символическая ссылка на файл за пределами каталога
+                continue
+            entry = {"path": path}
+            if name.lower().endswith(".inf"):
+                entry.update({key: value for key, value in read_inf(path).items() if value})
+            entries.append(entry)
+    return entries
+
+
+def stage_file(path: str, drivers_dir: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> StoredUpload:
+    # Копия во временный файл рядом с хранилищем и хеш за одно чтение
+    temp_path = os.path.join(incoming_dir(drivers_dir), f"{uuid.uuid4().hex}.part")
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "rb") as source, open(temp_path, "wb") as target:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                target.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        discard(temp_path)
+        raise
+    return StoredUpload(temp_path, size, hasher.hexdigest())
+
+
+def prepare_entry(entry: dict, drivers_dir: str, dry_run: bool):
+    path = entry.get("path") or ""
+    result = {"path": path, "original_filename": os.path.basename(path)}
+
+    extension = os.path.splitext(path.lower())[1]
+    if extension not in DRIVER_EXTENSIONS:
+        return dict(result, status="error", error=f"Неподдерживаемый формат файла: {extension or path}")
+    if not os.path.isfile(path):
+        return dict(result, status="error", error="Файл не найден")
+
+    model = entry.get("model") or os.path.splitext(os.path.basename(path))[0]
+    driver_version = entry.get("driver_version") or entry.get("version")
+    if not driver_version:
+        return dict(result, status="error", error="Не указана версия драйвера")
+
+    result.update(
+        model=model,
+        driver_version=driver_version,
+        hardware_id=entry.get("hardware_id") or generate_hardware_id(model, driver_version),
+        os_version=entry.get("os_version") or "Windows 10",
+        supported_hardware=entry.get("supported_hardware"),
+    )
+
+    try:
+        if dry_run:
+            result["size_bytes"] = os.path.getsize(path)
+        else:
+            upload = stage_file(path, drivers_dir)
+            result.update(upload=upload, size_bytes=upload.size, sha256=upload.sha256)
+    except OSError as e:
+        return dict(result, status="error", error=str(e))
+    return dict(result, status="ready")
+
+
+def insert_entries(conn, entries, drivers_dir: str):
+    # Вызывается в одной пишущей транзакции для всего пакета
+    for entry in entries:
+        if entry["status"] != "ready":
+            continue
+
+        if conn.execute("SELECT 1 FROM drivers WHERE hardware_id = ?", (entry["hardware_id"],)).fetchone():
+            entry.update(status="exists")
+            continue
+
+        upload = entry["upload"]
+        cursor = conn.execute('''
+            INSERT INTO drivers
+            (hardware_id, model, driver_version, file_path, file_size, sha256, original_filename,
+             os_version, supported_hardware, upload_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (
+            entry["hardware_id"], entry["model"], entry["driver_version"],
+            blob_path(drivers_dir, upload.sha256), upload.size, upload.sha256,
+            entry["original_filename"], entry["os_version"], entry["supported_hardware"]
+        ))
+        index_driver(conn, cursor.lastrowid, entry["model"], entry["supported_hardware"])
+        blob_created = store_blob(upload, drivers_dir)
+        entry.update(status="imported", driver_id=cursor.lastrowid, deduplicated=not blob_created)
+
+    imported = [entry["hardware_id"] for entry in entries if entry["status"] == "imported"]
+    if imported:
+        publish_event(conn, "drivers", {"hardware_ids": imported})
+
+
+def mark_existing(conn, entries):
+    for entry in entries:
+        if entry["status"] == "ready" and conn.execute(
+                "SELECT 1 FROM drivers WHERE hardware_id = ?", (entry["hardware_id"],)).fetchone():
+            entry.update(status="exists")
+
+
+def release_blobs(conn, drivers_dir: str, sha256_list):
+    for sha256 in sha256_list:
+        release_blob(conn, drivers_dir, sha256)
+
+
+async def import_entries(db, entries, drivers_dir: str, workers: int = IMPORT_WORKERS, dry_run: bool = False):
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        prepared = await asyncio.gather(*(
+            loop.run_in_executor(executor, prepare_entry, entry, drivers_dir, dry_run) for entry in entries
+        ))
+    hashed = time.perf_counter()
+
+    # Два файла с одним hardware_id в пакете - второй отклоняем до транзакции
+    seen = set()
+    for entry in prepared:
+        if entry["status"] == "ready":
+            if entry["hardware_id"] in seen:
+                entry.update(status="error", error="hardware_id повторяется в пакете")
+            seen.add(entry["hardware_id"])
+
+    if dry_run:
+        await db.run(mark_existing, prepared)
+    else:
+        try:
+            await db.run(insert_entries, prepared, drivers_dir, write=True)
+        except Exception as e:
+            # Транзакция откатилась целиком: ни одна строка не добавлена, а
+            # уже перенесенные в хранилище новые файлы больше ни на что не ссылаются
+            created = [entry["sha256"] for entry in prepared
+                       if entry["status"] == "imported" and not entry.get("deduplicated")]
+            for entry in prepared:
+                if entry["status"] in ("ready", "imported"):
+                    entry.update(status="error", error=f"Транзакция отменена: {e}")
+                    entry.pop("driver_id", None)
+            await db.run(release_blobs, drivers_dir, created, write=True)
+
+    # Временные копии файлов, не попавших в хранилище, удаляем
+    for entry in prepared:
+        upload = entry.pop("upload", None)
+        if upload and upload.path != blob_path(drivers_dir, upload.sha256):
+            discard(upload.path)
+
+    finished = time.perf_counter()
+    total_bytes = sum(entry.get("size_bytes", 0) for entry in prepared if entry["status"] in ("imported", "ready", "exists"))
+    summary = {}
+    for entry in prepared:
+        summary[entry["status"]] = summary.get(entry["status"], 0) + 1
+
+    return {
+        "dry_run": dry_run,
+        "files": len(prepared),
+        "summary": summary,
+        "bytes": total_bytes,
+        "hash_seconds": round(hashed - started, 3),
+        "insert_seconds": round(finished - hashed, 3),
+        "elapsed_seconds": round(finished - started, 3),
+        "mb_per_second": round(total_bytes / 1024 / 1024 / (finished - started), 2) if finished > started else 0,
+        "results": prepared,
+    }
+
+
+def resolve_import_dir(directory: str, root: str = IMPORT_ROOT) -> str:
+    # Сервер импортирует только из каталога IMPORT_ROOT; без него импорт по пути выключен
+    if not root:
+        raise DriverImportError("Импорт из каталога сервера выключен (не задан IMPORT_ROOT)")
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, directory))
+    if os.path.commonpath([root, path]) != root or not os.path.isdir(path):
+        raise DriverImportError(f"Каталог не найден: {directory}")
+    return path
+
+
+def extract_archive(archive_path: str, target_dir: str):
+    with zipfile.ZipFile(archive_path) as archive:
+        members = [member for member in archive.infolist() if not member.is_dir()]
+        if len(members) > MAX_ARCHIVE_FILES:
+            raise DriverImportError(f"В архиве больше {MAX_ARCHIVE_FILES} файлов")
+        # Размеры из заголовков архива: zipfile не распакует файл больше указанного в нем размера
+        total_size = sum(member.file_size for member in members)
+        if total_size > MAX_ARCHIVE_SIZE:
+            raise DriverImportError(
+                f"Распакованный архив больше {MAX_ARCHIVE_SIZE // 1024 // 1024} МБ"
+            )
+        for member in members:
+            try:
+                confined_path(target_dir, member.filename)
+            except DriverImportError:
+                raise DriverImportError(f"Недопустимый путь в архиве: {member.filename}")
+            if (member.file_size > COMPRESSION_CHECK_SIZE
+                    and member.file_size > MAX_COMPRESSION_RATIO * max(member.compress_size, 1)):
+                raise DriverImportError(f"Подозрительно сильное сжатие файла в архиве: {member.filename}")
+        archive.extractall(target_dir, members)
+
+
+def main(argv=None):
+    from db import Database
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Массовый импорт драйверов в каталог")
+    parser.add_argument("directory", help="каталог с файлами драйверов (и manifest.json)")
+    parser.add_argument("--manifest", help="путь к манифесту, если он не в каталоге")
+    parser.add_argument("--db", default=os.environ.get("DB_PATH", "drivers.db"))
+    parser.add_argument("--drivers-dir", default=os.environ.get("DRIVERS_DIR", "drivers"))
+    parser.add_argument("--workers", type=int, default=IMPORT_WORKERS)
+    parser.add_argument("--dry-run", action="store_true", help="только проверить файлы, ничего не записывая")
+    parser.add_argument("--json", action="store_true", help="вывести результаты по каждому файлу в JSON")
+    args = parser.parse_args(argv)
+
+    entries = scan_directory(args.directory, args.manifest)
+    db = Database(args.db)
+    with db.transaction() as conn:
+        migrate(conn)
+
+    try:
+        report = asyncio.run(import_entries(db, entries, args.drivers_dir, args.workers, args.dry_run))
+    finally:
+        db.close()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        for entry in report["results"]:
+            if entry["status"] == "error":
+                print(f"⚠️ {entry['path']}: {entry['error']}")
+        print(f"📦 Файлов: {report['files']}, итог: {report['summary']}, "
+              f"{report['bytes'] / 1024 / 1024:.1f} МБ за {report['elapsed_seconds']} с "
+              f"({report['mb_per_second']} МБ/с)")
+    return 0 if not report["summary"].get("error") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import time
+
+
+FLUSH_INTERVAL_MS = int(os.environ.get("HEARTBEAT_FLUSH_MS", "50"))
+MAX_BATCH_SIZE = int(os.environ.get("HEARTBEAT_BATCH_SIZE", "500"))
+MAX_QUEUE_SIZE = int(os.environ.get("HEARTBEAT_QUEUE_SIZE", "10000"))
+
+_STOP = object()
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+#Очередь отложенной записи: регистрации и отметки last_seen от множества агентов
+#собираются в одну транзакцию раз в FLUSH_INTERVAL_MS или по MAX_BATCH_SIZE строк.
+#Запрос ждет фиксации своей пачки, поэтому семантика ответа не меняется
+
+class WriteBehindQueue:
+    def __init__(self, db, flush_interval_ms: int = FLUSH_INTERVAL_MS,
+                 max_batch: int = MAX_BATCH_SIZE, max_queue: int = MAX_QUEUE_SIZE):
+        self.db = db
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self._queue = None
+        self._batch_ready = None
+        self._task = None
+
+        self.batches = 0
+        self.rows = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.last_batch_size = 0
+        self.max_batch_seen = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._batch_ready = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self._task:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def submit(self, statement: str, key, params):
+        if self._task is None:
+            raise RuntimeError("Очередь записи не запущена")
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((statement, key, params, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise IngestQueueFull(f"Очередь записи переполнена ({self.max_queue})")
+
+        if self._queue.qsize() >= self.max_batch:
+            self._batch_ready.set()
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.depth,
+            "queue_capacity": self.max_queue,
+            "batches": self.batches,
+            "rows": self.rows,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.max_batch_seen,
+            "avg_batch_size": round(self.rows / self.batches, 1) if self.batches else 0,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+        }
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+
+            if self._queue.qsize() < self.max_batch - 1:
+                self._batch_ready.clear()
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+            while len(batch) < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+        # Дописываем все, что осталось в очереди на момент остановки
+        remaining = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                remaining.append(item)
+        for start in range(0, len(remaining), self.max_batch):
+            await self._flush(remaining[start:start + self.max_batch])
+
+    async def _flush(self, batch):
+        # Несколько записей об одном компьютере в пачке схлопываются в последнюю
+        statements = {}
+        for statement, key, params, _ in batch:
+            statements.setdefault(statement, {})[key] = params
+
+        def write(conn):
+            for statement, rows in statements.items():
+                conn.executemany(statement, list(rows.values()))
+
+        started = time.perf_counter()
+        try:
+            await self.db.run(write, write=True)
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+        self.batches += 1
+        self.rows += len(batch)
+        self.coalesced += len(batch) - sum(len(rows) for rows in statements.values())
+        self.last_batch_size = len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+
+        for *_, future in batch:
+            if not future.done():
+                future.set_result(None)
@@ -1,13 +1,45 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Query
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-import sqlite3
 import os
 import uvicorn
 from typing import List, Optional
 from datetime import datetime
 import hashlib
+import json
+import shutil
+import uuid
+import zipfile
+import asyncio
 from fastapi.middleware.cors import CORSMiddleware
+from db import Database
+from storage import (receive_upload, store_blob, release_blob, blob_path, discard,
+                     migrate_to_blob_store, UploadTooLarge, UploadLimitMiddleware)
+from transfer import FileRangeResponse
+from matching import (HARDWARE_CLASSES, computer_devices, pending_updates, index_driver,
+                      unindex_driver, reindex_missing, gpu_vendor_of)
+from catalog import DriverCatalog, CATALOG_SORTS, DRIVER_ID_SQL, driver_summary
+from ingest import WriteBehindQueue, IngestQueueFull
+from polling import next_poll, busy_retry_after
+from peers import record_peer, forget_peer, find_peers
+from migrations import migrate, schema_version, SCHEMA_VERSION
+from cleanup import ComputerCleanup, CLEANUP_DAYS, CLEANUP_BATCH_SIZE
+from importer import (DRIVER_EXTENSIONS, DriverImportError, generate_hardware_id, scan_directory,
+                      import_entries, resolve_import_dir, extract_archive, confined_path)
+from rollouts import (ROLLOUT_ACTIONS, ACTIVE_JOBS_SQL, REPORT_JOB_SQL, DELETE_DRIVER_JOBS_SQL, create_rollout,
+                      change_rollout, rollout_counts, success_rate, claim_job, rollout_hardware_ids,
+                      schedule_periodically)
+from stats import reconcile, refresh_outdated, read_stats, status_summary, reconcile_periodically
+from metrics import REGISTRY, MetricsMiddleware, watch_loop_lag, publish_periodically
+from workers import WORKER_ID, Leadership, load_state
+from events import (EventHub, EventHubFull, publish_event, publish_job_status, format_event, EVENTS_PING_INTERVAL,
+                    EVENTS_PRESENCE_INTERVAL)
+from dashboard import DashboardFeed
+from computers import (COMPUTER_FIELDS, COMPUTER_DEFAULT_FIELDS, COMPUTER_SORTS, COMPUTER_DEVICES_SQL,
+                       sort_columns, computers_page_query)
+from paging import (DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, decode_cursor, parse_fields,
+                    parse_order, page_response)
 
 
 app = FastAPI(
@@ -16,6 +48,9 @@ app = FastAPI(
     version="3.1.0"
 )
 
+# Добавленный позже middleware оборачивает предыдущие: CORS добавляет заголовки
+# и к ответу 413 от ограничения размера загрузки
+app.add_middleware(UploadLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -23,13 +58,35 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 app.mount("/static", StaticFiles(directory="frontend"), name="static")# Путь к базе данных
-DB_PATH = "drivers.db"
-DRIVERS_DIR = "drivers"
+DB_PATH = os.environ.get("DB_PATH", "drivers.db")
+DRIVERS_DIR = os.environ.get("DRIVERS_DIR", "drivers")
 
 
 os.makedirs(DRIVERS_DIR, exist_ok=True)
 
+db = Database(DB_PATH)
+catalog = DriverCatalog()
+heartbeats = WriteBehindQueue(db)
+computer_cleanup = ComputerCleanup(db)
+leadership = Leadership(db)
+hub = EventHub(db, catalog, managed=rollout_hardware_ids)
+feed = DashboardFeed(db, catalog)
+
+REGISTRY.gauge("db_pool_size", "Размер пула соединений с БД", read=lambda: db.size)
+REGISTRY.gauge("db_connections_in_use", "Занятые соединения с БД", read=lambda: db.in_use)
+REGISTRY.gauge("ingest_queue_depth", "Очередь отметок о присутствии", read=lambda: heartbeats.depth)
+REGISTRY.gauge("events_connections", "Агенты, подключенные к уведомлениям", read=lambda: hub.connections)
+REGISTRY.gauge("dashboard_connections", "Открытые потоки изменений веб-интерфейса", read=lambda: feed.connections)
+REGISTRY.gauge("catalog_drivers", "Драйверов в каталоге в памяти", read=lambda: len(catalog), aggregate="max")
+
+
+
+class InstalledDriver(BaseModel):
+    hardware_class: str
+    device: str
+    version: str
 
 
 class ComputerRegister(BaseModel):
@@ -39,6 +96,14 @@ class ComputerRegister(BaseModel):
     gpu: str
     motherboard: str
     network_adapters: List[str]
+    installed_drivers: List[InstalledDriver] = []
+    fingerprint: Optional[str] = None
+
+
+class ComputerHeartbeat(BaseModel):
+    name: str
+    ip: str
+    fingerprint: str
 
 
 class InstallationReport(BaseModel):
@@ -46,6 +111,7 @@ class InstallationReport(BaseModel):
     hardware_id: str
     status: str
     message: str = ""
+    peer_port: Optional[int] = None
 
 
 class ComputerDelete(BaseModel):
@@ -58,179 +124,271 @@ class DriverDelete(BaseModel):
     reason: str = "Не указана"
 
 
+class RolloutCreate(BaseModel):
+    hardware_id: str
+    wave_size: int = 10
+    wave_growth: float = 2.0
+    max_in_flight: int = 20
+    min_success_rate: float = 0.9
 
-def generate_hardware_id(model: str, version: str) -> str:
-    base_string = f"{model}_{version}"
-    clean_string = "".join(c if c.isalnum() else "_" for c in base_string)
-    hash_object = hashlib.md5(base_string.encode())
-    hash_hex = hash_object.hexdigest()[:8]
-    return f"{clean_string.lower()}_{hash_hex}"
 
+class JobClaim(BaseModel):
+    computer_name: str
 
-def update_db_schema():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
 
-    cursor.execute("PRAGMA table_info(drivers)")
-    existing_columns = [column[1] for column in cursor.fetchall()]
+class DriverImport(BaseModel):
+    directory: str
+    manifest: Optional[str] = None
+    dry_run: bool = False
 
-    if 'file_size' not in existing_columns:
-        print("🔄 Добавляем колонку file_size...")
-        cursor.execute("ALTER TABLE drivers ADD COLUMN file_size INTEGER")
 
-    if 'original_filename' not in existing_columns:
-        print("🔄 Добавляем колонку original_filename...")
-        cursor.execute("ALTER TABLE drivers ADD COLUMN original_filename TEXT")
 
-    if 'upload_date' not in existing_columns:
-        print("🔄 Добавляем колонку upload_date...")
-        cursor.execute("ALTER TABLE drivers ADD COLUMN upload_date TIMESTAMP")
-        cursor.execute("UPDATE drivers SET upload_date = CURRENT_TIMESTAMP WHERE upload_date IS NULL")
+def init_db():
+    # Схема создается и обновляется версионными миграциями (migrations.py)
+    with db.transaction() as conn:
+        applied = migrate(conn)
+        version = schema_version(conn)
 
-    conn.commit()
-    conn.close()
-    print("✅ Структура базы данных обновлена")
+    if applied:
+        print(f"✅ Структура базы данных обновлена до версии {version}")
+    print("✅ База данных инициализирована")
 
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS computers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL,
-            ip TEXT NOT NULL,
-            cpu TEXT,
-            gpu TEXT,
-            motherboard TEXT,
-            network_adapters TEXT,
-            last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS drivers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            hardware_id TEXT UNIQUE NOT NULL,
-            model TEXT NOT NULL,
-            driver_version TEXT NOT NULL,
-            file_path TEXT NOT NULL,
-            file_size INTEGER,
-            original_filename TEXT,
-            os_version TEXT DEFAULT 'Windows 10',
-            supported_hardware TEXT,
-            upload_date TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS installation_jobs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            computer_name TEXT NOT NULL,
-            hardware_id TEXT NOT NULL,
-            driver_id INTEGER NOT NULL,
-            status TEXT DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            completed_at TIMESTAMP NULL
-        )
-    ''')
-
-    conn.commit()
-    conn.close()
-    print("✅ База данных инициализирована")
+def check_db_data():
+    # Проверки данных, а не схемы: выполняются при каждом запуске
+    with db.transaction() as conn:
+        migrate_to_blob_store(conn, DRIVERS_DIR)
+        reindex_missing(conn)
+        reconcile(conn)
+
+
+def prepare_db():
+    init_db()
+    check_db_data()
+
+
+def check_schema():
+    # Воркеры, запущенные через run.py, только проверяют, что миграции уже выполнены
+    with db.connection() as conn:
+        version = schema_version(conn)
+    if version != SCHEMA_VERSION:
+        raise RuntimeError(f"Версия схемы базы {version}, ожидается {SCHEMA_VERSION}: запустите сервер через run.py")
 
 
 @app.on_event("startup")
 async def startup_event():
-    init_db()
-    update_db_schema()
+    if os.environ.get("DB_PREPARED") == "1":
+        check_schema()
+    else:
+        prepare_db()
+    await catalog.reload(db)
+    heartbeats.start()
+    await leadership.start()
+    await hub.start()
+    await feed.start()
+    app.state.tasks = [
+        asyncio.create_task(reconcile_periodically(db, leader=leadership)),
+        asyncio.create_task(schedule_periodically(db, catalog, leader=leadership)),
+        asyncio.create_task(catalog.watch(db)),
+        asyncio.create_task(watch_loop_lag()),
+        asyncio.create_task(publish_periodically()),
+    ]
+    computer_cleanup.start(leader=leadership)
     print("✅ Сервер запущен и готов к работе!")
     print("📚 Документация API доступна по адресу: http://localhost:8000/docs")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in app.state.tasks:
+        task.cancel()
+    await computer_cleanup.stop()
+    await hub.stop()
+    await feed.stop()
+    await heartbeats.stop()
+    await leadership.stop()
+    REGISTRY.write_snapshot()
+    db.close()
+
+
 #Для компьютеров
 
+# UPSERT вместо INSERT OR REPLACE: строка не пересоздается, id и created_at сохраняются
+UPSERT_COMPUTER_SQL = '''
+    INSERT INTO computers (name, ip, cpu, gpu, gpu_vendor, motherboard, network_adapters, installed_drivers, fingerprint, last_seen)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(name) DO UPDATE SET
+        ip = excluded.ip,
+        cpu = excluded.cpu,
+        gpu = excluded.gpu,
+        gpu_vendor = excluded.gpu_vendor,
+        motherboard = excluded.motherboard,
+        network_adapters = excluded.network_adapters,
+        installed_drivers = excluded.installed_drivers,
+        fingerprint = excluded.fingerprint,
+        last_seen = excluded.last_seen
+'''
+
+HEARTBEAT_COMPUTER_SQL = "UPDATE computers SET ip = ?, last_seen = CURRENT_TIMESTAMP WHERE name = ?"
+
+
 @app.post("/computers/register", response_model=dict)
 async def register_computer(computer: ComputerRegister):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
         network_adapters_str = ",".join(computer.network_adapters)
+        installed_drivers_str = json.dumps([driver.dict() for driver in computer.installed_drivers])
 
-        cursor.execute('''
-            INSERT OR REPLACE INTO computers 
-            (name, ip, cpu, gpu, motherboard, network_adapters, last_seen)
-            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (
-            computer.name, computer.ip, computer.cpu, computer.gpu,
-            computer.motherboard, network_adapters_str
+        await heartbeats.submit(UPSERT_COMPUTER_SQL, computer.name, (
+            computer.name, computer.ip, computer.cpu, computer.gpu, gpu_vendor_of(computer.gpu),
+            computer.motherboard, network_adapters_str, installed_drivers_str, computer.fingerprint
         ))
 
-        conn.commit()
-        conn.close()
-
         return {
             "status": "success",
             "message": f"Компьютер {computer.name} зарегистрирован",
-            "computer": computer.name
+            "computer": computer.name,
+            "retry_after": next_poll(heartbeats, db)
         }
 
+    except IngestQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Сервер перегружен: {str(e)}", headers={"Retry-After": str(busy_retry_after(heartbeats, db))})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка регистрации: {str(e)}")
 
 
-@app.get("/computers", response_model=List[dict])
-async def get_computers():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+@app.post("/computers/heartbeat", response_model=dict)
+async def computer_heartbeat(heartbeat: ComputerHeartbeat):
+    # Агент присылает только отпечаток инвентаризации; если он не совпадает с
+    # сохраненным (или компьютер неизвестен), агент должен выполнить полную регистрацию
+    try:
+        row = await db.fetchone("SELECT fingerprint FROM computers WHERE name = ?", (heartbeat.name,))
+        if not row or row[0] != heartbeat.fingerprint:
+            raise HTTPException(status_code=409, detail="Требуется полная регистрация компьютера")
+
+        await heartbeats.submit(HEARTBEAT_COMPUTER_SQL, heartbeat.name, (heartbeat.ip, heartbeat.name))
+
+        return {
+            "status": "success",
+            "message": f"Компьютер {heartbeat.name} на связи",
+            "computer": heartbeat.name,
+            "retry_after": next_poll(heartbeats, db)
+        }
+
+    except HTTPException:
+        raise
+    except IngestQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Сервер перегружен: {str(e)}", headers={"Retry-After": str(busy_retry_after(heartbeats, db))})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка отметки о присутствии: {str(e)}")
+
+
+TOUCH_COMPUTER_SQL = "UPDATE computers SET last_seen = CURRENT_TIMESTAMP WHERE name = ?"
+
 
-    cursor.execute('''
-        SELECT name, ip, cpu, gpu, last_seen 
-        FROM computers 
-        ORDER BY last_seen DESC
-    ''')
+@app.get("/computers/{computer_name}/events")
+async def computer_events(computer_name: str, request: Request):
+    # Поток Server-Sent Events: агент держит одно соединение и проверяет обновления,
+    # только когда сервер сообщит, что для него что-то появилось. Пока соединение
+    # открыто, агент считается на связи и отметки о присутствии не присылает
+    try:
+        queue = hub.subscribe(computer_name)
+    except EventHubFull as e:
+        raise HTTPException(status_code=503, detail=f"Сервер перегружен: {str(e)}",
+                            headers={"Retry-After": str(busy_retry_after(heartbeats, db))})
+
+    last_event_id = request.headers.get("last-event-id", "")
+
+    async def touch():
+        try:
+            await heartbeats.submit(TOUCH_COMPUTER_SQL, computer_name, (computer_name,))
+        except IngestQueueFull:
+            pass
+
+    async def stream():
+        try:
+            yield format_event("hello", {"computer": computer_name, "worker": WORKER_ID}, hub.last_seq)
+            if last_event_id.isdigit():
+                missed = await hub.catch_up(computer_name, int(last_event_id))
+                if missed:
+                    yield format_event("updates", missed, missed["seq"])
+            await touch()
+
+            loop = asyncio.get_running_loop()
+            touched = loop.time()
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), EVENTS_PING_INTERVAL)
+                    yield format_event("updates", message, message["seq"])
+                except asyncio.TimeoutError:
+                    # Пинг не дает прокси закрыть соединение и переносит id последнего события
+                    yield f"id: {hub.last_seq}\n: ping\n\n"
+                if loop.time() - touched >= EVENTS_PRESENCE_INTERVAL:
+                    await touch()
+                    touched = loop.time()
+        finally:
+            hub.unsubscribe(computer_name, queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+@app.get("/computers", response_model=dict)
+async def get_computers(
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы из next_cursor"),
+        name_prefix: Optional[str] = Query(None, description="Начало имени компьютера"),
+        gpu_vendor: Optional[str] = Query(None, description="Производитель видеокарты: nvidia, amd, intel..."),
+        seen_after: Optional[str] = Query(None, description="Был онлайн не раньше (ISO 8601)"),
+        seen_before: Optional[str] = Query(None, description="Был онлайн раньше (ISO 8601)"),
+        sort: Optional[str] = Query(None, description="last_seen (по умолчанию), created_at или name; "
+                                                      "с name_prefix - только name"),
+        order: str = Query("desc", description="asc или desc"),
+        fields: Optional[str] = Query(None, description="Поля через запятую")
+):
+    if sort is None:
+        sort = "name" if name_prefix else "last_seen"
+    if sort not in COMPUTER_SORTS:
+        raise HTTPException(status_code=400, detail=f"Сортировка возможна по: {', '.join(COMPUTER_SORTS)}")
+    if name_prefix and sort != "name":
+        raise HTTPException(status_code=400, detail="С name_prefix доступна только сортировка по name")
+
+    descending = parse_order(order)
+    selected = parse_fields(fields, COMPUTER_FIELDS, COMPUTER_DEFAULT_FIELDS)
+    order_by = sort_columns(sort)
+    after = decode_cursor(cursor, (str,) * len(order_by))
+
+    sql, params, columns = computers_page_query(selected, sort, descending, limit, after, name_prefix=name_prefix,
+                                                gpu_vendor=gpu_vendor, seen_after=seen_after,
+                                                seen_before=seen_before)
+    rows = await db.fetchall(sql, params)
 
     computers = []
-    for row in cursor.fetchall():
-        computers.append({
-            "name": row[0],
-            "ip": row[1],
-            "cpu": row[2],
-            "gpu": row[3],
-            "last_seen": row[4]
-        })
+    for row in rows[:limit]:
+        record = dict(zip(columns, row))
+        computers.append({field: record[field] for field in selected})
 
-    conn.close()
-    return computers
+    next_cursor = None
+    if len(rows) > limit:
+        last = dict(zip(columns, rows[limit - 1]))
+        next_cursor = encode_cursor(last[column] for column in order_by)
+
+    return page_response(computers, next_cursor, limit)
 
 
 @app.get("/computers/{computer_name}/info")
 async def get_computer_info(computer_name: str):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        cursor.execute('''
+        computer = await db.fetchone('''
             SELECT name, ip, cpu, gpu, motherboard, network_adapters, last_seen, created_at
             FROM computers WHERE name = ?
         ''', (computer_name,))
 
-        computer = cursor.fetchone()
-
         if not computer:
             raise HTTPException(status_code=404, detail="Компьютер не найден")
 
-        cursor.execute('''
-            SELECT COUNT(*) FROM installation_jobs 
-            WHERE computer_name = ? AND status IN ('pending', 'in_progress')
-        ''', (computer_name,))
-
-        active_jobs = cursor.fetchone()[0]
-        conn.close()
+        active_jobs = (await db.fetchone(ACTIVE_JOBS_SQL, (computer_name,)))[0]
 
         return {
             "name": computer[0],
@@ -254,20 +412,22 @@ async def get_computer_info(computer_name: str):
 @app.delete("/computers/delete", response_model=dict)
 async def delete_computer(delete_data: ComputerDelete):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        def delete(conn):
+            cursor = conn.cursor()
 
-        cursor.execute("SELECT name FROM computers WHERE name = ?", (delete_data.name,))
-        computer = cursor.fetchone()
+            cursor.execute("SELECT name FROM computers WHERE name = ?", (delete_data.name,))
+            if not cursor.fetchone():
+                return False
 
-        if not computer:
-            raise HTTPException(status_code=404, detail=f"Компьютер {delete_data.name} не найден")
-
-        cursor.execute("DELETE FROM computers WHERE name = ?", (delete_data.name,))
-        cursor.execute("DELETE FROM installation_jobs WHERE computer_name = ?", (delete_data.name,))
+            cursor.execute("DELETE FROM computers WHERE name = ?", (delete_data.name,))
+            cursor.execute("DELETE FROM installation_jobs WHERE computer_name = ?", (delete_data.name,))
+            cursor.execute("DELETE FROM peer_cache WHERE computer_name = ?", (delete_data.name,))
+            publish_event(conn, "computers_removed", {"names": [delete_data.name]})
+            refresh_outdated(conn)
+            return True
 
-        conn.commit()
-        conn.close()
+        if not await db.run(delete, write=True):
+            raise HTTPException(status_code=404, detail=f"Компьютер {delete_data.name} не найден")
 
         print(f"🗑️ Удален компьютер: {delete_data.name}. Причина: {delete_data.reason}")
 
@@ -303,52 +463,53 @@ async def register_driver(
             hardware_id = generate_hardware_id(model, driver_version)
             print(f"🔧 Автоматически сгенерирован hardware_id: {hardware_id}")
 
-        allowed_extensions = {'.exe', '.msi', '.zip', '.inf', '.cab'}
         file_extension = os.path.splitext(file.filename.lower())[1]
-        if file_extension not in allowed_extensions:
+        if file_extension not in DRIVER_EXTENSIONS:
             raise HTTPException(
                 status_code=400,
-                detail=f"Неподдерживаемый формат файла. Разрешены: {', '.join(allowed_extensions)}"
+                detail=f"Неподдерживаемый формат файла. Разрешены: {', '.join(DRIVER_EXTENSIONS)}"
             )
 
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT id FROM drivers WHERE hardware_id = ?", (hardware_id,))
-        existing_driver = cursor.fetchone()
+        existing_driver = await db.fetchone(DRIVER_ID_SQL, (hardware_id,))
         if existing_driver:
             new_hardware_id = generate_hardware_id(model, driver_version + "_dup")
             print(f"⚠️ Hardware_id {hardware_id} уже существует. Генерируем новый: {new_hardware_id}")
             hardware_id = new_hardware_id
 
-        safe_filename = f"{hardware_id}{file_extension}"
-        file_path = os.path.join(DRIVERS_DIR, safe_filename)
-
-        file_size = 0
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            file_size = len(content)
-            buffer.write(content)
-
-        cursor.execute('''
-            INSERT INTO drivers 
-            (hardware_id, model, driver_version, file_path, file_size, original_filename, 
-             os_version, supported_hardware, upload_date)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (
-            hardware_id,
-            model,
-            driver_version,
-            file_path,
-            file_size,
-            file.filename,
-            os_version,
-            supported_hardware
-        ))
-
-        driver_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        try:
+            upload = await receive_upload(file, DRIVERS_DIR)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+
+        file_path = blob_path(DRIVERS_DIR, upload.sha256)
+        file_size = upload.size
+
+        def register(conn):
+            cursor = conn.execute('''
+                INSERT INTO drivers 
+                (hardware_id, model, driver_version, file_path, file_size, sha256, original_filename, 
+                 os_version, supported_hardware, upload_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (
+                hardware_id,
+                model,
+                driver_version,
+                file_path,
+                file_size,
+                upload.sha256,
+                file.filename,
+                os_version,
+                supported_hardware
+            ))
+            index_driver(conn, cursor.lastrowid, model, supported_hardware)
+            publish_event(conn, "drivers", {"hardware_ids": [hardware_id]})
+            blob_created = store_blob(upload, DRIVERS_DIR)
+            return cursor.lastrowid, blob_created
+
+        driver_id, blob_created = await db.run(register, write=True)
+        await catalog.reload(db)
+        if not blob_created:
+            print(f"♻️ Файл {file.filename} уже есть в хранилище, используем существующую копию")
 
         print(f"✅ Зарегистрирован драйвер: {model} v{driver_version} (ID: {hardware_id})")
 
@@ -360,9 +521,11 @@ async def register_driver(
             "auto_generated_id": not hardware_id,
             "file_info": {
                 "original_name": file.filename,
-                "saved_as": safe_filename,
+                "saved_as": upload.sha256,
                 "size_bytes": file_size,
-                "path": file_path
+                "sha256": upload.sha256,
+                "path": file_path,
+                "deduplicated": not blob_created
             },
             "driver_info": {
                 "model": model,
@@ -375,76 +538,166 @@ async def register_driver(
     except HTTPException:
         raise
     except Exception as e:
-        if 'file_path' in locals() and os.path.exists(file_path):
+        if 'upload' in locals():
             try:
-                os.remove(file_path)
+                discard(upload.temp_path)
             except:
                 pass
         raise HTTPException(status_code=500, detail=f"Ошибка регистрации драйвера: {str(e)}")
 
 
-@app.get("/drivers", response_model=List[dict])
-async def get_drivers():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+DRIVER_FIELDS = ("hardware_id", "model", "version", "os", "file_size", "original_filename", "upload_date",
+                 "vendor", "hardware_class", "sha256")
+DRIVER_DEFAULT_FIELDS = ("hardware_id", "model", "version", "os", "file_size", "original_filename", "upload_date")
 
-    cursor.execute('''
-        SELECT hardware_id, model, driver_version, os_version, file_size, original_filename, upload_date
-        FROM drivers 
-        ORDER BY model, driver_version
-    ''')
 
-    drivers = []
-    for row in cursor.fetchall():
-        drivers.append({
-            "hardware_id": row[0],
-            "model": row[1],
-            "version": row[2],
-            "os": row[3],
-            "file_size": row[4],
-            "original_filename": row[5],
-            "upload_date": row[6]
-        })
+def import_response(report, base_dir: str):
+    for entry in report["results"]:
+        entry["path"] = os.path.relpath(entry["path"], base_dir)
 
-    conn.close()
-    return drivers
+    imported = report["summary"].get("imported", 0)
+    if report["dry_run"]:
+        message = f"Проверено файлов: {report['files']}, готово к импорту: {report['summary'].get('ready', 0)}"
+    else:
+        message = f"Импортировано драйверов: {imported} из {report['files']}"
+        print(f"📦 Массовый импорт: {report['summary']} за {report['elapsed_seconds']} с")
 
+    return {
+        "status": "success",
+        "message": message,
+        "report": report
+    }
 
-@app.get("/drivers/{hardware_id}")
-async def get_driver_info(hardware_id: str):
+
+@app.post("/drivers/import", response_model=dict)
+async def import_drivers(request: DriverImport):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        try:
+            directory = resolve_import_dir(request.directory)
+            manifest = confined_path(directory, request.manifest) if request.manifest else None
+            entries = await asyncio.get_running_loop().run_in_executor(None, scan_directory, directory, manifest)
+        except (DriverImportError, ValueError, OSError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        report = await import_entries(db, entries, DRIVERS_DIR, dry_run=request.dry_run)
+        if not request.dry_run:
+            await catalog.reload(db)
+        return import_response(report, directory)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка импорта драйверов: {str(e)}")
 
-        cursor.execute('''
-            SELECT hardware_id, model, driver_version, file_path, file_size, original_filename,
-                   os_version, supported_hardware, upload_date
-            FROM drivers WHERE hardware_id = ?
-        ''', (hardware_id,))
 
-        driver = cursor.fetchone()
+@app.post("/drivers/import/archive", response_model=dict)
+async def import_drivers_archive(
+        file: UploadFile = File(..., description="ZIP-архив с драйверами и manifest.json"),
+        dry_run: bool = Form(False)
+):
+    upload = None
+    extract_dir = os.path.join(DRIVERS_DIR, ".incoming", f"import-{uuid.uuid4().hex}")
+    try:
+        try:
+            upload = await receive_upload(file, DRIVERS_DIR)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, extract_archive, upload.path, extract_dir)
+            entries = await loop.run_in_executor(None, scan_directory, extract_dir)
+        except (DriverImportError, zipfile.BadZipFile, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f"Некорректный архив: {str(e)}")
+
+        report = await import_entries(db, entries, DRIVERS_DIR, dry_run=dry_run)
+        if not dry_run:
+            await catalog.reload(db)
+        return import_response(report, extract_dir)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка импорта архива: {str(e)}")
+    finally:
+        if upload:
+            discard(upload.temp_path)
+        shutil.rmtree(extract_dir, ignore_errors=True)
+
+
+@app.get("/drivers", response_model=dict)
+async def get_drivers(
+        request: Request,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы из next_cursor"),
+        model: Optional[str] = Query(None, description="Начало названия модели (без учета регистра)"),
+        vendor: Optional[str] = Query(None, description="Производитель: nvidia, amd, intel..."),
+        hardware_class: Optional[str] = Query(None, description="cpu, gpu, motherboard или network"),
+        os_version: Optional[str] = Query(None, description="Версия ОС"),
+        sort: str = Query("model", description="model или upload_date"),
+        order: str = Query("asc", description="asc или desc"),
+        fields: Optional[str] = Query(None, description="Поля через запятую")
+):
+    if sort not in CATALOG_SORTS:
+        raise HTTPException(status_code=400, detail=f"Сортировка возможна по: {', '.join(CATALOG_SORTS)}")
+
+    descending = parse_order(order)
+    selected = parse_fields(fields, DRIVER_FIELDS, DRIVER_DEFAULT_FIELDS)
+
+    # Страница однозначно определяется содержимым каталога и параметрами запроса
+    etag = '"' + hashlib.sha1(f"{catalog.etag}?{request.url.query}".encode("utf-8")).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    after = decode_cursor(cursor, (str,) * (3 if sort == "model" else 2))
+    model_prefix = model.lower() if model else None
+
+    def matches(driver):
+        return ((not model_prefix or driver.model.lower().startswith(model_prefix))
+                and (not vendor or driver.vendor == vendor.lower())
+                and (not hardware_class or driver.hardware_class == hardware_class.lower())
+                and (not os_version or driver.os_version == os_version))
+
+    drivers, last_key = catalog.page(sort, descending, tuple(after) if after else None, limit, matches)
+
+    items = []
+    for driver in drivers:
+        summary = driver_summary(driver)
+        items.append({field: summary[field] for field in selected})
+
+    next_cursor = encode_cursor(last_key) if last_key else None
+    body = json.dumps(page_response(items, next_cursor, limit), ensure_ascii=False)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/drivers/{hardware_id}")
+async def get_driver_info(hardware_id: str):
+    try:
+        driver = await catalog.lookup(db, hardware_id)
 
         if not driver:
             raise HTTPException(status_code=404, detail="Драйвер не найден")
 
-        file_exists = os.path.exists(driver[3])
-        conn.close()
+        file_exists = os.path.exists(driver.file_path)
 
         return {
-            "hardware_id": driver[0],
-            "model": driver[1],
-            "version": driver[2],
+            "hardware_id": driver.hardware_id,
+            "model": driver.model,
+            "version": driver.driver_version,
             "file_info": {
-                "path": driver[3],
-                "size_bytes": driver[4],
-                "original_name": driver[5],
+                "path": driver.file_path,
+                "size_bytes": driver.file_size,
+                "sha256": driver.sha256,
+                "original_name": driver.original_filename,
                 "exists": file_exists
             },
             "compatibility": {
-                "os_version": driver[6],
-                "supported_hardware": driver[7]
+                "os_version": driver.os_version,
+                "supported_hardware": driver.supported_hardware
             },
-            "upload_date": driver[8]
+            "upload_date": driver.upload_date
         }
 
     except HTTPException:
@@ -453,34 +706,61 @@ async def get_driver_info(hardware_id: str):
         raise HTTPException(status_code=500, detail=f"Ошибка получения информации: {str(e)}")
 
 
+@app.api_route("/drivers/{hardware_id}/download", methods=["GET", "HEAD"])
+async def download_driver(hardware_id: str, request: Request):
+    driver = await catalog.lookup(db, hardware_id)
+
+    if not driver:
+        raise HTTPException(status_code=404, detail="Драйвер не найден")
+
+    file_path, sha256, original_filename = driver.file_path, driver.sha256, driver.original_filename
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=410, detail="Файл драйвера отсутствует на сервере")
+
+    return FileRangeResponse(
+        file_path,
+        request.headers,
+        sha256=sha256,
+        filename=original_filename or os.path.basename(file_path),
+        send_body=request.method != "HEAD"
+    )
+
+
 @app.delete("/drivers/delete", response_model=dict)
 async def delete_driver(delete_data: DriverDelete):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        def delete(conn):
+            cursor = conn.cursor()
+
+            cursor.execute("SELECT model, driver_version, sha256, id FROM drivers WHERE hardware_id = ?",
+                           (delete_data.hardware_id,))
+            driver = cursor.fetchone()
+            if not driver:
+                return None
+
+            unindex_driver(conn, driver[3])
+            cursor.execute("DELETE FROM drivers WHERE hardware_id = ?", (delete_data.hardware_id,))
+            cursor.execute(DELETE_DRIVER_JOBS_SQL, (delete_data.hardware_id,))
+            cursor.execute("DELETE FROM peer_cache WHERE hardware_id = ?", (delete_data.hardware_id,))
+            cursor.execute("DELETE FROM rollouts WHERE hardware_id = ?", (delete_data.hardware_id,))
+            publish_event(conn, "drivers_removed", {"hardware_ids": [delete_data.hardware_id]})
+
+            # Файл удаляется только вместе с последней ссылкающейся на него строкой
+            file_deleted = False
+            try:
+                file_deleted = release_blob(conn, DRIVERS_DIR, driver[2])
+            except OSError as e:
+                print(f"⚠️ Не удалось удалить файл {driver[2]}: {e}")
+            return driver[0], driver[1], file_deleted
 
-        cursor.execute("SELECT model, driver_version, file_path FROM drivers WHERE hardware_id = ?",
-                       (delete_data.hardware_id,))
-        driver = cursor.fetchone()
+        driver = await db.run(delete, write=True)
 
         if not driver:
             raise HTTPException(status_code=404, detail=f"Драйвер с hardware_id {delete_data.hardware_id} не найден")
 
-        model, version, file_path = driver
+        await catalog.reload(db)
 
-        cursor.execute("DELETE FROM drivers WHERE hardware_id = ?", (delete_data.hardware_id,))
-        cursor.execute("DELETE FROM installation_jobs WHERE hardware_id = ?", (delete_data.hardware_id,))
-
-        conn.commit()
-        conn.close()
-
-        file_deleted = False
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-                file_deleted = True
-            except Exception as e:
-                print(f"⚠️ Не удалось удалить файл {file_path}: {e}")
+        model, version, file_deleted = driver
 
         print(f"🗑️ Удален драйвер: {model} v{version}. Причина: {delete_data.reason}")
 
@@ -503,53 +783,50 @@ async def delete_driver(delete_data: DriverDelete):
 @app.get("/computers/{computer_name}/check-updates")
 async def check_updates(computer_name: str):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT cpu, gpu, motherboard FROM computers WHERE name = ?', (computer_name,))
-        computer_data = cursor.fetchone()
+        computer_data = await db.fetchone(COMPUTER_DEVICES_SQL, (computer_name,))
 
         if not computer_data:
             raise HTTPException(status_code=404, detail="Компьютер не найден")
 
-        cpu, gpu, motherboard = computer_data
-        available_updates = []
+        installed_drivers = json.loads(computer_data[4]) if computer_data[4] else []
+        matches = pending_updates(catalog, computer_devices(*computer_data[:4]), installed_drivers)
+        # Драйверы, которые развертываются волнами, агент получает только через задания
+        managed = await db.run(rollout_hardware_ids)
 
-        if gpu:
-            search_terms = []
-            if "NVIDIA" in gpu.upper():
-                search_terms.append("%NVIDIA%")
-            if "AMD" in gpu.upper() or "RADEON" in gpu.upper():
-                search_terms.append("%AMD%")
-                search_terms.append("%RADEON%")
-            if "INTEL" in gpu.upper():
-                search_terms.append("%INTEL%")
-
-            for term in search_terms:
-                cursor.execute(
-                    'SELECT hardware_id, model, driver_version FROM drivers WHERE model LIKE ?',
-                    (term,)
-                )
-                gpu_drivers = cursor.fetchall()
-
-                for driver in gpu_drivers:
-                    available_updates.append({
-                        "hardware": "GPU",
-                        "current_model": gpu,
-                        "available_driver": driver[1],
-                        "version": driver[2],
-                        "hardware_id": driver[0],
-                        "action": "install"
-                    })
-
-        conn.close()
+        available_updates = []
+        for driver in matches:
+            if driver["hardware_id"] in managed:
+                continue
+            available_updates.append({
+                "hardware": HARDWARE_CLASSES[driver["hardware_class"]],
+                "current_model": driver["device"],
+                "current_version": driver["current_version"],
+                "available_driver": driver["model"],
+                "version": driver["version"],
+                "hardware_id": driver["hardware_id"],
+                "action": "install",
+                "peers": []
+            })
+
+        if available_updates:
+            def lookup_peers(conn):
+                for update in available_updates:
+                    entry = catalog.get(update["hardware_id"])
+                    update["peers"] = find_peers(
+                        conn, update["hardware_id"], entry.sha256 if entry else None, computer_name, computer_data[5]
+                    )
+
+            await db.run(lookup_peers)
 
         return {
             "computer": computer_name,
             "available_updates": available_updates,
-            "last_checked": datetime.now().isoformat()
+            "last_checked": datetime.now().isoformat(),
+            "retry_after": next_poll(heartbeats, db)
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка проверки обновлений: {str(e)}")
 
@@ -557,17 +834,19 @@ async def check_updates(computer_name: str):
 @app.post("/installation/report")
 async def installation_report(report: InstallationReport):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        def save_report(conn):
+            jobs = conn.execute(
+                REPORT_JOB_SQL, (report.status, report.message, report.computer_name, report.hardware_id)
+            ).fetchall()
+            publish_job_status(conn, report.status, jobs)
 
-        cursor.execute('''
-            UPDATE installation_jobs 
-            SET status = ?, completed_at = CURRENT_TIMESTAMP
-            WHERE computer_name = ? AND hardware_id = ?
-        ''', (report.status, report.computer_name, report.hardware_id))
+            # Агент с включенным кешем может раздавать этот драйвер соседям
+            if report.status == "success" and report.peer_port:
+                record_peer(conn, report.hardware_id, report.computer_name, report.peer_port)
+            else:
+                forget_peer(conn, report.hardware_id, report.computer_name)
 
-        conn.commit()
-        conn.close()
+        await db.run(save_report, write=True)
 
         return {
             "status": "success",
@@ -578,44 +857,192 @@ async def installation_report(report: InstallationReport):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка обработки отчета: {str(e)}")
 
-#Статус и устаревшее
+#Развертывания
 
-@app.delete("/computers/cleanup", response_model=dict)
-async def cleanup_old_computers(days_offline: int = 30):
+def rollout_summary(conn, row):
+    rollout_id, hardware_id, status, wave_size, wave_growth, max_in_flight, min_success_rate, \
+        current_wave, message, created_at, updated_at = row
+    wave_counts = rollout_counts(conn, rollout_id, current_wave) if current_wave else {}
+    return {
+        "id": rollout_id,
+        "hardware_id": hardware_id,
+        "status": status,
+        "wave_size": wave_size,
+        "wave_growth": wave_growth,
+        "max_in_flight": max_in_flight,
+        "min_success_rate": min_success_rate,
+        "current_wave": current_wave,
+        "current_wave_jobs": wave_counts,
+        "current_wave_success_rate": round(success_rate(wave_counts), 3),
+        "jobs": rollout_counts(conn, rollout_id),
+        "message": message,
+        "created_at": created_at,
+        "updated_at": updated_at
+    }
+
+
+ROLLOUT_COLUMNS = '''
+    id, hardware_id, status, wave_size, wave_growth, max_in_flight, min_success_rate,
+    current_wave, message, created_at, updated_at
+'''
+
+
+@app.post("/rollouts", response_model=dict)
+async def create_rollout_campaign(rollout: RolloutCreate):
+    try:
+        if rollout.wave_size < 1 or rollout.max_in_flight < 1 or rollout.wave_growth < 1:
+            raise HTTPException(status_code=400, detail="Размер волны, рост и лимит установок должны быть не меньше 1")
+        if not 0 <= rollout.min_success_rate <= 1:
+            raise HTTPException(status_code=400, detail="Доля успешных установок должна быть от 0 до 1")
+        await catalog.lookup(db, rollout.hardware_id)
+
+        def create(conn):
+            rollout_id = create_rollout(
+                conn, catalog, rollout.hardware_id, rollout.wave_size, rollout.wave_growth,
+                rollout.max_in_flight, rollout.min_success_rate
+            )
+            if rollout_id is None:
+                return None
+            row = conn.execute(f"SELECT {ROLLOUT_COLUMNS} FROM rollouts WHERE id = ?", (rollout_id,)).fetchone()
+            return rollout_summary(conn, row)
+
+        summary = await db.run(create, write=True)
+        if summary is None:
+            raise HTTPException(status_code=404, detail="Драйвер не найден")
+
+        return {
+            "status": "success",
+            "message": f"Развертывание драйвера {rollout.hardware_id} запущено",
+            "rollout": summary
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка создания развертывания: {str(e)}")
+
+
+@app.get("/rollouts", response_model=dict)
+async def get_rollouts(status: Optional[str] = None):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        def load(conn):
+            if status:
+                rows = conn.execute(
+                    f"SELECT {ROLLOUT_COLUMNS} FROM rollouts WHERE status = ? ORDER BY id DESC", (status,)
+                ).fetchall()
+            else:
+                rows = conn.execute(f"SELECT {ROLLOUT_COLUMNS} FROM rollouts ORDER BY id DESC").fetchall()
+            return [rollout_summary(conn, row) for row in rows]
+
+        rollouts = await db.run(load)
+        return {"rollouts": rollouts, "total": len(rollouts)}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка получения развертываний: {str(e)}")
 
-        cursor.execute('''
-            SELECT name, last_seen 
-            FROM computers 
-            WHERE date(last_seen) < date('now', '-' || ? || ' days')
-        ''', (days_offline,))
 
-        old_computers = cursor.fetchall()
+@app.get("/rollouts/{rollout_id}", response_model=dict)
+async def get_rollout(rollout_id: int):
+    try:
+        def load(conn):
+            row = conn.execute(f"SELECT {ROLLOUT_COLUMNS} FROM rollouts WHERE id = ?", (rollout_id,)).fetchone()
+            return rollout_summary(conn, row) if row else None
 
-        if not old_computers:
+        summary = await db.run(load)
+        if summary is None:
+            raise HTTPException(status_code=404, detail="Развертывание не найдено")
+        return summary
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка получения развертывания: {str(e)}")
+
+
+@app.post("/rollouts/{rollout_id}/{action}", response_model=dict)
+async def control_rollout(rollout_id: int, action: str):
+    try:
+        if action not in ROLLOUT_ACTIONS:
+            raise HTTPException(status_code=400, detail=f"Неизвестное действие: {action}")
+
+        status = await db.run(change_rollout, rollout_id, action, write=True)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Развертывание не найдено")
+
+        return {
+            "status": "success",
+            "message": f"Развертывание {rollout_id}: {status}",
+            "rollout_status": status
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка управления развертыванием: {str(e)}")
+
+
+@app.post("/jobs/claim", response_model=dict)
+async def claim_installation_job(claim: JobClaim):
+    try:
+        def claim_next(conn):
+            job = claim_job(conn, claim.computer_name)
+            if not job:
+                return None
+
+            job_id, hardware_id, rollout_id = job
+            publish_job_status(conn, "in_progress", [(claim.computer_name, hardware_id)])
+            driver = catalog.get(hardware_id)
+            ip = conn.execute("SELECT ip FROM computers WHERE name = ?", (claim.computer_name,)).fetchone()
+            return {
+                "job_id": job_id,
+                "rollout_id": rollout_id,
+                "hardware": HARDWARE_CLASSES.get(driver.hardware_class, driver.hardware_class) if driver else None,
+                "available_driver": driver.model if driver else hardware_id,
+                "version": driver.driver_version if driver else None,
+                "hardware_id": hardware_id,
+                "action": "install",
+                "peers": find_peers(conn, hardware_id, driver.sha256 if driver else None,
+                                    claim.computer_name, ip[0] if ip else "")
+            }
+
+        job = await db.run(claim_next, write=True)
+        return {
+            "computer": claim.computer_name,
+            "job": job,
+            "retry_after": next_poll(heartbeats, db)
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка получения задания: {str(e)}")
+
+#Статус и устаревшее
+
+@app.delete("/computers/cleanup", response_model=dict)
+async def cleanup_old_computers(days_offline: int = CLEANUP_DAYS, dry_run: bool = False,
+                                batch_size: int = Query(CLEANUP_BATCH_SIZE, ge=1, le=10000)):
+    try:
+        report = await computer_cleanup.run(days_offline, dry_run=dry_run, batch_size=batch_size)
+        deleted_count = report["deleted_count"]
+
+        if not deleted_count:
             return {
                 "status": "success",
                 "message": "Нет устаревших компьютеров для удаления",
-                "deleted_count": 0
+                "deleted_count": 0,
+                "report": report
             }
 
-        deleted_count = 0
-        for computer_name, last_seen in old_computers:
-            cursor.execute("DELETE FROM computers WHERE name = ?", (computer_name,))
-            cursor.execute("DELETE FROM installation_jobs WHERE computer_name = ?", (computer_name,))
-            deleted_count += 1
-            print(f"🗑️ Автоудаление: {computer_name} (последний раз онлайн: {last_seen})")
-
-        conn.commit()
-        conn.close()
+        if dry_run:
+            message = f"Будет удалено {deleted_count} устаревших компьютеров"
+        else:
+            message = f"Удалено {deleted_count} устаревших компьютеров"
 
         return {
             "status": "success",
-            "message": f"Удалено {deleted_count} устаревших компьютеров",
+            "message": message,
             "deleted_count": deleted_count,
-            "criteria": f"Не онлайн более {days_offline} дней"
+            "criteria": f"Не онлайн более {days_offline} дней",
+            "report": report
         }
 
     except Exception as e:
@@ -624,33 +1051,49 @@ async def cleanup_old_computers(days_offline: int = 30):
 
 @app.get("/status")
 async def get_status():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT COUNT(*) FROM computers")
-    computers_count = cursor.fetchone()[0]
-
-    cursor.execute("SELECT COUNT(*) FROM drivers")
-    drivers_count = cursor.fetchone()[0]
-
-    cursor.execute("SELECT SUM(file_size) FROM drivers")
-    total_size = cursor.fetchone()[0] or 0
-
-    cursor.execute("SELECT COUNT(*) FROM installation_jobs WHERE status = 'pending'")
-    pending_jobs = cursor.fetchone()[0]
-
-    cursor.execute("SELECT COUNT(*) FROM computers WHERE date(last_seen) < date('now', '-30 days')")
-    outdated_computers = cursor.fetchone()[0]
-
-    conn.close()
+    counters = await db.run(read_stats)
 
     return {
         "status": "running",
-        "computers_registered": computers_count,
-        "drivers_available": drivers_count,
-        "total_drivers_size_mb": round(total_size / (1024 * 1024), 2),
-        "pending_installations": pending_jobs,
-        "outdated_computers": outdated_computers,
-        "cleanup_available": outdated_computers > 0,
+        **status_summary(counters),
+        "ingest": heartbeats.stats(),
+        "events": hub.stats(),
+        "dashboard": feed.stats(),
+        "last_cleanup": await db.run(load_state, "last_cleanup"),
+        "worker": WORKER_ID,
         "server_time": datetime.now().isoformat()
     }
+
+
+@app.get("/events")
+async def dashboard_events(request: Request, last_event_id: Optional[str] = Query(None)):
+    # Поток изменений для веб-интерфейса. Браузер сам переподключается с заголовком
+    # Last-Event-ID; после закрытого потока (503) панель передает id параметром
+    try:
+        queue = feed.subscribe()
+    except EventHubFull as e:
+        raise HTTPException(status_code=503, detail=f"Сервер перегружен: {str(e)}",
+                            headers={"Retry-After": str(busy_retry_after(heartbeats, db))})
+
+    position = request.headers.get("last-event-id") or last_event_id
+
+    async def stream():
+        try:
+            yield await feed.catch_up(position) if position else feed.hello()
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), EVENTS_PING_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield f"id: {feed.position}\n: ping\n\n"
+        finally:
+            feed.unsubscribe(queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
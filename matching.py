@@ -0,0 +1,232 @@
+import re
+
+
+HARDWARE_CLASSES = {
+    "cpu": "CPU",
+    "gpu": "GPU",
+    "motherboard": "Motherboard",
+    "network": "Network",
+}
+
+VENDOR_ALIASES = {
+    "nvidia": "nvidia", "geforce": "nvidia", "quadro": "nvidia",
+    "amd": "amd", "ati": "amd", "radeon": "amd", "ryzen": "amd", "athlon": "amd",
+    "intel": "intel",
+    "realtek": "realtek",
+    "broadcom": "broadcom",
+    "qualcomm": "qualcomm", "atheros": "qualcomm", "killer": "qualcomm",
+    "mediatek": "mediatek",
+    "marvell": "marvell",
+    "asus": "asus", "asustek": "asus",
+    "gigabyte": "gigabyte",
+    "msi": "msi",
+    "asrock": "asrock",
+}
+
+# Слова, по которым можно понять класс устройства, если его не указали явно
+CLASS_KEYWORDS = {
+    "gpu": {"geforce", "radeon", "quadro", "gtx", "rtx", "arc", "graphics", "video", "display", "uhd", "iris"},
+    "network": {"ethernet", "gbe", "lan", "wifi", "wireless", "wlan", "network", "802", "11ac", "11ax", "bluetooth"},
+    "motherboard": {"chipset", "motherboard", "mainboard", "baseboard", "prime", "rog", "strix", "tuf", "aorus", "mei"},
+    "cpu": {"core", "xeon", "pentium", "celeron", "ryzen", "athlon", "epyc", "threadripper", "processor", "microcode"},
+}
+
+STOPWORDS = {
+    "tm", "r", "c", "the", "and", "with", "for", "inc", "co", "corp", "corporation", "ltd",
+    "technology", "technologies", "computer", "family", "controller", "adapter", "device",
+    "series", "driver", "drivers", "software", "package", "edition", "pcie", "pci", "express",
+    "cpu", "gpu", "ghz", "mhz", "gen", "star", "international",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# "Micro-Star" - это MSI; отдельное "micro" встречается и в "Advanced Micro Devices" (AMD)
+_MICRO_STAR_RE = re.compile(r"micro[\s\-]*star")
+
+
+def tokenize(text: str):
+    if not text:
+        return []
+    text = text.lower().replace("(tm)", " ").replace("(r)", " ").replace("wi-fi", "wifi")
+    text = _MICRO_STAR_RE.sub("msi", text)
+    return [
+        token for token in _TOKEN_RE.findall(text)
+        if token not in STOPWORDS and (len(token) > 1 or token.isdigit())
+    ]
+
+
+def detect_vendor(tokens):
+    # Название производителя ("amd") важнее названия линейки ("radeon", "ati"),
+    # даже если стоит позже: в pci.ids "Advanced Micro Devices, Inc. [AMD/ATI]"
+    aliases = [VENDOR_ALIASES[token] for token in tokens if token in VENDOR_ALIASES]
+    return next((vendor for vendor in aliases if vendor in tokens), aliases[0] if aliases else None)
+
+
+def gpu_vendor_of(gpu: str):
+    return detect_vendor(tokenize(gpu))
+
+
+def detect_class(tokens):
+    best_class, best_hits = None, 0
+    for hardware_class, keywords in CLASS_KEYWORDS.items():
+        hits = sum(1 for token in tokens if token in keywords)
+        if hits > best_hits:
+            best_class, best_hits = hardware_class, hits
+    return best_class
+
+
+def model_tokens(tokens, vendor):
+    # Название производителя совпадает у всех его устройств и ничего не говорит о модели
+    return {token for token in tokens if token != vendor and VENDOR_ALIASES.get(token) != token}
+
+
+def token_weight(token: str) -> int:
+    # Номера моделей (1060, i5, b360) гораздо специфичнее общих слов
+    return 2 if any(ch.isdigit() for ch in token) else 1
+
+
+def driver_index_keys(model: str, supported_hardware: str = None):
+    tokens = tokenize(model) + tokenize(supported_hardware or "")
+    vendor = detect_vendor(tokens)
+    return model_tokens(tokens, vendor), vendor, detect_class(tokens)
+
+
+_RELEASE_RE = re.compile(r"^v?(\d+(?:[.\-_]\d+)*)(.*)$")
+_SUFFIX_RE = re.compile(r"[a-z]+|\d+")
+PRE_RELEASE_TAGS = {"dev": 0, "alpha": 1, "a": 1, "beta": 2, "b": 2, "pre": 3, "preview": 3, "rc": 4}
+
+
+def version_key(version: str):
+    # "531.41" < "531.79" < "536.23"; "1.10" > "1.9"; "1.0" == "1.0.0";
+    # "2.0-beta" < "2.0-rc1" < "2.0" < "2.0-hotfix1"
+    version = (version or "").strip().lower()
+    match = _RELEASE_RE.match(version)
+    if not match:
+        return (), (1, 0, version)
+
+    release = [int(part) for part in re.split(r"[.\-_]", match.group(1))]
+    while len(release) > 1 and release[-1] == 0:
+        release.pop()
+
+    suffix = _SUFFIX_RE.findall(match.group(2))
+    if not suffix:
+        return tuple(release), (1, 0, "")
+
+    number = next((int(part) for part in suffix[1:] if part.isdigit()), 0)
+    if suffix[0] in PRE_RELEASE_TAGS:
+        return tuple(release), (0, PRE_RELEASE_TAGS[suffix[0]] * 1000000 + number, "")
+    return tuple(release), (2, number, " ".join(suffix))
+
+
+def is_newer(candidate: str, installed: str) -> bool:
+    return version_key(candidate) > version_key(installed)
+
+
+def computer_devices(cpu, gpu, motherboard, network_adapters):
+    devices = []
+    if cpu:
+        devices.append(("cpu", cpu))
+    if gpu:
+        devices.append(("gpu", gpu))
+    if motherboard:
+        devices.append(("motherboard", motherboard))
+    for adapter in (network_adapters or "").split(","):
+        if adapter.strip():
+            devices.append(("network", adapter.strip()))
+    return devices
+
+
+def installed_version(installed_drivers, hardware_class: str, device_name: str):
+    # Сначала ищем драйвер именно этого устройства, затем единственный драйвер того же класса
+    device_key = " ".join(tokenize(device_name))
+    same_class = [item for item in installed_drivers if item.get("hardware_class") == hardware_class]
+    for item in same_class:
+        if " ".join(tokenize(item.get("device", ""))) == device_key:
+            return item.get("version")
+    if len(same_class) == 1:
+        return same_class[0].get("version")
+    return None
+
+
+#Индекс драйверов: таблица driver_tokens(token, driver_id) обновляется при
+#регистрации и удалении драйвера, поиск по устройству - несколько обращений к индексу
+
+DELETE_TOKENS_SQL = "DELETE FROM driver_tokens WHERE driver_id = ?"
+
+def index_driver(conn, driver_id: int, model: str, supported_hardware: str = None):
+    keys, vendor, hardware_class = driver_index_keys(model, supported_hardware)
+    conn.execute(DELETE_TOKENS_SQL, (driver_id,))
+    conn.executemany(
+        "INSERT OR IGNORE INTO driver_tokens (token, driver_id) VALUES (?, ?)",
+        [(key, driver_id) for key in keys]
+    )
+    match_weight = sum(token_weight(key) for key in keys)
+    conn.execute(
+        "UPDATE drivers SET vendor = ?, hardware_class = ?, match_weight = ? WHERE id = ?",
+        (vendor, hardware_class, match_weight, driver_id)
+    )
+
+
+def unindex_driver(conn, driver_id: int):
+    conn.execute(DELETE_TOKENS_SQL, (driver_id,))
+
+
+def reindex_missing(conn):
+    rows = conn.execute('''
+        SELECT id, model, supported_hardware FROM drivers
+        WHERE id NOT IN (SELECT driver_id FROM driver_tokens)
+    ''').fetchall()
+    for driver_id, model, supported_hardware in rows:
+        index_driver(conn, driver_id, model, supported_hardware)
+    if rows:
+        print(f"🔎 Проиндексировано драйверов для подбора: {len(rows)}")
+
+
+def find_best_matches(index, devices):
+    matches = []
+    for hardware_class, device_name in devices:
+        tokens = tokenize(device_name)
+        vendor = detect_vendor(tokens)
+        if not vendor:
+            continue
+
+        keys = model_tokens(tokens, vendor)
+        if not keys:
+            continue
+
+        scored = {}
+        for driver_id, hardware_id, model, version, driver_class, weight, upload_date, token in index.candidates(keys, vendor):
+            if driver_class and driver_class != hardware_class:
+                continue
+            entry = scored.setdefault(driver_id, [0, weight or 1, hardware_id, model, version, upload_date])
+            entry[0] += token_weight(token)
+
+        if not scored:
+            continue
+
+        # Лучшее совпадение: максимум общих токенов, затем доля совпавших токенов
+        # драйвера (более конкретный драйвер), затем самая новая версия
+        best = max(
+            scored.values(),
+            key=lambda e: (e[0], e[0] / e[1], version_key(e[4]), e[5] or "")
+        )
+        matches.append({
+            "hardware_class": hardware_class,
+            "device": device_name,
+            "hardware_id": best[2],
+            "model": best[3],
+            "version": best[4],
+        })
+
+    return matches
+
+
+def pending_updates(index, devices, installed_drivers):
+    # Только драйверы строго новее установленного; если версия устройства
+    # неизвестна (старый клиент), предлагаем лучший найденный
+    updates = []
+    for driver in find_best_matches(index, devices):
+        current_version = installed_version(installed_drivers, driver["hardware_class"], driver["device"])
+        if current_version and not is_newer(driver["version"], current_version):
+            continue
+        updates.append(dict(driver, current_version=current_version))
+    return updates
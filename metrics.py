@@ -0,0 +1,344 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+
+LOOP_LAG_INTERVAL = float(os.environ.get("LOOP_LAG_INTERVAL", "0.5"))
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+METRICS_PUBLISH_INTERVAL = float(os.environ.get("METRICS_PUBLISH_INTERVAL", "5"))
+# Передачи меньше этого размера в пропускную способность не попадают - там
+# время уходит на задержки, а не на передачу
+THROUGHPUT_MIN_BYTES = 1024 * 1024
+SQL_LABEL_LENGTH = 80
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+THROUGHPUT_BUCKETS = tuple(mb * 1024 * 1024 for mb in (1, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+#Метрики сервера в текстовом формате Prometheus (/metrics) без внешних зависимостей.
+#Значения копятся в памяти процесса. При нескольких воркерах (METRICS_DIR задан)
+#каждый периодически сохраняет снимок в файл, и /metrics любого воркера отдает сумму.
+#Наблюдения приходят и из потоков пула БД, поэтому обновления под блокировкой
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+    def values(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, values: dict, other: dict):
+        # Значения другого воркера: счетчики складываются
+        for key, value in other.items():
+            values[key] = values.get(key, 0) + value
+
+    def render(self, values: dict):
+        return self.header() + [f"{self.name}{_labels(self.label_names, key)} {_number(value)}"
+                                for key, value in sorted(values.items())]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels=(), read=None, aggregate: str = "sum"):
+        super().__init__(name, help_text, labels)
+        # read - функция, значение берется в момент сбора метрик;
+        # aggregate - как объединять значения воркеров: sum (занятые соединения) или max
+        self.read = read
+        self.aggregate = aggregate
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def values(self) -> dict:
+        if self.read is not None:
+            self.set(self.read())
+        return super().values()
+
+    def merge(self, values: dict, other: dict):
+        if self.aggregate == "max":
+            for key, value in other.items():
+                values[key] = max(values.get(key, value), value)
+        else:
+            super().merge(values, other)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Счетчики по корзинам (не накопительные) + сумма + количество
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def values(self) -> dict:
+        with self._lock:
+            return {key: [list(counts), total, count] for key, (counts, total, count) in self._values.items()}
+
+    def merge(self, values: dict, other: dict):
+        for key, (counts, total, count) in other.items():
+            series = values.setdefault(key, [[0] * len(counts), 0.0, 0])
+            series[0] = [mine + theirs for mine, theirs in zip(series[0], counts)]
+            series[1] += total
+            series[2] += count
+
+    def render(self, values: dict):
+        lines = self.header()
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self, directory: str = METRICS_DIR):
+        self.metrics = []
+        # Каталог для снимков метрик воркеров; пусто - один процесс
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, f"{os.getpid()}.json") if directory else None
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=(), read=None, aggregate="sum"):
+        return self.add(Gauge(name, help_text, labels, read, aggregate))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.add(Histogram(name, help_text, labels, buckets))
+
+    def write_snapshot(self):
+        if not self.snapshot_path:
+            return
+        snapshot = {
+            "written_at": time.time(),
+            "metrics": {metric.name: [[list(key), value] for key, value in metric.values().items()]
+                        for metric in self.metrics},
+        }
+        temp_path = f"{self.snapshot_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(snapshot, file)
+        os.replace(temp_path, self.snapshot_path)
+
+    def read_snapshots(self):
+        if not self.directory:
+            return []
+        snapshots = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".json") or path == self.snapshot_path:
+                continue
+            try:
+                with open(path, encoding="utf-8") as file:
+                    snapshots.append(json.load(file))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self) -> str:
+        # Счетчики и гистограммы завершившихся воркеров остаются в сумме, чтобы
+        # значения не уменьшались; их мгновенные показатели (gauge) уже неактуальны
+        snapshots = self.read_snapshots()
+        fresh_after = time.time() - METRICS_PUBLISH_INTERVAL * 3
+
+        lines = []
+        for metric in self.metrics:
+            values = metric.values()
+            for snapshot in snapshots:
+                if isinstance(metric, Gauge) and snapshot["written_at"] < fresh_after:
+                    continue
+                other = {tuple(key): value for key, value in snapshot["metrics"].get(metric.name, [])}
+                metric.merge(values, other)
+            lines.extend(metric.render(values))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "Количество HTTP-запросов", ("method", "route", "status"))
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса", ("method", "route"))
+HTTP_IN_PROGRESS = REGISTRY.gauge(
+    "http_requests_in_progress", "Запросы в обработке", ("method",))
+HTTP_RECEIVED_BYTES = REGISTRY.counter(
+    "http_request_bytes_total", "Принято байт в телах запросов (загрузки)", ("route",))
+HTTP_SENT_BYTES = REGISTRY.counter(
+    "http_response_bytes_total", "Отправлено байт в телах ответов (скачивания)", ("route",))
+TRANSFER_THROUGHPUT = REGISTRY.histogram(
+    "http_transfer_bytes_per_second", "Скорость крупных загрузок и скачиваний",
+    ("route", "direction"), THROUGHPUT_BUCKETS)
+
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_duration_seconds", "Время выполнения операции с БД (без ожидания соединения)",
+    ("query", "mode"), DB_BUCKETS)
+DB_POOL_WAIT_SECONDS = REGISTRY.histogram(
+    "db_pool_wait_seconds", "Ожидание свободного потока и соединения с БД", (), DB_BUCKETS)
+DB_ERRORS = REGISTRY.counter(
+    "db_query_errors_total", "Операции с БД, завершившиеся ошибкой", ("query",))
+
+LOOP_LAG = REGISTRY.histogram(
+    "event_loop_lag_seconds", "Задержка event loop относительно запланированного пробуждения", (), LAG_BUCKETS)
+LOOP_LAG_LAST = REGISTRY.gauge(
+    "event_loop_lag_last_seconds", "Последнее измерение задержки event loop", aggregate="max")
+
+
+def query_label(func) -> str:
+    # Имя функции, выполняемой в db.run: "get_drivers.<locals>.load" -> "get_drivers.load";
+    # для одиночного запроса - его SQL в одну строку
+    if isinstance(func, str):
+        return " ".join(func.split())[:SQL_LABEL_LENGTH]
+    name = getattr(func, "__qualname__", None) or getattr(func, "__name__", None) or "unknown"
+    return name.replace("<locals>.", "")
+
+
+def observe_query(func, write: bool, waited: float, elapsed: float, failed: bool = False):
+    label = query_label(func)
+    DB_POOL_WAIT_SECONDS.observe(waited)
+    DB_QUERY_SECONDS.observe(elapsed, label, "write" if write else "read")
+    if failed:
+        DB_ERRORS.inc(label)
+
+
+class MetricsMiddleware:
+    # Чистый ASGI (не BaseHTTPMiddleware): не буферизует ответы, потоковые
+    # скачивания и sendfile проходят как есть, мы только считаем байты
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    def route_label(self, scope) -> str:
+        # Шаблон маршрута (/drivers/{hardware_id}), а не сам путь: число рядов
+        # метрик не растет от идентификаторов и несуществующих адресов
+        if self._routes is None:
+            app = scope.get("app")
+            routes = getattr(getattr(app, "router", None), "routes", [])
+            self._routes = {getattr(route, "endpoint", None) or getattr(route, "app", None): route.path
+                            for route in routes}
+        endpoint = scope.get("endpoint")
+        return self._routes.get(endpoint, "unmatched") if endpoint is not None else "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        started = time.perf_counter()
+        state = {"status": 500, "received": 0, "sent": 0}
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                state["received"] += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["sent"] += len(message.get("body", b""))
+            elif message["type"] == "http.response.zerocopysend":
+                state["sent"] += message.get("count") or 0
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc(method)
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            HTTP_IN_PROGRESS.dec(method)
+            elapsed = time.perf_counter() - started
+            route = self.route_label(scope)
+            HTTP_REQUESTS.inc(method, route, str(state["status"]))
+            HTTP_LATENCY.observe(elapsed, method, route)
+
+            for direction, size, counter in (("upload", state["received"], HTTP_RECEIVED_BYTES),
+                                             ("download", state["sent"], HTTP_SENT_BYTES)):
+                if size:
+                    counter.inc(route, amount=size)
+                if size >= THROUGHPUT_MIN_BYTES and elapsed > 0:
+                    TRANSFER_THROUGHPUT.observe(size / elapsed, route, direction)
+
+
+async def watch_loop_lag(interval: float = LOOP_LAG_INTERVAL):
+    # Если loop занят синхронной работой, пробуждение опаздывает - это и есть задержка
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_LAST.set(lag)
+
+
+async def publish_periodically(interval: float = METRICS_PUBLISH_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            REGISTRY.write_snapshot()
+        except OSError as e:
+            print(f"⚠️ Ошибка сохранения снимка метрик: {e}")
@@ -0,0 +1,553 @@
+import sqlite3
+import sys
+
+from matching import gpu_vendor_of, index_driver, DELETE_TOKENS_SQL
+from stats import reconcile, PENDING_JOBS_SQL, OUTDATED_COMPUTERS_SQL
+from peers import FIND_PEERS_SQL
+from rollouts import (ELIGIBLE_COMPUTERS_SQL, WAVE_COUNTS_SQL, ACTIVE_JOBS_SQL, REPORT_JOB_SQL,
+                      DELETE_DRIVER_JOBS_SQL, CLAIM_JOB_SQL)
+from catalog import DRIVER_ID_SQL
+from events import NEW_EVENTS_SQL, SUBSCRIBED_COMPUTERS_SQL
+from computers import COMPUTER_DEFAULT_FIELDS, COMPUTER_DEVICES_SQL, computers_page_query
+from cleanup import DELETE_BATCH_SQL, DELETE_JOBS_SQL, DELETE_PEERS_SQL
+from storage import BLOB_REFERENCES_SQL
+from dashboard import computers_seen_query
+
+
+#Версионные миграции схемы: номер примененной миграции хранится в PRAGMA user_version,
+#при запуске сервера все недостающие миграции выполняются в одной транзакции.
+#Новая миграция - новая функция в конце MIGRATIONS, старые не меняются. Поэтому DDL
+#всех миграций записан здесь, а не берется из модулей: правка функции в модуле молча
+#изменила бы то, что создает "версия 1", и новые базы разошлись бы с существующими
+
+
+DRIVERS_COLUMNS = '''
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hardware_id TEXT UNIQUE NOT NULL,
+    model TEXT NOT NULL,
+    driver_version TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    file_size INTEGER,
+    sha256 TEXT,
+    original_filename TEXT,
+    os_version TEXT DEFAULT 'Windows 10',
+    supported_hardware TEXT,
+    vendor TEXT,
+    hardware_class TEXT,
+    match_weight INTEGER,
+    upload_date TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+'''
+
+
+STATS_COUNTERS = ("computers", "drivers", "drivers_bytes", "stored_bytes", "pending_jobs", "outdated_computers")
+
+STATS_TRIGGERS = (
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_computers_insert AFTER INSERT ON computers
+    BEGIN
+        UPDATE stats SET value = value + 1 WHERE key = 'computers';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_computers_delete AFTER DELETE ON computers
+    BEGIN
+        UPDATE stats SET value = value - 1 WHERE key = 'computers';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_drivers_insert AFTER INSERT ON drivers
+    BEGIN
+        UPDATE stats SET value = value + 1 WHERE key = 'drivers';
+        UPDATE stats SET value = value + IFNULL(NEW.file_size, 0) WHERE key = 'drivers_bytes';
+        UPDATE stats SET value = value + IFNULL(NEW.file_size, 0) WHERE key = 'stored_bytes'
+            AND NEW.sha256 IS NOT NULL
+            AND (SELECT COUNT(*) FROM drivers WHERE sha256 = NEW.sha256) = 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_drivers_delete AFTER DELETE ON drivers
+    BEGIN
+        UPDATE stats SET value = value - 1 WHERE key = 'drivers';
+        UPDATE stats SET value = value - IFNULL(OLD.file_size, 0) WHERE key = 'drivers_bytes';
+        UPDATE stats SET value = value - IFNULL(OLD.file_size, 0) WHERE key = 'stored_bytes'
+            AND OLD.sha256 IS NOT NULL
+            AND NOT EXISTS (SELECT 1 FROM drivers WHERE sha256 = OLD.sha256);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_jobs_insert AFTER INSERT ON installation_jobs
+    WHEN NEW.status = 'pending'
+    BEGIN
+        UPDATE stats SET value = value + 1 WHERE key = 'pending_jobs';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_jobs_delete AFTER DELETE ON installation_jobs
+    WHEN OLD.status = 'pending'
+    BEGIN
+        UPDATE stats SET value = value - 1 WHERE key = 'pending_jobs';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_jobs_update AFTER UPDATE OF status ON installation_jobs
+    WHEN (OLD.status = 'pending') != (NEW.status = 'pending')
+    BEGIN
+        UPDATE stats SET value = value + (CASE WHEN NEW.status = 'pending' THEN 1 ELSE -1 END)
+            WHERE key = 'pending_jobs';
+    END
+    ''',
+)
+
+
+def stats_tables(conn):
+    created = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats'"
+    ).fetchone() is None
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.executemany("INSERT OR IGNORE INTO stats (key, value) VALUES (?, 0)", [(key,) for key in STATS_COUNTERS])
+    for trigger in STATS_TRIGGERS:
+        conn.execute(trigger)
+
+    if created:
+        reconcile(conn, report_drift=False)
+
+
+def peer_cache_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS peer_cache (
+            hardware_id TEXT NOT NULL,
+            computer_name TEXT NOT NULL,
+            subnet TEXT NOT NULL,
+            ip TEXT NOT NULL,
+            port INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (hardware_id, computer_name)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_peer_cache_subnet ON peer_cache(hardware_id, subnet, updated_at)")
+
+
+def rollout_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rollouts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hardware_id TEXT NOT NULL,
+            driver_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'active',
+            wave_size INTEGER NOT NULL,
+            wave_growth REAL NOT NULL,
+            max_in_flight INTEGER NOT NULL,
+            min_success_rate REAL NOT NULL,
+            current_wave INTEGER NOT NULL DEFAULT 0,
+            approved_wave INTEGER NOT NULL DEFAULT 0,
+            scan_cursor TEXT NOT NULL DEFAULT '',
+            message TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rollouts_status ON rollouts(status)")
+
+    columns = table_columns(conn, "installation_jobs")
+    for column, column_type in (("rollout_id", "INTEGER"), ("wave", "INTEGER"),
+                                ("claimed_at", "TIMESTAMP NULL"), ("message", "TEXT")):
+        if column not in columns:
+            print(f"🔄 Добавляем колонку {column} в installation_jobs...")
+            conn.execute(f"ALTER TABLE installation_jobs ADD COLUMN {column} {column_type}")
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_installation_jobs_rollout ON installation_jobs(rollout_id, wave, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_installation_jobs_computer ON installation_jobs(computer_name, status)")
+
+
+def baseline(conn):
+    # Версия 1: все, что раньше делали init_db и список ALTER в update_db_schema.
+    # Базы без user_version могли остановиться на любом шаге, поэтому все проверки идемпотентны
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS computers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            ip TEXT NOT NULL,
+            cpu TEXT,
+            gpu TEXT,
+            motherboard TEXT,
+            network_adapters TEXT,
+            installed_drivers TEXT,
+            gpu_vendor TEXT,
+            fingerprint TEXT,
+            last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS drivers (
+            {DRIVERS_COLUMNS}
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS driver_tokens (
+            token TEXT NOT NULL,
+            driver_id INTEGER NOT NULL,
+            PRIMARY KEY (token, driver_id)
+        ) WITHOUT ROWID
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS installation_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            computer_name TEXT NOT NULL,
+            hardware_id TEXT NOT NULL,
+            driver_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP NULL,
+            rollout_id INTEGER,
+            wave INTEGER,
+            claimed_at TIMESTAMP NULL,
+            message TEXT
+        )
+    ''')
+
+    driver_columns = table_columns(conn, "drivers")
+    for column, column_type in (("file_size", "INTEGER"), ("original_filename", "TEXT"),
+                                ("upload_date", "TIMESTAMP"), ("sha256", "TEXT"), ("vendor", "TEXT"),
+                                ("hardware_class", "TEXT"), ("match_weight", "INTEGER")):
+        if column not in driver_columns:
+            print(f"🔄 Добавляем колонку {column}...")
+            conn.execute(f"ALTER TABLE drivers ADD COLUMN {column} {column_type}")
+    if "upload_date" not in driver_columns:
+        conn.execute("UPDATE drivers SET upload_date = CURRENT_TIMESTAMP WHERE upload_date IS NULL")
+
+    computer_columns = table_columns(conn, "computers")
+    for column in ("installed_drivers", "gpu_vendor", "fingerprint"):
+        if column not in computer_columns:
+            print(f"🔄 Добавляем колонку {column}...")
+            conn.execute(f"ALTER TABLE computers ADD COLUMN {column} TEXT")
+    if "gpu_vendor" not in computer_columns:
+        for computer_id, gpu in conn.execute("SELECT id, gpu FROM computers").fetchall():
+            conn.execute("UPDATE computers SET gpu_vendor = ? WHERE id = ?", (gpu_vendor_of(gpu), computer_id))
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_computers_last_seen ON computers(last_seen, name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_computers_created_at ON computers(created_at, name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_computers_gpu_vendor ON computers(gpu_vendor, last_seen, name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_drivers_sha256 ON drivers(sha256)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_driver_tokens_driver ON driver_tokens(driver_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_installation_jobs_status ON installation_jobs(status)")
+
+    stats_tables(conn)
+    peer_cache_table(conn)
+    rollout_tables(conn)
+
+
+def unique_drivers(conn):
+    # Версия 2: в старых базах drivers создана без UNIQUE(hardware_id). SQLite не
+    # умеет добавлять ограничение в существующую таблицу, поэтому таблица пересоздается
+    for _, index_name, unique, *_ in conn.execute("PRAGMA index_list(drivers)").fetchall():
+        columns = [row[2] for row in conn.execute(f"PRAGMA index_info({index_name})")]
+        if unique and columns == ["hardware_id"]:
+            return
+
+    duplicates = conn.execute('''
+        SELECT hardware_id, COUNT(*) FROM drivers GROUP BY hardware_id HAVING COUNT(*) > 1
+    ''').fetchall()
+    for hardware_id, count in duplicates:
+        print(f"⚠️ Драйвер {hardware_id} зарегистрирован {count} раз, оставляем последнюю запись")
+
+    columns = ", ".join(table_columns(conn, "drivers"))
+    conn.execute(f"CREATE TABLE drivers_new ({DRIVERS_COLUMNS})")
+    conn.execute(f'''
+        INSERT INTO drivers_new ({columns})
+        SELECT {columns} FROM drivers WHERE id IN (SELECT MAX(id) FROM drivers GROUP BY hardware_id)
+    ''')
+    conn.execute("DROP TABLE drivers")
+    conn.execute("ALTER TABLE drivers_new RENAME TO drivers")
+    conn.execute("DELETE FROM driver_tokens WHERE driver_id NOT IN (SELECT id FROM drivers)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_drivers_sha256 ON drivers(sha256)")
+
+    # Триггеры счетчиков удалены вместе со старой таблицей
+    stats_tables(conn)
+    reconcile(conn, report_drift=False)
+    print("🔄 Таблица drivers пересоздана с UNIQUE(hardware_id)")
+
+
+def hot_query_indexes(conn):
+    # Версия 3: индексы для запросов, которые выполнялись полным просмотром таблицы
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_installation_jobs_computer ON installation_jobs(computer_name, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_installation_jobs_hardware ON installation_jobs(hardware_id, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_drivers_model ON drivers(model, driver_version)")
+
+
+def cleanup_indexes(conn):
+    # Версия 4: пакетная очистка удаляет строки peer_cache по имени компьютера
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_peer_cache_computer ON peer_cache(computer_name)")
+
+
+# Номер версии каталога в stats меняется триггерами в той же транзакции, что и drivers:
+# воркер, который сам не менял каталог, видит новую версию и перечитывает его
+CATALOG_VERSION_TRIGGERS = tuple(
+    f'''
+    CREATE TRIGGER IF NOT EXISTS catalog_version_{event.lower()} AFTER {event} ON drivers
+    BEGIN
+        UPDATE stats SET value = value + 1, updated_at = CURRENT_TIMESTAMP WHERE key = 'catalog_version';
+    END
+    '''
+    for event in ("INSERT", "UPDATE", "DELETE")
+)
+
+
+def catalog_version_triggers(conn):
+    conn.execute("INSERT OR IGNORE INTO stats (key, value) VALUES ('catalog_version', 0)")
+    for trigger in CATALOG_VERSION_TRIGGERS:
+        conn.execute(trigger)
+
+
+def worker_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at TIMESTAMP NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS server_state (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+
+
+def worker_state(conn):
+    # Версия 5: версия каталога для воркеров, аренда периодических задач и общее состояние
+    catalog_version_triggers(conn)
+    worker_tables(conn)
+
+
+def events_table(conn):
+    # Версия 6: события для уведомления агентов и живых изменений веб-интерфейса
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def computer_list_indexes(conn):
+    # Версия 7: фильтр по производителю видеокарты с сортировкой по имени или дате
+    # регистрации читается по индексу в нужном порядке, без сортировки всех строк
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_computers_gpu_vendor_name ON computers(gpu_vendor, name)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_computers_gpu_vendor_created ON computers(gpu_vendor, created_at, name)"
+    )
+
+
+def rollout_wave_candidates(conn):
+    # Версия 8: волна развертывания набирается за несколько тиков планировщика,
+    # найденные компьютеры хранятся до ее создания
+    if "wave_candidates" not in table_columns(conn, "rollouts"):
+        conn.execute("ALTER TABLE rollouts ADD COLUMN wave_candidates TEXT NOT NULL DEFAULT '[]'")
+
+
+# seen_seq - номер отметки присутствия из счетчика в stats. Его увеличивают триггеры
+# в той же транзакции, что и last_seen: запись идет по одной, поэтому номера растут
+# в порядке фиксации. По last_seen с точностью до секунды строка, зафиксированная
+# позже в ту же секунду, оказалась бы позади уже прочитанной позиции
+SEEN_SEQ_TRIGGERS = tuple(
+    f'''
+    CREATE TRIGGER IF NOT EXISTS computers_seen_{name} AFTER {event} ON computers
+    BEGIN
+        UPDATE stats SET value = value + 1 WHERE key = 'seen_seq';
+        UPDATE computers SET seen_seq = (SELECT value FROM stats WHERE key = 'seen_seq') WHERE id = NEW.id;
+    END
+    '''
+    for name, event in (("insert", "INSERT"), ("update", "UPDATE OF last_seen"))
+)
+
+
+def seen_sequence(conn):
+    # Версия 9: монотонный номер отметки присутствия для потока изменений веб-интерфейса
+    if "seen_seq" not in table_columns(conn, "computers"):
+        conn.execute("ALTER TABLE computers ADD COLUMN seen_seq INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_computers_seen_seq ON computers(seen_seq)")
+    conn.execute("INSERT OR IGNORE INTO stats (key, value) VALUES ('seen_seq', 0)")
+    for trigger in SEEN_SEQ_TRIGGERS:
+        conn.execute(trigger)
+
+
+def vendor_aliases(conn):
+    # Версия 10: "micro" перестало означать MSI - у AMD из pci.ids ("Advanced Micro
+    # Devices") был записан производитель msi. Пересчитываем его и индекс драйверов
+    for computer_id, gpu in conn.execute("SELECT id, gpu FROM computers WHERE gpu_vendor = 'msi'").fetchall():
+        conn.execute("UPDATE computers SET gpu_vendor = ? WHERE id = ?", (gpu_vendor_of(gpu), computer_id))
+    drivers = conn.execute('''
+        SELECT id, model, supported_hardware FROM drivers
+        WHERE vendor = 'msi' OR id IN (SELECT driver_id FROM driver_tokens WHERE token = 'micro')
+    ''').fetchall()
+    for driver_id, model, supported_hardware in drivers:
+        index_driver(conn, driver_id, model, supported_hardware)
+
+
+def rollout_clean_pass(conn):
+    # Версия 11: развертывание завершается только после полного обхода парка с начала
+    # без новых заданий - так находятся компьютеры, зарегистрированные позади курсора
+    if "clean_pass" not in table_columns(conn, "rollouts"):
+        conn.execute("ALTER TABLE rollouts ADD COLUMN clean_pass INTEGER NOT NULL DEFAULT 0")
+
+
+MIGRATIONS = (
+    (1, "Исходная схема", baseline),
+    (2, "UNIQUE(hardware_id) в drivers", unique_drivers),
+    (3, "Индексы для частых запросов", hot_query_indexes),
+    (4, "Индекс peer_cache по компьютеру", cleanup_indexes),
+    (5, "Общее состояние воркеров", worker_state),
+    (6, "События для уведомления агентов", events_table),
+    (7, "Индексы списка компьютеров по производителю", computer_list_indexes),
+    (8, "Накопление волны развертывания", rollout_wave_candidates),
+    (9, "Номер отметки присутствия компьютера", seen_sequence),
+    (10, "Производитель AMD вместо MSI", vendor_aliases),
+    (11, "Повторный обход парка перед завершением развертывания", rollout_clean_pass),
+)
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def table_columns(conn, table: str):
+    return [column[1] for column in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    # Вызывается внутри транзакции: при ошибке откатываются все миграции и user_version
+    version = schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Версия схемы базы ({version}) новее, чем поддерживает сервер ({SCHEMA_VERSION})")
+
+    applied = []
+    for number, description, migration in MIGRATIONS:
+        if number <= version:
+            continue
+        print(f"🔄 Миграция {number}: {description}")
+        migration(conn)
+        conn.execute(f"PRAGMA user_version = {number}")
+        applied.append(number)
+    return applied
+
+
+#Частые запросы сервера и проверка, что SQLite выполняет их по индексу. Проверяются
+#те же строки SQL, что выполняет сервер: запросы импортируются из модулей
+
+HOT_QUERIES = (
+    ("компьютер по имени", COMPUTER_DEVICES_SQL, ("pc",)),
+    ("подключенные к уведомлениям компьютеры", SUBSCRIBED_COMPUTERS_SQL, ('["pc"]',)),
+    ("компьютеры, вышедшие на связь", *computers_seen_query(100)),
+    ("компьютеры, пропущенные панелью", *computers_seen_query(100, until=200)),
+    ("новые события", NEW_EVENTS_SQL, (0, 500)),
+    ("устаревшие компьютеры", OUTDATED_COMPUTERS_SQL, ("-30 days",)),
+    ("пачка очистки", DELETE_BATCH_SQL, ("2020-01-01", 500)),
+    ("задания удаляемых компьютеров", DELETE_JOBS_SQL, ('["pc"]',)),
+    ("соседи удаляемых компьютеров", DELETE_PEERS_SQL, ('["pc"]',)),
+    ("активные задания компьютера", ACTIVE_JOBS_SQL, ("pc",)),
+    ("отчет об установке", REPORT_JOB_SQL, ("success", None, "pc", "hw")),
+    ("задания драйвера", DELETE_DRIVER_JOBS_SQL, ("hw",)),
+    ("ожидающие задания", PENDING_JOBS_SQL, ()),
+    ("задания волны развертывания", WAVE_COUNTS_SQL, (1, 1)),
+    ("кандидаты волны развертывания", ELIGIBLE_COMPUTERS_SQL, ("pc", 1, "hw", 500)),
+    ("захват задания", CLAIM_JOB_SQL, ("pc", 50)),
+    ("драйвер по hardware_id", DRIVER_ID_SQL, ("hw",)),
+    ("ссылки на блоб", BLOB_REFERENCES_SQL, ("0" * 64,)),
+    ("токены драйвера", DELETE_TOKENS_SQL, (1,)),
+    ("соседи с драйвером", FIND_PEERS_SQL, ("hw", "10.0.0.0/24", "0" * 64, "pc", "-24 hours", 5)),
+)
+
+
+# Сочетания фильтров и сортировок GET /computers - запрос строит тот же код, что и обработчик
+COMPUTER_LIST_CASES = (
+    ("по last_seen", "last_seen", {}),
+    ("по created_at", "created_at", {}),
+    ("по имени", "name", {}),
+    ("по началу имени", "name", {"name_prefix": "PC-1"}),
+    ("по производителю и last_seen", "last_seen", {"gpu_vendor": "nvidia"}),
+    ("по производителю и имени", "name", {"gpu_vendor": "nvidia"}),
+    ("по производителю и created_at", "created_at", {"gpu_vendor": "nvidia"}),
+    ("по началу имени и производителю", "name", {"name_prefix": "PC-1", "gpu_vendor": "nvidia"}),
+)
+
+
+def computer_list_queries():
+    for name, sort, filters in COMPUTER_LIST_CASES:
+        after = ["PC-1"] if sort == "name" else ["2030-01-01", "PC-1"]
+        for suffix, cursor in (("", None), (", следующая страница", after)):
+            sql, params, _ = computers_page_query(COMPUTER_DEFAULT_FIELDS, sort, True, 100, cursor, **filters)
+            yield f"список компьютеров {name}{suffix}", sql, params
+
+
+HOT_QUERIES += tuple(computer_list_queries())
+
+
+def query_plan(conn, sql: str, params=()):
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def plan_problems(plan):
+    # Полный просмотр таблицы без индекса или сортировка во временном B-дереве;
+    # просмотр json_each - это перебор переданного списка, а не таблицы
+    return [
+        step for step in plan
+        if (step.startswith("SCAN ") and " USING " not in step and "VIRTUAL TABLE" not in step)
+        or "TEMP B-TREE" in step
+    ]
+
+
+def check_query_plans(conn):
+    failures = []
+    for name, sql, params in HOT_QUERIES:
+        problems = plan_problems(query_plan(conn, sql, params))
+        if problems:
+            failures.append((name, problems))
+    return failures
+
+
+def main(argv):
+    db_path = argv[1] if len(argv) > 1 and not argv[1].startswith("--") else "drivers.db"
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            applied = migrate(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        print(f"✅ Версия схемы: {schema_version(conn)}, применено миграций: {len(applied)}")
+
+        if "--check" in argv:
+            failures = check_query_plans(conn)
+            for name, problems in failures:
+                print(f"⚠️ {name}: {'; '.join(problems)}")
+            if failures:
+                return 1
+            print(f"✅ Все частые запросы ({len(HOT_QUERIES)}) используют индексы")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
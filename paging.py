@@ -0,0 +1,63 @@
+import base64
+import json
+from typing import Optional
+
+from fastapi import HTTPException
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps(list(values), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], types):
+    # types - тип каждого значения курсора: значение другого типа (null, список,
+    # число вместо строки) нельзя сравнивать с ключами сортировки и передавать в SQL
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    if (not isinstance(values, list) or len(values) != len(types)
+            or not all(type(value) is value_type for value, value_type in zip(values, types))):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    return values
+
+
+def parse_fields(fields: Optional[str], allowed, default):
+    if not fields:
+        return tuple(default)
+    selected = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in selected if field not in allowed]
+    if unknown or not selected:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неизвестные поля: {', '.join(unknown)}. Доступны: {', '.join(allowed)}"
+        )
+    return selected
+
+
+def parse_order(order: str) -> bool:
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order должен быть asc или desc")
+    return order == "desc"
+
+
+def prefix_upper_bound(prefix: str) -> str:
+    # name >= 'PC-1' AND name < 'PC-2' использует индекс, в отличие от LIKE 'PC-1%'
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def page_response(items, next_cursor, limit: int) -> dict:
+    return {
+        "items": items,
+        "count": len(items),
+        "limit": limit,
+        "next_cursor": next_cursor
+    }
@@ -0,0 +1,75 @@
+import ipaddress
+import os
+
+
+MAX_PEERS = int(os.environ.get("PEER_CACHE_MAX_PEERS", "5"))
+PEER_MAX_AGE_HOURS = int(os.environ.get("PEER_CACHE_MAX_AGE_HOURS", "24"))
+
+#Раздача драйверов между агентами одной подсети: агент, успешно установивший
+#драйвер, сообщает порт своего кеша, и check-updates предлагает его соседям.
+#Файл от соседа агент все равно проверяет по SHA-256, опубликованному сервером
+
+
+def subnet_of(ip: str):
+    # Соседями считаем компьютеры из той же /24 (для IPv6 - /64)
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    if address.is_loopback or address.is_unspecified:
+        return None
+    prefix = 24 if address.version == 4 else 64
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+def record_peer(conn, hardware_id: str, computer_name: str, port: int):
+    row = conn.execute('''
+        SELECT c.ip, d.sha256 FROM computers c, drivers d
+        WHERE c.name = ? AND d.hardware_id = ?
+    ''', (computer_name, hardware_id)).fetchone()
+    if not row or not row[1] or not subnet_of(row[0]):
+        return False
+
+    conn.execute('''
+        INSERT INTO peer_cache (hardware_id, computer_name, subnet, ip, port, sha256, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(hardware_id, computer_name) DO UPDATE SET
+            subnet = excluded.subnet,
+            ip = excluded.ip,
+            port = excluded.port,
+            sha256 = excluded.sha256,
+            updated_at = excluded.updated_at
+    ''', (hardware_id, computer_name, subnet_of(row[0]), row[0], port, row[1]))
+    return True
+
+
+def forget_peer(conn, hardware_id: str, computer_name: str):
+    conn.execute(
+        "DELETE FROM peer_cache WHERE hardware_id = ? AND computer_name = ?",
+        (hardware_id, computer_name)
+    )
+
+
+# Только недавно выходившие на связь агенты с той же версией файла. Порядок - по
+# idx_peer_cache_subnet (свежие отчеты первыми): чтение останавливается на limit,
+# а не сортирует всех соседей подсети во временном B-дереве
+FIND_PEERS_SQL = '''
+    SELECT p.ip, p.port FROM peer_cache p
+    JOIN computers c ON c.name = p.computer_name
+    WHERE p.hardware_id = ? AND p.subnet = ? AND p.sha256 = ?
+        AND p.computer_name != ?
+        AND c.last_seen >= datetime('now', ?)
+    ORDER BY p.updated_at DESC
+    LIMIT ?
+'''
+
+
+def find_peers(conn, hardware_id: str, sha256: str, computer_name: str, ip: str, limit: int = MAX_PEERS):
+    subnet = subnet_of(ip)
+    if not subnet or not sha256:
+        return []
+
+    rows = conn.execute(FIND_PEERS_SQL, (
+        hardware_id, subnet, sha256, computer_name, f"-{PEER_MAX_AGE_HOURS} hours", limit
+    )).fetchall()
+    return [{"ip": peer_ip, "port": port} for peer_ip, port in rows]
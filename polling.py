@@ -0,0 +1,31 @@
+import os
+from typing import Optional
+
+
+POLL_INTERVAL = int(os.environ.get("AGENT_POLL_INTERVAL", "3600"))
+MAX_POLL_INTERVAL = int(os.environ.get("AGENT_MAX_POLL_INTERVAL", str(6 * 3600)))
+BUSY_RETRY_AFTER = int(os.environ.get("AGENT_BUSY_RETRY_AFTER", "300"))
+# Ниже этой загрузки подсказку не отправляем: агент приходит по своему интервалу
+SLOWDOWN_LOAD = float(os.environ.get("AGENT_SLOWDOWN_LOAD", "0.5"))
+
+#Подсказка агентам, когда приходить в следующий раз: при загруженной очереди
+#записи или пуле соединений интервал растет, и сервер сам сбрасывает нагрузку
+
+
+def server_load(heartbeats, db) -> float:
+    queue_load = heartbeats.depth / heartbeats.max_queue if heartbeats.max_queue else 0
+    pool_load = db.in_use / db.size if db.size else 0
+    return min(1.0, max(queue_load, pool_load))
+
+
+def next_poll(heartbeats, db, interval: int = POLL_INTERVAL) -> Optional[int]:
+    # Без нагрузки подсказки нет (None), под нагрузкой интервал растет до MAX_POLL_INTERVAL.
+    # Агент берет большее из подсказки и своего интервала, так что подсказка только замедляет
+    load = server_load(heartbeats, db)
+    if load < SLOWDOWN_LOAD:
+        return None
+    return int(interval + (max(MAX_POLL_INTERVAL, interval) - interval) * load * load)
+
+
+def busy_retry_after(heartbeats, db) -> int:
+    return int(BUSY_RETRY_AFTER * (1 + server_load(heartbeats, db)))
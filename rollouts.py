@@ -0,0 +1,285 @@
+import asyncio
+import json
+import os
+
+from matching import computer_devices, pending_updates
+from events import publish_event, publish_job_status
+
+
+SCHEDULER_INTERVAL = int(os.environ.get("ROLLOUT_INTERVAL", "30"))
+FLEET_MAX_IN_FLIGHT = int(os.environ.get("ROLLOUT_FLEET_MAX_IN_FLIGHT", "50"))
+JOB_TIMEOUT_MINUTES = int(os.environ.get("ROLLOUT_JOB_TIMEOUT_MINUTES", "60"))
+MAX_WAVE_SIZE = int(os.environ.get("ROLLOUT_MAX_WAVE_SIZE", "1000"))
+SCAN_BATCH = 500
+SCAN_ROWS_PER_TICK = int(os.environ.get("ROLLOUT_SCAN_ROWS", "2000"))
+
+ROLLOUT_ACTIONS = ("pause", "resume", "cancel")
+
+#Поэтапное развертывание драйвера: задания создаются волнами, следующая волна
+#(в growth раз больше) появляется только после завершения предыдущей с долей
+#успешных установок не ниже min_success_rate. Агенты забирают задания сами,
+#число одновременных установок ограничено и на развертывание, и на весь парк.
+#Запросы к заданиям вынесены в константы - их планы проверяет migrations.py --check
+
+ELIGIBLE_COMPUTERS_SQL = '''
+    SELECT c.name, c.cpu, c.gpu, c.motherboard, c.network_adapters, c.installed_drivers
+    FROM computers c
+    WHERE c.name > ?
+        AND NOT EXISTS (
+            SELECT 1 FROM installation_jobs j
+            WHERE j.computer_name = c.name AND (j.rollout_id = ?
+                OR (j.hardware_id = ? AND j.status IN ('pending', 'in_progress')))
+        )
+    ORDER BY c.name
+    LIMIT ?
+'''
+WAVE_COUNTS_SQL = "SELECT status, COUNT(*) FROM installation_jobs WHERE rollout_id = ? AND wave = ? GROUP BY status"
+ACTIVE_JOBS_SQL = '''
+    SELECT COUNT(*) FROM installation_jobs
+    WHERE computer_name = ? AND status IN ('pending', 'in_progress')
+'''
+REPORT_JOB_SQL = '''
+    UPDATE installation_jobs
+    SET status = ?, message = ?, completed_at = CURRENT_TIMESTAMP
+    WHERE computer_name = ? AND hardware_id = ? AND status IN ('pending', 'in_progress')
+    RETURNING computer_name, hardware_id
+'''
+DELETE_DRIVER_JOBS_SQL = "DELETE FROM installation_jobs WHERE hardware_id = ?"
+CLAIM_JOB_SQL = '''
+    UPDATE installation_jobs
+    SET status = 'in_progress', claimed_at = CURRENT_TIMESTAMP
+    WHERE id = (
+        SELECT j.id FROM installation_jobs j
+        JOIN rollouts r ON r.id = j.rollout_id
+        WHERE j.computer_name = ? AND j.status = 'pending' AND r.status = 'active'
+            AND (SELECT COUNT(*) FROM installation_jobs
+                 WHERE rollout_id = r.id AND wave = r.current_wave AND status = 'in_progress') < r.max_in_flight
+            AND (SELECT COUNT(*) FROM installation_jobs WHERE status = 'in_progress') < ?
+        ORDER BY j.id
+        LIMIT 1
+    )
+    RETURNING id, hardware_id, rollout_id
+'''
+
+
+def create_rollout(conn, catalog, hardware_id: str, wave_size: int, wave_growth: float,
+                   max_in_flight: int, min_success_rate: float):
+    driver = catalog.get(hardware_id)
+    if not driver:
+        return None
+
+    cursor = conn.execute('''
+        INSERT INTO rollouts (hardware_id, driver_id, wave_size, wave_growth, max_in_flight, min_success_rate, clean_pass)
+        VALUES (?, ?, ?, ?, ?, ?, 1)
+    ''', (hardware_id, driver.id, wave_size, wave_growth, max_in_flight, min_success_rate))
+    rollout_id = cursor.lastrowid
+    advance_rollout(conn, catalog, rollout_id)
+    return rollout_id
+
+
+def rollout_counts(conn, rollout_id: int, wave: int = None):
+    if wave is None:
+        rows = conn.execute(
+            "SELECT status, COUNT(*) FROM installation_jobs WHERE rollout_id = ? GROUP BY status",
+            (rollout_id,)
+        )
+    else:
+        rows = conn.execute(WAVE_COUNTS_SQL, (rollout_id, wave))
+    return {status: count for status, count in rows}
+
+
+def success_rate(counts):
+    finished = counts.get("success", 0) + counts.get("failed", 0)
+    return counts.get("success", 0) / finished if finished else 1.0
+
+
+def next_wave_size(wave_size: int, wave_growth: float, wave: int) -> int:
+    return max(1, min(MAX_WAVE_SIZE, int(wave_size * wave_growth ** wave)))
+
+
+def eligible_computers(conn, catalog, rollout_id: int, hardware_id: str, after: str, limit: int,
+                       max_rows: int = SCAN_ROWS_PER_TICK):
+    # Обходим компьютеры по имени (keyset), чтобы каждая волна продолжала с места,
+    # где остановилась предыдущая; берем тех, кому этот драйвер нужен прямо сейчас
+    # и кто еще не получал задание этого развертывания.
+    # Обход идет в пишущей транзакции, поэтому за раз просматриваем не больше
+    # max_rows строк - остальное дочитает следующий тик планировщика
+    selected, scanned = [], 0
+    while scanned < max_rows:
+        batch = min(SCAN_BATCH, max_rows - scanned)
+        rows = conn.execute(ELIGIBLE_COMPUTERS_SQL, (after, rollout_id, hardware_id, batch)).fetchall()
+        scanned += len(rows)
+
+        for name, cpu, gpu, motherboard, adapters, installed in rows:
+            after = name
+            installed_drivers = json.loads(installed) if installed else []
+            updates = pending_updates(catalog, computer_devices(cpu, gpu, motherboard, adapters), installed_drivers)
+            if any(update["hardware_id"] == hardware_id for update in updates):
+                selected.append(name)
+                if len(selected) >= limit:
+                    return selected, after, False
+
+        if len(rows) < batch:
+            return selected, after, True
+
+    return selected, after, False
+
+
+def advance_rollout(conn, catalog, rollout_id: int):
+    rollout = conn.execute('''
+        SELECT hardware_id, driver_id, status, wave_size, wave_growth, min_success_rate,
+            current_wave, approved_wave, scan_cursor, wave_candidates, clean_pass
+        FROM rollouts WHERE id = ?
+    ''', (rollout_id,)).fetchone()
+    if not rollout or rollout[2] != "active":
+        return None
+    hardware_id, driver_id, _, wave_size, wave_growth, min_success_rate, wave, approved_wave, \
+        scan_cursor, wave_candidates, clean_pass = rollout
+
+    if wave:
+        counts = rollout_counts(conn, rollout_id, wave)
+        if counts.get("pending") or counts.get("in_progress"):
+            return None
+
+        rate = success_rate(counts)
+        if rate < min_success_rate and wave > approved_wave:
+            set_rollout_status(conn, rollout_id, "halted",
+                               f"Волна {wave}: успешно {rate:.0%}, требуется не меньше {min_success_rate:.0%}")
+            print(f"⚠️ Развертывание {rollout_id} ({hardware_id}) остановлено: успешно {rate:.0%} в волне {wave}")
+            return None
+
+    candidates = json.loads(wave_candidates)
+    size = next_wave_size(wave_size, wave_growth, wave)
+    found, scan_cursor, finished = eligible_computers(
+        conn, catalog, rollout_id, hardware_id, scan_cursor, size - len(candidates), SCAN_ROWS_PER_TICK
+    )
+    candidates += found
+    if not finished and len(candidates) < size:
+        # Волна еще не набрана - найденные компьютеры ждут следующего тика
+        conn.execute('''
+            UPDATE rollouts SET scan_cursor = ?, wave_candidates = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+        ''', (scan_cursor, json.dumps(candidates), rollout_id))
+        return None
+
+    # Пока волна набиралась, компьютер могли удалить или назначить ему задание вручную
+    computers = [name for (name,) in conn.execute('''
+        INSERT INTO installation_jobs (computer_name, hardware_id, driver_id, status, rollout_id, wave)
+        SELECT c.name, ?, ?, 'pending', ?, ? FROM computers c
+        WHERE c.name IN (SELECT value FROM json_each(?))
+            AND NOT EXISTS (
+                SELECT 1 FROM installation_jobs j
+                WHERE j.computer_name = c.name AND (j.rollout_id = ?
+                    OR (j.hardware_id = ? AND j.status IN ('pending', 'in_progress')))
+            )
+        RETURNING computer_name
+    ''', (hardware_id, driver_id, rollout_id, wave + 1, json.dumps(candidates), rollout_id, hardware_id)).fetchall()]
+    if not computers:
+        if finished and clean_pass:
+            set_rollout_status(conn, rollout_id, "completed", f"Завершено после волны {wave}")
+            print(f"✅ Развертывание {rollout_id} ({hardware_id}) завершено")
+        elif finished:
+            # Курсор идет только вперед по имени: компьютер, зарегистрированный во время
+            # развертывания с именем до курсора, найдет только обход с начала. Завершаем,
+            # когда полный обход с начала не создал ни одной волны
+            conn.execute(
+                "UPDATE rollouts SET scan_cursor = '', wave_candidates = '[]', clean_pass = 1 WHERE id = ?",
+                (rollout_id,)
+            )
+        else:
+            conn.execute(
+                "UPDATE rollouts SET scan_cursor = ?, wave_candidates = '[]' WHERE id = ?", (scan_cursor, rollout_id)
+            )
+        return None
+
+    wave += 1
+    conn.execute('''
+        UPDATE rollouts SET current_wave = ?, scan_cursor = ?, wave_candidates = '[]', clean_pass = 0,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', (wave, scan_cursor, rollout_id))
+    publish_event(conn, "jobs", {"hardware_id": hardware_id, "rollout_id": rollout_id, "computers": computers})
+    print(f"🔄 Развертывание {rollout_id} ({hardware_id}): волна {wave}, компьютеров {len(computers)}")
+    return wave
+
+
+def set_rollout_status(conn, rollout_id: int, status: str, message: str = None):
+    conn.execute(
+        "UPDATE rollouts SET status = ?, message = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+        (status, message, rollout_id)
+    )
+
+
+def change_rollout(conn, rollout_id: int, action: str):
+    row = conn.execute("SELECT status FROM rollouts WHERE id = ?", (rollout_id,)).fetchone()
+    if not row:
+        return None
+
+    status = row[0]
+    if action == "pause" and status == "active":
+        set_rollout_status(conn, rollout_id, "paused")
+    elif action == "resume" and status in ("paused", "halted"):
+        # Возобновление после остановки - осознанное решение администратора,
+        # поэтому результат текущей волны больше не проверяем
+        set_rollout_status(conn, rollout_id, "active")
+        conn.execute("UPDATE rollouts SET approved_wave = current_wave WHERE id = ?", (rollout_id,))
+        # Задания приостановленной волны снова можно забирать
+        hardware_id, = conn.execute("SELECT hardware_id FROM rollouts WHERE id = ?", (rollout_id,)).fetchone()
+        computers = [name for (name,) in conn.execute(
+            "SELECT computer_name FROM installation_jobs WHERE rollout_id = ? AND status = 'pending'", (rollout_id,)
+        )]
+        if computers:
+            publish_event(conn, "jobs", {"hardware_id": hardware_id, "rollout_id": rollout_id, "computers": computers})
+    elif action == "cancel" and status not in ("completed", "cancelled"):
+        set_rollout_status(conn, rollout_id, "cancelled")
+        cancelled = conn.execute(
+            "UPDATE installation_jobs SET status = 'cancelled' WHERE rollout_id = ? AND status = 'pending' "
+            "RETURNING computer_name, hardware_id",
+            (rollout_id,)
+        ).fetchall()
+        publish_job_status(conn, "cancelled", cancelled)
+    return conn.execute("SELECT status FROM rollouts WHERE id = ?", (rollout_id,)).fetchone()[0]
+
+
+def claim_job(conn, computer_name: str, fleet_max_in_flight: int = FLEET_MAX_IN_FLIGHT):
+    # Выполняется в пишущей транзакции (BEGIN IMMEDIATE): проверка лимитов и
+    # захват задания атомарны, два агента не получат одно задание и не превысят лимит
+    return conn.execute(CLAIM_JOB_SQL, (computer_name, fleet_max_in_flight)).fetchone()
+
+
+def expire_jobs(conn, timeout_minutes: int = JOB_TIMEOUT_MINUTES):
+    # Агент забрал задание и пропал - считаем установку неудачной, чтобы волна не зависла
+    expired = conn.execute('''
+        UPDATE installation_jobs
+        SET status = 'failed', completed_at = CURRENT_TIMESTAMP, message = 'Истекло время ожидания отчета'
+        WHERE status = 'in_progress' AND claimed_at < datetime('now', ?)
+        RETURNING computer_name, hardware_id
+    ''', (f"-{timeout_minutes} minutes",)).fetchall()
+    publish_job_status(conn, "failed", expired)
+    return len(expired)
+
+
+def rollout_hardware_ids(conn):
+    # Драйверы активных развертываний выдаются только через задания
+    return {row[0] for row in conn.execute(
+        "SELECT DISTINCT hardware_id FROM rollouts WHERE status IN ('active', 'paused', 'halted')"
+    )}
+
+
+def schedule_rollouts(conn, catalog):
+    expired = expire_jobs(conn)
+    if expired:
+        print(f"⚠️ Заданий без отчета об установке: {expired}")
+
+    for (rollout_id,) in conn.execute("SELECT id FROM rollouts WHERE status = 'active'").fetchall():
+        advance_rollout(conn, catalog, rollout_id)
+
+
+async def schedule_periodically(db, catalog, interval: int = SCHEDULER_INTERVAL, leader=None):
+    while True:
+        await asyncio.sleep(interval)
+        if leader and not leader.is_leader:
+            continue
+        try:
+            await db.run(schedule_rollouts, catalog, write=True)
+        except Exception as e:
+            print(f"⚠️ Ошибка планировщика развертываний: {e}")
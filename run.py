@@ -1,9 +1,80 @@
+import argparse
+import os
+import shutil
+import tempfile
+
 import uvicorn
 
+#Запуск сервера. По умолчанию - рабочий режим: несколько процессов-воркеров принимают
+#соединения с одного сокета, миграции и проверки базы выполняются один раз до их
+#запуска. При остановке воркеры перестают принимать соединения и дожидаются
+#текущих запросов (не дольше --graceful-timeout). --reload - режим разработки
+
+
+def env_int(name: str, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Запуск сервера Driver Deploy")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=env_int("PORT", 8000))
+    # SQLite пишет в один поток, поэтому больше воркеров, чем ядер, не нужно
+    parser.add_argument("--workers", type=int, default=env_int("WEB_CONCURRENCY", min(4, os.cpu_count() or 1)))
+    parser.add_argument("--backlog", type=int, default=env_int("BACKLOG", 2048),
+                        help="очередь соединений, ожидающих accept")
+    parser.add_argument("--limit-concurrency", type=int, default=env_int("LIMIT_CONCURRENCY", None),
+                        help="соединений на воркер, сверх - ответ 503")
+    parser.add_argument("--keep-alive", type=int, default=env_int("KEEP_ALIVE", 15),
+                        help="секунд держать простаивающее соединение агента")
+    parser.add_argument("--graceful-timeout", type=int, default=env_int("GRACEFUL_TIMEOUT", 30),
+                        help="секунд на завершение текущих запросов при остановке")
+    parser.add_argument("--access-log", action="store_true", help="писать строку в журнал на каждый запрос")
+    parser.add_argument("--reload", action="store_true", help="режим разработки с перезапуском при изменениях")
+    return parser.parse_args(argv)
+
+
+def prepare_db():
+    # В родительском процессе до запуска воркеров: DDL выполняется один раз,
+    # а не одновременно в каждом воркере
+    import main as server
+    server.prepare_db()
+    server.db.close()
+    os.environ["DB_PREPARED"] = "1"
+
+
+def main():
+    args = parse_args()
+
+    if args.reload:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
+        return
+
+    metrics_dir = None
+    if args.workers > 1 and not os.environ.get("METRICS_DIR"):
+        # Снимки метрик воркеров для общего /metrics
+        metrics_dir = tempfile.mkdtemp(prefix="driver-deploy-metrics-")
+        os.environ["METRICS_DIR"] = metrics_dir
+
+    try:
+        prepare_db()
+        print(f"✅ Запуск: воркеров {args.workers}, порт {args.port}")
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            backlog=args.backlog,
+            limit_concurrency=args.limit_concurrency,
+            timeout_keep_alive=args.keep_alive,
+            timeout_graceful_shutdown=args.graceful_timeout,
+            access_log=args.access_log,
+        )
+    finally:
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True
-    )
\ No newline at end of file
+    main()
@@ -0,0 +1,78 @@
+import asyncio
+import os
+
+
+RECONCILE_INTERVAL = int(os.environ.get("STATS_RECONCILE_INTERVAL", "300"))
+OUTDATED_DAYS = 30
+
+PENDING_JOBS_SQL = "SELECT COUNT(*) FROM installation_jobs WHERE status = 'pending'"
+OUTDATED_COMPUTERS_SQL = "SELECT COUNT(*) FROM computers WHERE last_seen < date('now', ?)"
+
+#Счетчики для /status поддерживаются триггерами (создаются миграциями в migrations.py)
+#в той же транзакции, что и изменение данных; отличается только outdated_computers -
+#он зависит от времени и пересчитывается периодической сверкой
+
+def reconcile(conn, report_drift: bool = True):
+    # Полный пересчет: исправляет возможный дрейф и обновляет outdated_computers.
+    # Все запросы используют индексы (last_seen, sha256, status)
+    actual = {
+        "computers": conn.execute("SELECT COUNT(*) FROM computers").fetchone()[0],
+        "drivers": conn.execute("SELECT COUNT(*) FROM drivers").fetchone()[0],
+        "drivers_bytes": conn.execute("SELECT IFNULL(SUM(file_size), 0) FROM drivers").fetchone()[0],
+        "stored_bytes": conn.execute('''
+            SELECT IFNULL(SUM(file_size), 0) FROM (
+                SELECT MAX(file_size) AS file_size FROM drivers WHERE sha256 IS NOT NULL GROUP BY sha256
+            )
+        ''').fetchone()[0],
+        "pending_jobs": conn.execute(PENDING_JOBS_SQL).fetchone()[0],
+    }
+
+    drift = {}
+    for key, value in conn.execute("SELECT key, value FROM stats"):
+        if key in actual and value != actual[key]:
+            drift[key] = actual[key] - value
+
+    conn.executemany(
+        "UPDATE stats SET value = ?, updated_at = CURRENT_TIMESTAMP WHERE key = ?",
+        [(value, key) for key, value in actual.items()]
+    )
+    refresh_outdated(conn)
+    if drift and report_drift:
+        print(f"⚠️ Счетчики статуса расходились с данными и исправлены: {drift}")
+    return actual
+
+
+def refresh_outdated(conn):
+    outdated = conn.execute(OUTDATED_COMPUTERS_SQL, (f"-{OUTDATED_DAYS} days",)).fetchone()[0]
+    conn.execute(
+        "UPDATE stats SET value = ?, updated_at = CURRENT_TIMESTAMP WHERE key = 'outdated_computers'",
+        (outdated,)
+    )
+
+
+def read_stats(conn) -> dict:
+    return {key: value for key, value in conn.execute("SELECT key, value FROM stats")}
+
+
+def status_summary(counters: dict) -> dict:
+    # Счетчики в том виде, в каком их показывают /status и веб-интерфейс
+    return {
+        "computers_registered": counters["computers"],
+        "drivers_available": counters["drivers"],
+        "total_drivers_size_mb": round(counters["drivers_bytes"] / (1024 * 1024), 2),
+        "stored_drivers_size_mb": round(counters["stored_bytes"] / (1024 * 1024), 2),
+        "pending_installations": counters["pending_jobs"],
+        "outdated_computers": counters["outdated_computers"],
+        "cleanup_available": counters["outdated_computers"] > 0,
+    }
+
+
+async def reconcile_periodically(db, interval: int = RECONCILE_INTERVAL, leader=None):
+    while True:
+        await asyncio.sleep(interval)
+        if leader and not leader.is_leader:
+            continue
+        try:
+            await db.run(reconcile, write=True)
+        except Exception as e:
+            print(f"⚠️ Ошибка сверки счетчиков статуса: {e}")
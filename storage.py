@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import os
+import uuid
+
+import aiofiles
+from fastapi import UploadFile
+from fastapi.responses import JSONResponse
+
+
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE", str(2 * 1024 * 1024 * 1024)))
+# Поля формы и заголовки частей multipart сверх самого файла
+MAX_FORM_OVERHEAD = 1024 * 1024
+
+BLOB_REFERENCES_SQL = "SELECT COUNT(*) FROM drivers WHERE sha256 = ?"
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class StoredUpload:
+    def __init__(self, path: str, size: int, sha256: str):
+        self.path = path
+        self.temp_path = path
+        self.size = size
+        self.sha256 = sha256
+
+
+class UploadLimitMiddleware:
+    # Starlette разбирает multipart (и пишет файл во временный) до вызова обработчика,
+    # поэтому проверка в receive_upload диск не защищает. Слишком большие запросы
+    # отклоняем по Content-Length до разбора, а тело без длины (chunked) - по мере чтения
+    def __init__(self, app, max_body: int = MAX_UPLOAD_SIZE + MAX_FORM_OVERHEAD):
+        self.app = app
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        too_large = JSONResponse(status_code=413, content={
+            "detail": f"Запрос превышает допустимый размер {self.max_body} байт"
+        })
+        length = dict(scope["headers"]).get(b"content-length")
+        if length and length.isdigit() and int(length) > self.max_body:
+            await too_large(scope, receive, send)
+            return
+
+        state = {"received": 0, "started": False, "too_large": False}
+
+        async def limited_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                state["received"] += len(message.get("body", b""))
+                if state["received"] > self.max_body and not state["started"]:
+                    state["too_large"] = True
+                    raise UploadTooLarge(f"Запрос превышает допустимый размер {self.max_body} байт")
+            return message
+
+        async def tracking_send(message):
+            # FastAPI превращает ошибку разбора тела в 400 - этот ответ заменяем на 413
+            if state["too_large"]:
+                return
+            if message["type"] == "http.response.start":
+                state["started"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except UploadTooLarge:
+            if not state["too_large"]:
+                raise
+        if state["too_large"]:
+            await too_large(scope, receive, send)
+
+
+def incoming_dir(drivers_dir: str) -> str:
+    path = os.path.join(drivers_dir, ".incoming")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+async def receive_upload(
+        file: UploadFile,
+        drivers_dir: str,
+        max_size: int = MAX_UPLOAD_SIZE,
+        chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> StoredUpload:
+    # Временный файл создаем в том же каталоге, что и итоговый, чтобы
+    # последующий os.replace был атомарным переименованием
+    temp_path = os.path.join(incoming_dir(drivers_dir), f"{uuid.uuid4().hex}.part")
+    hasher = hashlib.sha256()
+    loop = asyncio.get_running_loop()
+    size = 0
+
+    try:
+        async with aiofiles.open(temp_path, "wb") as buffer:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(f"Файл превышает допустимый размер {max_size} байт")
+
+                await loop.run_in_executor(None, hasher.update, chunk)
+                await buffer.write(chunk)
+    except BaseException:
+        discard(temp_path)
+        raise
+
+    return StoredUpload(temp_path, size, hasher.hexdigest())
+
+
+def discard(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def hash_file(path: str, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            hasher.update(chunk)
+    return size, hasher.hexdigest()
+
+
+#Хранилище содержимого: один файл на каждый уникальный SHA-256,
+#строки drivers ссылаются на него через колонку sha256
+
+def blob_path(drivers_dir: str, sha256: str) -> str:
+    return os.path.join(drivers_dir, "blobs", sha256[:2], sha256[2:4], sha256)
+
+
+def store_blob(upload: StoredUpload, drivers_dir: str) -> bool:
+    # Вызывается внутри пишущей транзакции: BEGIN IMMEDIATE сериализует
+    # размещение блоба с release_blob, поэтому блоб не может исчезнуть
+    # между проверкой и вставкой ссылки на него
+    path = blob_path(drivers_dir, upload.sha256)
+    if os.path.exists(path):
+        discard(upload.path)
+        upload.path = path
+        return False
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(upload.path, path)
+    upload.path = path
+    return True
+
+
+def blob_references(conn, sha256: str) -> int:
+    return conn.execute(BLOB_REFERENCES_SQL, (sha256,)).fetchone()[0]
+
+
+def release_blob(conn, drivers_dir: str, sha256: str) -> bool:
+    if not sha256 or blob_references(conn, sha256) > 0:
+        return False
+
+    path = blob_path(drivers_dir, sha256)
+    if not os.path.exists(path):
+        return False
+    os.remove(path)
+    return True
+
+
+def migrate_to_blob_store(conn, drivers_dir: str):
+    blobs_root = os.path.join(drivers_dir, "blobs") + os.sep
+    rows = conn.execute("SELECT id, file_path, sha256 FROM drivers").fetchall()
+
+    migrated = 0
+    for driver_id, file_path, sha256 in rows:
+        if file_path.startswith(blobs_root) or not os.path.exists(file_path):
+            continue
+
+        size, digest = hash_file(file_path)
+        if sha256 and sha256 != digest:
+            print(f"⚠️ Хеш файла {file_path} не совпадает с сохраненным, используем фактический")
+
+        upload = StoredUpload(file_path, size, digest)
+        store_blob(upload, drivers_dir)
+        conn.execute(
+            "UPDATE drivers SET file_path = ?, file_size = ?, sha256 = ? WHERE id = ?",
+            (upload.path, size, digest, driver_id)
+        )
+        migrated += 1
+
+    if migrated:
+        print(f"📦 Перенесено в хранилище содержимого файлов: {migrated}")
@@ -0,0 +1,36 @@
+import importlib
+import os
+import sqlite3
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import migrate
+
+
+@pytest.fixture
+def conn():
+    # Пустая база со всеми миграциями - для проверки планов запросов
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    migrate(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    # main читает DB_PATH и DRIVERS_DIR при импорте
+    work = tmp_path_factory.mktemp("server")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("DB_PATH", str(work / "drivers.db"))
+        monkeypatch.setenv("DRIVERS_DIR", str(work / "drivers"))
+        yield importlib.import_module("main")
+
+
+@pytest.fixture(scope="session")
+def client(server):
+    with TestClient(server.app) as client:
+        yield client
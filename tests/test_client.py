@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "client"))
+
+from client import DriverClient, POLL_JITTER
+
+
+@pytest.fixture
+def make_client(tmp_path, monkeypatch):
+    # Клиент пишет driver_client.log в текущий каталог
+    monkeypatch.chdir(tmp_path)
+    return lambda **kwargs: DriverClient("http://server", **kwargs)
+
+
+def test_server_hint_only_slows_client_down(make_client):
+    client = make_client(poll_interval=600)
+    client.retry_after = 3600
+    assert client.next_delay(True) >= 3600 * (1 - POLL_JITTER)
+
+    client.retry_after = 60
+    delay = client.next_delay(True)
+    assert 600 * (1 - POLL_JITTER) <= delay <= 600 * (1 + POLL_JITTER)
+
+
+def test_local_interval_used_without_hint(make_client):
+    client = make_client(poll_interval=900)
+    client.retry_after = None
+    assert 900 * (1 - POLL_JITTER) <= client.next_delay(True) <= 900 * (1 + POLL_JITTER)
@@ -0,0 +1,25 @@
+import pytest
+
+from computers import COMPUTER_DEFAULT_FIELDS, computers_page_query
+from migrations import computer_list_queries, query_plan, plan_problems
+
+
+@pytest.mark.parametrize("name, sql, params", list(computer_list_queries()))
+def test_computer_list_reads_index_in_order(conn, name, sql, params):
+    assert plan_problems(query_plan(conn, sql, params)) == []
+
+
+def test_prefix_with_last_seen_sort_needs_temp_sort(conn):
+    # Поэтому обработчик разрешает с name_prefix только сортировку по имени
+    sql, params, _ = computers_page_query(COMPUTER_DEFAULT_FIELDS, "last_seen", True, 100, name_prefix="PC-1")
+    assert any("TEMP B-TREE" in step for step in query_plan(conn, sql, params))
+
+
+def test_page_query_keyset_and_columns(conn):
+    for name, seen in (("PC-1", "2026-01-01 00:00:00"), ("PC-2", "2026-01-02 00:00:00"),
+                       ("PC-3", "2026-01-03 00:00:00")):
+        conn.execute("INSERT INTO computers (name, ip, last_seen) VALUES (?, '10.0.0.1', ?)", (name, seen))
+
+    sql, params, columns = computers_page_query(("name",), "last_seen", True, 1, ["2026-01-03 00:00:00", "PC-3"])
+    assert columns == ("name", "last_seen")
+    assert [row[0] for row in conn.execute(sql, params)] == ["PC-2", "PC-1"]
@@ -0,0 +1,40 @@
+from dashboard import computers_seen, seen_position
+
+
+def register(conn, name, last_seen="2026-01-01 00:00:00"):
+    conn.execute("INSERT INTO computers (name, ip, last_seen) VALUES (?, '10.0.0.1', ?)", (name, last_seen))
+
+
+def test_late_commit_in_same_second_is_not_missed(conn):
+    register(conn, "PC-B")
+    position = seen_position(conn)
+    assert [row[0] for row in computers_seen(conn, 0)] == ["PC-B"]
+
+    # Отметка с тем же last_seen и меньшим именем зафиксирована уже после чтения
+    register(conn, "PC-A")
+    assert [row[0] for row in computers_seen(conn, position)] == ["PC-A"]
+
+
+def test_heartbeat_moves_computer_forward(conn):
+    register(conn, "PC-A")
+    register(conn, "PC-B")
+    position = seen_position(conn)
+    conn.execute("UPDATE computers SET last_seen = last_seen WHERE name = 'PC-A'")
+    conn.execute("UPDATE computers SET ip = '10.0.0.2' WHERE name = 'PC-B'")
+    rows = computers_seen(conn, position)
+    assert [row[0] for row in rows] == ["PC-A"]
+    assert rows[-1][-1] == seen_position(conn) == position + 1
+
+
+def test_numbers_not_reused_after_delete(conn):
+    register(conn, "PC-A")
+    position = seen_position(conn)
+    conn.execute("DELETE FROM computers WHERE name = 'PC-A'")
+    register(conn, "PC-B")
+    assert seen_position(conn) == position + 1
+
+
+def test_catch_up_range(conn):
+    for name in ("PC-A", "PC-B", "PC-C"):
+        register(conn, name)
+    assert [row[0] for row in computers_seen(conn, 1, until=2)] == ["PC-B"]
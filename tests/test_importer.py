@@ -0,0 +1,84 @@
+import json
+import os
+import zipfile
+
+import pytest
+
+import importer
+
+from importer import DriverImportError, confined_path, extract_archive, scan_directory
+
+
+@pytest.fixture
+def package(tmp_path):
+    directory = tmp_path / "package"
+    directory.mkdir()
+    (directory / "nv.exe").write_bytes(b"driver")
+    (tmp_path / "secret.exe").write_bytes(b"outside")
+    return directory
+
+
+def write_manifest(directory, path):
+    (directory / "manifest.json").write_text(json.dumps({"drivers": [{"path": path, "driver_version": "1"}]}))
+
+
+def test_manifest_entry_inside_directory(package):
+    write_manifest(package, "nv.exe")
+    assert [entry["path"] for entry in scan_directory(str(package))] == [os.path.realpath(package / "nv.exe")]
+
+
+@pytest.mark.parametrize("path", ["../secret.exe", "sub/../../secret.exe", "/etc/passwd"])
+def test_manifest_entry_outside_directory_rejected(package, path):
+    write_manifest(package, path)
+    with pytest.raises(DriverImportError):
+        scan_directory(str(package))
+
+
+def test_manifest_outside_directory_rejected(package):
+    # Так обработчик /drivers/import проверяет request.manifest
+    with pytest.raises(DriverImportError):
+        confined_path(str(package), "../manifest.json")
+
+
+def test_symlink_outside_directory_skipped(package, tmp_path):
+    os.symlink(tmp_path / "secret.exe", package / "link.exe")
+    assert [os.path.basename(entry["path"]) for entry in scan_directory(str(package))] == ["nv.exe"]
+
+
+def test_archive_manifest_cannot_escape_extract_dir(tmp_path):
+    archive_path = tmp_path / "drivers.zip"
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        archive.writestr("manifest.json", json.dumps([{"path": "../../secret.exe", "driver_version": "1"}]))
+    target = tmp_path / "extract"
+    extract_archive(str(archive_path), str(target))
+    with pytest.raises(DriverImportError):
+        scan_directory(str(target))
+
+
+def test_archive_member_cannot_escape(tmp_path):
+    archive_path = tmp_path / "drivers.zip"
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        archive.writestr("../evil.exe", b"x")
+    with pytest.raises(DriverImportError):
+        extract_archive(str(archive_path), str(tmp_path / "extract"))
+    assert not (tmp_path / "evil.exe").exists()
+
+
+def test_archive_total_size_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(importer, "MAX_ARCHIVE_SIZE", 1000)
+    archive_path = tmp_path / "drivers.zip"
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        archive.writestr("a.exe", os.urandom(600))
+        archive.writestr("b.exe", os.urandom(600))
+    with pytest.raises(DriverImportError):
+        extract_archive(str(archive_path), str(tmp_path / "extract"))
+    assert not (tmp_path / "extract").exists()
+
+
+def test_archive_compression_ratio_checked(tmp_path):
+    archive_path = tmp_path / "drivers.zip"
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("bomb.exe", b"\0" * (20 * 1024 * 1024))
+        archive.writestr("setup.inf", b"\0" * 100000)
+    with pytest.raises(DriverImportError, match="bomb.exe"):
+        extract_archive(str(archive_path), str(tmp_path / "extract"))
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from catalog import DriverCatalog
+from db import Database
+from matching import gpu_vendor_of, index_driver, pending_updates
+from migrations import migrate
+
+# Так LinuxBackend._pci_name называет видеокарту AMD по pci.ids
+PCI_AMD_GPU = "Advanced Micro Devices, Inc. [AMD/ATI] Navi 21 [Radeon RX 6800/6800 XT / 6900 XT]"
+
+
+@pytest.mark.parametrize("name, vendor", [
+    (PCI_AMD_GPU, "amd"),
+    ("AMD Radeon RX 6800", "amd"),
+    ("Micro-Star International Co., Ltd. [MSI] MAG B550", "msi"),
+    ("MSI MAG B550 TOMAHAWK", "msi"),
+    ("NVIDIA GeForce RTX 3060", "nvidia"),
+    ("Micro USB Controller", None),
+])
+def test_gpu_vendor_of(name, vendor):
+    assert gpu_vendor_of(name) == vendor
+
+
+def test_pci_amd_gpu_matches_amd_driver(tmp_path):
+    db = Database(str(tmp_path / "drivers.db"), size=1)
+    with db.transaction() as conn:
+        migrate(conn)
+        for hardware_id, model in (("amd-6800", "AMD Radeon RX 6800"), ("msi-b550", "MSI MAG B550 Chipset")):
+            cursor = conn.execute(
+                "INSERT INTO drivers (hardware_id, model, driver_version, file_path) VALUES (?, ?, '1.0', 'f')",
+                (hardware_id, model)
+            )
+            index_driver(conn, cursor.lastrowid, model)
+    catalog = DriverCatalog()
+    asyncio.run(catalog.reload(db))
+    db.close()
+
+    updates = pending_updates(catalog, [("gpu", PCI_AMD_GPU)], [])
+    assert [update["hardware_id"] for update in updates] == ["amd-6800"]
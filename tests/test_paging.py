@@ -0,0 +1,31 @@
+import pytest
+from fastapi import HTTPException
+
+from paging import encode_cursor, decode_cursor
+
+
+def test_decode_cursor_roundtrip():
+    assert decode_cursor(encode_cursor(["2026-01-01", "PC-1"]), (str, str)) == ["2026-01-01", "PC-1"]
+    assert decode_cursor(encode_cursor([5, 7]), (int, int)) == [5, 7]
+
+
+@pytest.mark.parametrize("values", [[1, 2, 3], [None, None, None], [["a"], "b", "c"], [{"a": 1}, "b", "c"],
+                                    ["a", "b"], [True, "b", "c"]])
+def test_decode_cursor_rejects_wrong_types(values):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(encode_cursor(values), (str, str, str))
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("values", [[1, 2, 3], [None, None, None], [["a"], "b", "c"]])
+def test_drivers_mistyped_cursor(client, values):
+    response = client.get("/drivers", params={"sort": "model", "cursor": encode_cursor(values)})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Некорректный курсор"
+
+
+@pytest.mark.parametrize("values", [[["x"], "PC-1"], [{"a": 1}, "PC-1"], [1, 2], [None, "PC-1"]])
+def test_computers_mistyped_cursor(client, values):
+    response = client.get("/computers", params={"cursor": encode_cursor(values)})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Некорректный курсор"
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "client"))
+
+from driver_installer import peer_url
+from migrations import query_plan, plan_problems
+from peers import FIND_PEERS_SQL, find_peers, record_peer, subnet_of
+
+
+def test_peer_url_brackets_ipv6():
+    assert peer_url("10.0.0.5", 8090, "ab") == "http://10.0.0.5:8090/blobs/ab"
+    assert peer_url("fe80::1", 8090, "ab") == "http://[fe80::1]:8090/blobs/ab"
+    assert peer_url("2001:db8::5", 8090, "ab") == "http://[2001:db8::5]:8090/blobs/ab"
+
+
+def test_subnet_of():
+    assert subnet_of("10.1.2.3") == "10.1.2.0/24"
+    assert subnet_of("2001:db8::5") == "2001:db8::/64"
+    assert subnet_of("127.0.0.1") is None
+
+
+def test_find_peers_plan_has_no_sort(conn):
+    plan = query_plan(conn, FIND_PEERS_SQL, ("hw", "10.0.0.0/24", "0" * 64, "pc", "-24 hours", 5))
+    assert plan_problems(plan) == []
+
+
+def test_find_peers_returns_freshest_reports(conn):
+    conn.execute("INSERT INTO drivers (hardware_id, model, driver_version, file_path, sha256) "
+                 "VALUES ('hw', 'M', '1', 'f', 'abc')")
+    for index in range(4):
+        conn.execute("INSERT INTO computers (name, ip) VALUES (?, ?)", (f"PC-{index}", f"10.0.0.{index + 1}"))
+        record_peer(conn, "hw", f"PC-{index}", 8090)
+        conn.execute("UPDATE peer_cache SET updated_at = datetime('now', ?) WHERE computer_name = ?",
+                     (f"-{10 - index} minutes", f"PC-{index}"))
+
+    peers = find_peers(conn, "hw", "abc", "PC-0", "10.0.0.1", limit=2)
+    assert peers == [{"ip": "10.0.0.4", "port": 8090}, {"ip": "10.0.0.3", "port": 8090}]
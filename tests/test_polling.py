@@ -0,0 +1,19 @@
+from types import SimpleNamespace
+
+from polling import next_poll, POLL_INTERVAL, MAX_POLL_INTERVAL
+
+
+def state(depth=0, in_use=0):
+    return SimpleNamespace(depth=depth, max_queue=100), SimpleNamespace(in_use=in_use, size=10)
+
+
+def test_no_hint_without_load():
+    # Иначе подсказка по умолчанию заменила бы агенту его --interval
+    assert next_poll(*state()) is None
+    assert next_poll(*state(depth=10, in_use=2)) is None
+
+
+def test_hint_grows_with_load():
+    half = next_poll(*state(depth=60))
+    full = next_poll(*state(depth=100))
+    assert POLL_INTERVAL < half < full == MAX_POLL_INTERVAL
@@ -0,0 +1,20 @@
+import pytest
+
+from migrations import HOT_QUERIES, query_plan, plan_problems, check_query_plans
+
+
+@pytest.mark.parametrize("name, sql, params", HOT_QUERIES, ids=[name for name, _, _ in HOT_QUERIES])
+def test_hot_query_uses_index(conn, name, sql, params):
+    plan = query_plan(conn, sql, params)
+    assert not any(step.startswith("SCAN ") and " USING " not in step and "VIRTUAL TABLE" not in step
+                   for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def test_plan_problems_reports_scan_and_sort(conn):
+    plan = query_plan(conn, "SELECT name FROM computers WHERE cpu = ? ORDER BY ip", ("x",))
+    assert len(plan_problems(plan)) == 2
+
+
+def test_check_query_plans_passes_on_migrated_schema(conn):
+    assert check_query_plans(conn) == []
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from catalog import DriverCatalog
+from db import Database
+from matching import index_driver
+from migrations import migrate
+from rollouts import advance_rollout, create_rollout, eligible_computers
+
+
+@pytest.fixture
+def fleet(tmp_path):
+    db = Database(str(tmp_path / "drivers.db"), size=2)
+    with db.transaction() as conn:
+        migrate(conn)
+        cursor = conn.execute(
+            "INSERT INTO drivers (hardware_id, model, driver_version, file_path) "
+            "VALUES ('nv-1060', 'NVIDIA GeForce GTX 1060', '531.41', 'nv.exe')"
+        )
+        index_driver(conn, cursor.lastrowid, "NVIDIA GeForce GTX 1060")
+        # Драйвер нужен каждому третьему компьютеру
+        conn.executemany("INSERT INTO computers (name, ip, gpu) VALUES (?, '10.0.0.1', ?)", [
+            (f"PC-{index:03}", "NVIDIA GeForce GTX 1060" if index % 3 == 0 else "AMD Radeon RX 580")
+            for index in range(30)
+        ])
+    catalog = DriverCatalog()
+    asyncio.run(catalog.reload(db))
+    yield db, catalog
+    db.close()
+
+
+def test_scan_stops_after_max_rows(fleet):
+    db, catalog = fleet
+    with db.connection() as conn:
+        selected, cursor, finished = eligible_computers(conn, catalog, 1, "nv-1060", "", 100, max_rows=10)
+        assert (selected, cursor, finished) == (["PC-000", "PC-003", "PC-006", "PC-009"], "PC-009", False)
+
+        selected, cursor, finished = eligible_computers(conn, catalog, 1, "nv-1060", cursor, 100, max_rows=100)
+        assert len(selected) == 6 and finished
+
+
+def test_wave_collected_across_ticks(fleet, monkeypatch):
+    db, catalog = fleet
+    monkeypatch.setattr("rollouts.SCAN_ROWS_PER_TICK", 6)
+    with db.transaction() as conn:
+        rollout_id = create_rollout(conn, catalog, "nv-1060", 4, 2.0, 10, 0.5)
+        # За тик просмотрено 6 строк - волна из 4 компьютеров еще не набрана
+        assert conn.execute("SELECT COUNT(*) FROM installation_jobs").fetchone()[0] == 0
+        assert conn.execute("SELECT wave_candidates FROM rollouts").fetchone()[0] == '["PC-000", "PC-003"]'
+
+    with db.transaction() as conn:
+        assert advance_rollout(conn, catalog, rollout_id) == 1
+        jobs = conn.execute("SELECT computer_name FROM installation_jobs WHERE wave = 1 ORDER BY 1").fetchall()
+        assert [name for (name,) in jobs] == ["PC-000", "PC-003", "PC-006", "PC-009"]
+        assert conn.execute("SELECT scan_cursor, wave_candidates FROM rollouts").fetchone() == ("PC-009", "[]")
+
+
+def test_rollout_completes_when_scan_finished(fleet):
+    db, catalog = fleet
+    with db.transaction() as conn:
+        rollout_id = create_rollout(conn, catalog, "nv-1060", 20, 2.0, 10, 0.5)
+        assert conn.execute("SELECT COUNT(*) FROM installation_jobs WHERE wave = 1").fetchone()[0] == 10
+        conn.execute("UPDATE installation_jobs SET status = 'success'")
+        # Сначала повторный обход с начала, и только он завершает развертывание
+        assert advance_rollout(conn, catalog, rollout_id) is None
+        assert conn.execute("SELECT status, scan_cursor FROM rollouts").fetchone() == ("active", "")
+        assert advance_rollout(conn, catalog, rollout_id) is None
+        assert conn.execute("SELECT status FROM rollouts").fetchone()[0] == "completed"
+
+
+def test_computer_registered_behind_cursor_gets_job(fleet):
+    db, catalog = fleet
+    with db.transaction() as conn:
+        rollout_id = create_rollout(conn, catalog, "nv-1060", 20, 2.0, 10, 0.5)
+        conn.execute("UPDATE installation_jobs SET status = 'success'")
+        # Имя сортируется раньше курсора PC-027
+        conn.execute("INSERT INTO computers (name, ip, gpu) VALUES ('PC-000A', '10.0.0.2', 'NVIDIA GeForce GTX 1060')")
+
+        assert advance_rollout(conn, catalog, rollout_id) is None
+        assert advance_rollout(conn, catalog, rollout_id) == 2
+        assert conn.execute("SELECT computer_name FROM installation_jobs WHERE wave = 2").fetchall() == [("PC-000A",)]
+
+        conn.execute("UPDATE installation_jobs SET status = 'success'")
+        for _ in range(3):
+            advance_rollout(conn, catalog, rollout_id)
+        assert conn.execute("SELECT status FROM rollouts").fetchone()[0] == "completed"
@@ -0,0 +1,65 @@
+import asyncio
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from storage import UploadLimitMiddleware, MAX_UPLOAD_SIZE
+
+
+def make_client(max_body):
+    app = FastAPI()
+    app.add_middleware(UploadLimitMiddleware, max_body=max_body)
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    return TestClient(app)
+
+
+def test_small_upload_passes():
+    response = make_client(10000).post("/upload", files={"file": ("a.exe", b"x" * 1000)})
+    assert response.status_code == 200
+    assert response.json() == {"size": 1000}
+
+
+def test_rejects_by_content_length():
+    response = make_client(1000).post("/upload", files={"file": ("a.exe", b"x" * 5000)})
+    assert response.status_code == 413
+
+
+def test_rejects_chunked_body_while_reading():
+    def body():
+        yield b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.exe\"\r\n\r\n"
+        for _ in range(10):
+            yield b"x" * 1000
+        yield b"\r\n--b--\r\n"
+
+    response = make_client(1000).post(
+        "/upload", content=body(), headers={"Content-Type": "multipart/form-data; boundary=b"}
+    )
+    assert response.status_code == 413
+
+
+def test_rejected_upload_keeps_cors_headers(server):
+    # Без заголовка CORS браузер покажет панели сетевую ошибку вместо ответа 413
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/drivers/register", "raw_path": b"/drivers/register", "query_string": b"",
+        "root_path": "", "client": ("127.0.0.1", 1), "server": ("testserver", 80),
+        "headers": [(b"host", b"testserver"), (b"origin", b"http://dashboard.local"),
+                    (b"content-type", b"multipart/form-data; boundary=b"),
+                    (b"content-length", str(MAX_UPLOAD_SIZE * 2).encode())],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(server.app(scope, receive, send))
+    start = messages[0]
+    assert start["status"] == 413
+    assert (b"access-control-allow-origin", b"*") in start["headers"]
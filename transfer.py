@@ -0,0 +1,141 @@
+import os
+import re
+from urllib.parse import quote
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def make_etag(sha256, size: int, mtime: float) -> str:
+    if sha256:
+        return f'"{sha256}"'
+    return f'"{int(mtime):x}-{size:x}"'
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+def parse_range(header: str, size: int):
+    # Поддерживаем один диапазон; для нескольких диапазонов отдаем файл целиком (RFC 9110 это допускает)
+    if not header or "," in header:
+        return None
+
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+
+    if not start:
+        length = int(end)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+class FileRangeResponse(Response):
+    def __init__(self, path: str, request_headers, sha256=None, filename=None, send_body: bool = True):
+        self.path = path
+        self.send_body = send_body
+        self.status_code = 200
+        self.background = None
+
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = make_etag(sha256, size, stat.st_mtime)
+
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "content-type": "application/octet-stream",
+        }
+        if filename:
+            headers["content-disposition"] = f"attachment; filename*=utf-8''{quote(filename)}"
+
+        self.offset, self.count = 0, size
+
+        if etag_matches(request_headers.get("if-none-match"), etag):
+            self.status_code = 304
+            self.count = 0
+        else:
+            range_header = request_headers.get("range")
+            if_range = request_headers.get("if-range")
+            if range_header and (not if_range or if_range.strip() == etag):
+                try:
+                    byte_range = parse_range(range_header, size)
+                except RangeNotSatisfiable:
+                    byte_range = None
+                    self.status_code = 416
+                    self.count = 0
+                    headers["content-range"] = f"bytes */{size}"
+
+                if byte_range:
+                    start, end = byte_range
+                    self.status_code = 206
+                    self.offset, self.count = start, end - start + 1
+                    headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+        if self.status_code != 304:
+            headers["content-length"] = str(self.count)
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+
+        if not self.send_body or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        # Если сервер поддерживает расширение ASGI zerocopysend, ядро само копирует
+        # файл в сокет (sendfile); иначе читаем файл кусками в отдельном потоке
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.fileno(),
+                    "offset": self.offset,
+                    "count": self.count,
+                    "more_body": False,
+                })
+            return
+
+        remaining = self.count
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.offset)
+            while remaining > 0:
+                chunk = await file.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import os
+import socket
+
+
+LEASE_NAME = "scheduler"
+LEASE_TTL = int(os.environ.get("LEASE_TTL", "60"))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+#Состояние, общее для нескольких процессов-воркеров (run.py --workers N).
+#Периодические задачи (сверка счетчиков, развертывания, очистка) выполняет только
+#воркер, владеющий арендой в БД; если он завершится, аренду через LEASE_TTL
+#подхватит другой. Результаты, которые показываются в /status, хранятся в БД
+
+
+def acquire_lease(conn, name: str, owner: str, ttl: int = LEASE_TTL) -> bool:
+    # Захват свободной или просроченной аренды и продление своей - одним запросом;
+    # чужая действующая аренда не меняется, и RETURNING ничего не возвращает
+    return conn.execute('''
+        INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, datetime('now', ?))
+        ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+        WHERE leases.owner = excluded.owner OR leases.expires_at < datetime('now')
+        RETURNING owner
+    ''', (name, owner, f"+{ttl} seconds")).fetchone() is not None
+
+
+def release_lease(conn, name: str, owner: str):
+    conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+
+def save_state(conn, key: str, value):
+    conn.execute('''
+        INSERT INTO server_state (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+    ''', (key, json.dumps(value, ensure_ascii=False)))
+
+
+def load_state(conn, key: str):
+    row = conn.execute("SELECT value FROM server_state WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row and row[0] is not None else None
+
+
+class Leadership:
+    def __init__(self, db, name: str = LEASE_NAME, ttl: int = LEASE_TTL, owner: str = WORKER_ID):
+        self.db = db
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner
+        self.is_leader = False
+        self._task = None
+
+    async def renew(self):
+        try:
+            leader = await self.db.run(acquire_lease, self.name, self.owner, self.ttl, write=True)
+        except Exception as e:
+            # Не смогли продлить - считаем, что аренды нет, чтобы не работать вдвоем
+            print(f"⚠️ Ошибка продления аренды {self.name}: {e}")
+            leader = False
+
+        if leader != self.is_leader:
+            print(f"🔄 Воркер {self.owner}: " + ("выполняет периодические задачи" if leader else "передал периодические задачи"))
+        self.is_leader = leader
+        return leader
+
+    async def start(self):
+        await self.renew()
+        self._task = asyncio.create_task(self._renew_periodically())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self.is_leader:
+            # Освобождаем аренду сразу, не дожидаясь истечения TTL
+            self.is_leader = False
+            await self.db.run(release_lease, self.name, self.owner, write=True)
+
+    async def _renew_periodically(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            await self.renew()